@@ -7,4 +7,5 @@ from .gamification.minigames import (
                                         EstimatorMinigame,
                                         GeoGuesserMinigame,
                                         ImpostorMinigame,
-                                    )
\ No newline at end of file
+                                    )
+from .gamification.game_data import GAME_DEFINITIONS, build_game_data, game_options
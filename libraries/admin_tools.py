@@ -0,0 +1,403 @@
+import os
+import sys
+import hmac
+import functools
+import json
+import time
+import threading
+import pandas as pd
+import streamlit as st
+from streamlit.runtime.scriptrunner import RerunException
+from datetime import datetime
+from typing import Any, Callable, Dict, List
+from .general_functions import get_setting, local_store_path, get_session_id
+from .session_memory import measure_session_state, session_memory_reports
+from .media_store import get_media_store
+from .gamification.game_registry import get_game_data_registry
+from .gamification.telemetry import get_game_event_log
+from .leaderboard import get_leaderboard_store
+from .sheets import get_sheet_handles
+from .ai_functions import context_stats, get_request_scheduler, render_metrics, local_execution_enabled, get_sandbox_pool, history_stats, get_history_compactor, get_ai_task_registry
+from .ai_backends import get_ai_backend
+from .ai_response_cache import get_response_cache
+
+PROFILE_DIR = "profiles"
+PROFILE_INDEX_FILE = "index.jsonl"
+
+def is_admin() -> bool:
+    """
+    Indica si la sesión actual tiene permisos de administración.
+
+    Se activa una única vez por sesión abriendo la app con `?admin=<ADMIN_TOKEN>`, donde ADMIN_TOKEN
+    se define como variable de entorno o en '.streamlit/secrets.toml'. El token se elimina de la URL al validarse.
+    """
+    if st.session_state.get('is_admin', False):
+        return True
+    token = get_setting("ADMIN_TOKEN")
+    provided = st.query_params.get("admin")
+    if not token or not provided:
+        return False
+    if hmac.compare_digest(str(provided), str(token)):
+        st.session_state.is_admin = True
+        del st.query_params["admin"]
+        return True
+    return False
+
+class SamplingProfiler:
+    """
+    Perfilador por muestreo de un único hilo (el hilo que ejecuta el script de Streamlit).
+
+    Un hilo auxiliar toma la pila del hilo objetivo cada `interval` segundos mediante `sys._current_frames()`,
+    por lo que el coste sobre la ejecución perfilada es mínimo y no requiere dependencias externas.
+    El resultado se exporta en el formato 'sampled' de speedscope (https://www.speedscope.app).
+    """
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.samples: List[tuple] = []
+        self.weights: List[float] = []
+        self._frames: Dict[tuple, int] = {}
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._target_ident: int | None = None
+        self._root_code = None
+        self.start_time = 0.0
+        self.end_time = 0.0
+
+    def start(self, root_frame=None):
+        """Empieza a muestrear el hilo actual. Las pilas se recortan en `root_frame` (por defecto, el llamador)."""
+        self._root_code = (root_frame or sys._getframe(1)).f_code
+        self._target_ident = threading.get_ident()
+        self.start_time = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="SamplingProfiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.end_time = time.perf_counter()
+
+    def _frame_index(self, code) -> int:
+        key = (code.co_name, code.co_filename, code.co_firstlineno)
+        if key not in self._frames:
+            self._frames[key] = len(self._frames)
+        return self._frames[key]
+
+    def _run(self):
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target_ident) #type:ignore
+            now = time.perf_counter()
+            elapsed, last = now - last, now
+            if frame is None: continue
+
+            stack = []
+            while frame is not None:
+                stack.append(self._frame_index(frame.f_code))
+                if frame.f_code is self._root_code: break
+                frame = frame.f_back
+            stack = tuple(reversed(stack))
+
+            if self.samples and self.samples[-1] == stack:
+                self.weights[-1] += elapsed
+            else:
+                self.samples.append(stack)
+                self.weights.append(elapsed)
+
+    def to_speedscope(self, name: str) -> dict:
+        frames = [{"name": n, "file": f, "line": l} for (n, f, l) in self._frames]
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": frames},
+            "profiles": [{
+                "type": "sampled",
+                "name": name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": self.end_time - self.start_time,
+                "samples": [list(s) for s in self.samples],
+                "weights": self.weights,
+            }],
+            "name": name,
+            "activeProfileIndex": 0,
+            "exporter": "cuba_matricle_university",
+        }
+
+def _profile_requested() -> bool:
+    if st.session_state.pop('profile_next_run', False):
+        return True
+    if "profile" in st.query_params and is_admin():
+        del st.query_params["profile"]
+        return True
+    return False
+
+def _current_run_tags() -> dict:
+    """Etiquetas de la ejecución perfilada: sección activa, idioma y el estado de los widgets simples."""
+    section = st.session_state.get('h_nav_main_section')
+    subsection = st.session_state.get('h_nav_last_active_subsections', {}).get(section)
+    translator = st.session_state.get('Translator')
+    widget_state = {
+        str(k): v for k, v in st.session_state.to_dict().items()
+        if isinstance(v, (str, int, float, bool)) or (isinstance(v, (list, tuple)) and all(isinstance(i, (str, int, float, bool)) for i in v))
+    }
+    return {
+        "section": section,
+        "subsection": subsection,
+        "language": getattr(translator, 'actual_lang', None),
+        "widget_state": widget_state,
+    }
+
+def _save_profile(profiler: SamplingProfiler, tags: dict) -> str:
+    timestamp = datetime.now()
+    slug = "".join(c if c.isalnum() else "_" for c in f"{tags.get('section') or 'app'}_{tags.get('subsection') or ''}").strip("_")
+    file_name = f"{timestamp.strftime('%Y%m%d_%H%M%S')}_{slug}.speedscope.json"
+    name = f"{tags.get('section')} / {tags.get('subsection') or '-'} [{tags.get('language')}] {timestamp:%Y-%m-%d %H:%M:%S}"
+
+    with open(local_store_path(PROFILE_DIR, file_name), 'w', encoding='utf-8') as f:
+        json.dump(profiler.to_speedscope(name), f, ensure_ascii=False)
+
+    entry = {"file": file_name, "timestamp": timestamp.isoformat(timespec='seconds'),
+             "duration_s": round(profiler.end_time - profiler.start_time, 3), "samples": len(profiler.samples), **tags}
+    with open(local_store_path(PROFILE_DIR, PROFILE_INDEX_FILE), 'a', encoding='utf-8') as f:
+        f.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+
+    _prune_profiles(int(get_setting("PROFILE_MAX_FILES", 50)))
+    return file_name
+
+def _prune_profiles(max_files: int):
+    entries = list_profiles()
+    if len(entries) <= max_files: return
+    for entry in entries[max_files:]:
+        try: os.remove(local_store_path(PROFILE_DIR, entry['file']))
+        except FileNotFoundError: pass
+    with open(local_store_path(PROFILE_DIR, PROFILE_INDEX_FILE), 'w', encoding='utf-8') as f:
+        for entry in reversed(entries[:max_files]):
+            f.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+
+def list_profiles() -> List[Dict[str, Any]]:
+    """Devuelve las capturas registradas, de la más reciente a la más antigua."""
+    path = local_store_path(PROFILE_DIR, PROFILE_INDEX_FILE)
+    if not os.path.exists(path): return []
+    with open(path, 'r', encoding='utf-8') as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+    return list(reversed(entries))
+
+def profile_script_run(script: Callable[[], Any]) -> Callable[[], Any]:
+    """
+    Decorador de la función principal del script. Si un administrador ha pedido perfilar esta ejecución (botón en la
+    página de administración o `?profile=1` en la URL de una sesión de administrador), la ejecuta con el perfilador por
+    muestreo; si no, devuelve `script` sin cambios. Como el script se vuelve a ejecutar entero en cada interacción,
+    la decisión se toma en cada ejecución.
+    Si la ejecución se corta con `st.rerun()` (p. ej. al cambiar de sección), la captura se traslada a la
+    ejecución siguiente, que es la que realmente pinta la sección; si no, guarda un archivo speedscope etiquetado.
+
+    Uso:
+        @profile_script_run
+        def main():
+            ... # cuerpo del script
+        main()
+    """
+    if not _profile_requested(): return script
+
+    @functools.wraps(script)
+    def profiled(*args, **kwargs):
+        profiler = SamplingProfiler(interval=float(get_setting("PROFILE_INTERVAL_S", 0.005)))
+        profiler.start(root_frame=sys._getframe(1))
+        rerun_requested = False
+        try:
+            return script(*args, **kwargs)
+        except RerunException:
+            rerun_requested = True
+            raise
+        finally:
+            profiler.stop()
+            if rerun_requested:
+                st.session_state.profile_next_run = True
+            else:
+                _save_profile(profiler, _current_run_tags())
+    return profiled
+
+def admin_page(**kwargs):
+    """Página de administración: solo se registra en la navegación cuando `is_admin()` es verdadero."""
+    st.header("🛠️ Administración")
+    st.subheader("Perfilado bajo demanda")
+    st.markdown(
+        "Pulsa el botón y reproduce el caso lento: la **siguiente ejecución completa** del script se perfilará y se guardará "
+        "como archivo de [speedscope](https://www.speedscope.app), etiquetado con la sección, el idioma y el estado de los widgets."
+    )
+    if st.button("⏺️ Perfilar la próxima ejecución", type="primary"):
+        st.session_state.profile_next_run = True
+        st.toast("La próxima ejecución será perfilada.")
+
+    profiles = list_profiles()
+    if not profiles:
+        st.caption("Aún no hay capturas.")
+    else:
+        _profiles_view(profiles)
+
+    _session_memory_view()
+    _leaderboard_view()
+    _game_telemetry_view()
+    _ai_context_view()
+
+def _profiles_view(profiles: List[Dict[str, Any]]):
+    st.dataframe(pd.DataFrame([{
+        "Fecha": p['timestamp'], "Sección": p.get('section'), "Subsección": p.get('subsection'),
+        "Idioma": p.get('language'), "Duración (s)": p.get('duration_s'), "Muestras": p.get('samples'), "Archivo": p['file'],
+    } for p in profiles]), use_container_width=True, hide_index=True)
+
+    selected = st.selectbox("Captura:", options=[p['file'] for p in profiles], key="admin_profile_selected")
+    entry = next(p for p in profiles if p['file'] == selected)
+    with st.expander("Estado de los widgets en la captura"):
+        st.json(entry.get('widget_state', {}))
+    path = local_store_path(PROFILE_DIR, selected)
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            st.download_button("📥 Descargar perfil (speedscope)", data=f.read(), file_name=selected, mime="application/json")
+
+def _mb(n_bytes: int) -> float:
+    return round(n_bytes / (1024 * 1024), 2)
+
+def _session_memory_view():
+    st.subheader("Memoria de las sesiones")
+    st.caption(
+        f"Estimación del estado de cada sesión por categorías (límite por sesión: {get_setting('SESSION_MEMORY_CAP_MB', 25)} MB). "
+        f"Se mide al final de cada ejecución completa, como máximo cada {get_setting('SESSION_MEMORY_SAMPLE_S', 30)} s por sesión."
+    )
+    current = measure_session_state()
+    c1, c2 = st.columns(2)
+    c1.metric("Esta sesión (MB)", _mb(current['total']))
+    c1.dataframe(pd.DataFrame([{"Categoría": k, "MB": _mb(v)} for k, v in current['categories'].items()]), hide_index=True, use_container_width=True)
+    c2.dataframe(pd.DataFrame([{"Clave": k, "MB": _mb(v)} for k, v in current['largest']]), hide_index=True, use_container_width=True)
+
+    media = get_media_store().summary()
+    st.caption(f"Almacén de imágenes: {media['stored']} guardadas ({_mb(media['bytes_stored'])} MB), {media['deduplicated']} repetidas, "
+               f"{media['reads']} leídas a tamaño completo, {media['missing']} ya eliminadas.")
+    games = get_game_data_registry().summary()
+    st.caption(f"Datos compartidos de los minijuegos: {games['datasets']} conjuntos ({_mb(games['bytes'])} MB) y "
+               f"{games['rounds']} rondas precalculadas en {games['pools']} juegos, una sola vez para todas las sesiones.")
+
+    reports = session_memory_reports()
+    if not reports: return
+    st.metric("Sesiones medidas / total (MB)", f"{len(reports)} / {_mb(sum(r['total'] for r in reports))}")
+    own_id = get_session_id()
+    st.dataframe(pd.DataFrame([{
+        "Sesión": r['session_id'][:8] + (" (tú)" if r['session_id'] == own_id else ""),
+        "Medida": datetime.fromtimestamp(r['timestamp']).strftime('%H:%M:%S'),
+        "Sección": r.get('section'), "Idioma": r.get('language'), "Total (MB)": _mb(r['total']),
+        **{f"{k} (MB)": _mb(v) for k, v in r['categories'].items()},
+        "Liberado (MB)": _mb(r.get('freed_bytes', 0)),
+    } for r in reports]), hide_index=True, use_container_width=True)
+
+def _leaderboard_view():
+    st.subheader("Ranking")
+    store = get_leaderboard_store().summary()
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Puntuaciones guardadas", store['stored'], help=f"Recibidas en este proceso: {store['submitted']} · importadas de la hoja: {store['imported']}")
+    c2.metric("Pendientes de copiar a la hoja", store['pending'], help=f"Copiadas: {store['sent']} en {store['batches']} lotes")
+    c3.metric("Envíos fallidos", store['failures'], help=store['last_error'] or "Sin errores")
+    c4.metric("Próximo reintento en (s)", round(store['backoff_s'], 1) if store['backoff_s'] else "-")
+    st.caption(f"Hojas importadas: {', '.join(store['imported_sheets']) or 'ninguna'} · rankings en memoria: {store['cached_boards']}"
+               + (f" · último envío: {datetime.fromtimestamp(store['last_flush']).strftime('%H:%M:%S')}" if store['last_flush'] else ""))
+    sheets = get_sheet_handles().summary()
+    st.caption(f"Google Sheets: {sheets['calls']} operaciones, {sheets['opens']} aperturas de hoja ({sheets['opens_by_name']} por nombre), "
+               f"{sheets['connects']} clientes creados, {sheets['retries']} reintentos, {sheets['reconnects']} reconexiones, {sheets['errors']} errores.")
+
+def _game_telemetry_view():
+    st.subheader("Minijuegos")
+    log = get_game_event_log()
+    if log is None:
+        st.caption("El registro de eventos de los minijuegos está desactivado (GAME_TELEMETRY).")
+        return
+    events = log.summary()
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Rondas mostradas", events['round_started'])
+    c2.metric("Respuestas", events['answered'])
+    c3.metric("Partidas terminadas", events['game_finished'])
+    c4.metric("Rondas distintas", events['questions'])
+    if not events['events']: return
+    st.dataframe(log.game_rollup("game_type"), hide_index=True, use_container_width=True)
+    min_answers = st.number_input("Respuestas mínimas por ronda", min_value=1, value=5, key="admin_rollup_min_answers")
+    questions = log.question_rollup(int(min_answers))
+    st.caption("Rondas ordenadas de menor a mayor acierto: las primeras son candidatas a revisar o quitar del banco "
+               "(ver también tools/game_rollups.py).")
+    st.dataframe(questions.drop(columns=["question_id"]).head(50), hide_index=True, use_container_width=True)
+
+def _ai_context_view():
+    st.subheader("Contexto enviado a la IA")
+    cache = get_response_cache().summary()
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Respuestas cacheadas", cache['entries'], help=f"{_mb(cache['bytes'])} MB")
+    c2.metric("Aciertos exactos", cache['hits'])
+    c3.metric("Aciertos por similitud", cache['similar_hits'])
+    c4.metric("Fallos", cache['misses'], help=f"Expulsadas: {cache['evictions']}")
+
+    queue = get_request_scheduler().summary()
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Peticiones en curso", f"{queue['active']} / {queue['max_concurrent']}", help=f"Máximo observado: {queue['max_active']}")
+    c2.metric("En cola", queue['queued_now'], help=f"Máximo observado: {queue['max_queue']}")
+    c3.metric("Peticiones atendidas", queue['granted'], help=f"Tuvieron que esperar: {queue['queued']}")
+    c4.metric("Errores de cuota (429)", queue['rate_limited'], help=f"Reintentos: {queue['retries']}")
+    tasks = get_ai_task_registry().summary()
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Respuestas en segundo plano", tasks['running'], help=f"Lanzadas: {tasks['started']} · sin recoger: {tasks['tracked']}")
+    c2.metric("Completadas", tasks['completed'], help=f"Con error: {tasks['failed']}")
+    c3.metric("Canceladas al navegar", tasks['cancelled'], help=f"Aún en cola: {tasks['cancelled_queued']}")
+    c4.metric("Tokens ahorrados (est.)", tasks['tokens_saved'], help="Media de tokens de las respuestas completas menos los ya recibidos al cancelar.")
+    if local_execution_enabled():
+        sandbox = get_sandbox_pool().summary()
+        c1, c2, c3, c4 = st.columns(4)
+        c1.metric("Ejecuciones locales", sandbox['runs'], help=f"Con error: {sandbox['errors']}")
+        c2.metric("Tiempo medio (s)", round(sandbox['total_s'] / sandbox['runs'], 3) if sandbox['runs'] else "-")
+        c3.metric("Procesos libres", f"{sandbox['idle']} / {sandbox['workers']}")
+        c4.metric("Tiempo agotado / caídas", f"{sandbox['timeouts']} / {sandbox['crashes']}", help=f"Procesos reemplazados: {sandbox['respawns']}")
+        if sandbox.get('landlock') is not None:
+            isolation = f"usuario {sandbox['uid']}, Landlock {'v' + str(sandbox['landlock']) if sandbox['landlock'] else 'no disponible'}"
+            if sandbox['isolated']: st.caption(f"Aislamiento de la ejecución local: {isolation}.")
+            else: st.warning(f"La ejecución local no está aislada ({isolation}): el código puede leer lo mismo que la app. Configura AI_SANDBOX_USER o usa un kernel con Landlock.")
+    _render_metrics_view()
+    _history_view()
+    stats = context_stats()
+    if not stats:
+        st.caption("Aún no se ha enviado ningún contexto en este proceso.")
+        return
+    st.dataframe(pd.DataFrame([{
+        "Componente": key, "Idioma": v['lang'], "Bytes": v['bytes'], "Tokens (est.)": v['tokens'],
+    } for key, v in sorted(stats.items(), key=lambda kv: kv[1]['bytes'], reverse=True)]), hide_index=True, use_container_width=True)
+
+def _history_view():
+    conversations = history_stats()
+    compactor = get_history_compactor()
+    st.caption(f"Historial de las conversaciones: presupuesto de {compactor.budget_tokens} tokens, se conservan los "
+               f"{compactor.keep_turns} últimos turnos ({'resumen del backend' if compactor.summarize else 'resumen extractivo'}).")
+    if not conversations: return
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Conversaciones", len(conversations))
+    c2.metric("Compactaciones", sum(v['compactions'] for v in conversations.values()))
+    c3.metric("Tokens ahorrados", sum(v['saved_tokens'] for v in conversations.values()), help="Tokens de historial que no se han reenviado gracias a la compactación.")
+    c4.metric("Ahorro medio por conversación", round(sum(v['saved_tokens'] for v in conversations.values()) / len(conversations)))
+    st.dataframe(pd.DataFrame([{
+        "Componente": key, "Sesión": session_id[:8], "Tokens del historial": v['history_tokens'], "Sin compactar": v['full_tokens'],
+        "Compactaciones": v['compactions'], "Tokens ahorrados": v['saved_tokens'],
+    } for (key, session_id), v in sorted(conversations.items(), key=lambda kv: kv[1]['saved_tokens'], reverse=True)]), hide_index=True, use_container_width=True)
+
+def _render_metrics_view():
+    backend = get_ai_backend()
+    responses = [r for r in render_metrics() if not r['cached']]
+    st.caption(f"Backend de IA: {backend.name if backend else 'sin configurar'} · respuestas medidas: {len(responses)}")
+    if not responses: return
+    ttfc = pd.Series([r['ttfc_s'] for r in responses if r['ttfc_s'] is not None], dtype=float)
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Primer fragmento p50 (s)", round(ttfc.quantile(0.5), 3) if not ttfc.empty else "-")
+    c2.metric("Primer fragmento p90 (s)", round(ttfc.quantile(0.9), 3) if not ttfc.empty else "-")
+    c3.metric("Renderizado medio por respuesta (s)", round(sum(sum(r['render_s'].values()) for r in responses) / len(responses), 3))
+    c4.metric("Actualizaciones de texto por respuesta", round(sum(r.get('text_updates', 0) for r in responses) / len(responses), 1),
+              help=f"Fragmentos de texto por respuesta: {sum(r['counts'].get('text', 0) for r in responses) / len(responses):.1f}")
+    totals: Dict[str, List[float]] = {}
+    for r in responses:
+        for chunk_type, seconds in r['render_s'].items():
+            totals.setdefault(chunk_type, [0.0, 0])
+            totals[chunk_type][0] += seconds; totals[chunk_type][1] += r['counts'][chunk_type]
+    st.dataframe(pd.DataFrame([{
+        "Tipo de fragmento": t, "Fragmentos": int(n), "ms medios": round(1000 * s / n, 2), "Total (s)": round(s, 3)
+    } for t, (s, n) in totals.items()]), hide_index=True, use_container_width=True)
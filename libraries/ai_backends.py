@@ -0,0 +1,231 @@
+import io
+import time
+import streamlit as st
+from abc import ABC, abstractmethod
+from google import genai
+from google.genai import types
+from typing import Any, Callable, Iterable, Iterator, List, Tuple
+from .general_functions import get_setting
+
+Chunk = Tuple[str, Any, str | None]
+PYTHON_FENCE = "```python"
+EXECUTION_FEEDBACK_PREFIX = "[Resultado de la ejecución local]"
+
+class BackendChat(ABC):
+    """Una conversación con un modelo. Emite fragmentos normalizados (tipo, contenido, mime): 'text', 'code', 'result', 'image' o 'dataframe'."""
+    @abstractmethod
+    def send_message_stream(self, prompt: str) -> Iterator[Chunk]: pass
+    @abstractmethod
+    def get_history(self) -> List[types.Content]: pass
+
+class ChatBackend(ABC):
+    """Proveedor de modelos de lenguaje usado por `ask_ai_component`."""
+    name: str = "abstract"
+
+    @abstractmethod
+    def create_chat(self, *, system_instruction: str, history: List[types.Content] | None = None, code_execution: bool = True,
+                    response_format: str = "text") -> BackendChat:
+        """
+        `code_execution=False` desactiva la ejecución remota de código (modo local, ver `LocalExecutionChat`).
+        `response_format` es lo que pide la instrucción de sistema: "text" o "sql" (un bloque ```sql, ver sql_playground.py);
+        los modelos reales lo deducen de la instrucción y pueden ignorarlo.
+        """
+
+class GeminiChat(BackendChat):
+    def __init__(self, chat: Any):
+        self.chat = chat
+
+    def send_message_stream(self, prompt: str) -> Iterator[Chunk]:
+        for chunk in self.chat.send_message_stream(prompt):
+            if not chunk.candidates: continue
+            for part in chunk.candidates[0].content.parts:
+                if part.text: yield ("text", part.text, None)
+                elif part.executable_code: yield ("code", part.executable_code.code, None)
+                elif part.code_execution_result:
+                    outcome = getattr(part.code_execution_result, 'outcome', 'UNKNOWN')
+                    output = getattr(part.code_execution_result, 'output', '')
+                    if outcome == "OUTCOME_OK":
+                        if isinstance(output, types.Blob): yield ("image", output.data, output.mime_type)
+                        else: yield ("result", str(output), None)
+                    else: yield ("result", f"Error en ejecución: {outcome}\n{output}", None)
+                elif hasattr(part, 'inline_data') and part.inline_data.data: yield ("image", part.inline_data.data, part.inline_data.mime_type)
+
+    def get_history(self) -> List[types.Content]:
+        return self.chat.get_history()
+
+class GeminiBackend(ChatBackend):
+    """Gemini a través de `google.genai`, con la herramienta de ejecución de código activada."""
+    name = "gemini"
+
+    def __init__(self, client: genai.Client, model: str = "gemini-2.5-flash"):
+        self.client = client
+        self.model = model
+
+    def create_chat(self, *, system_instruction: str, history: List[types.Content] | None = None, code_execution: bool = True,
+                    response_format: str = "text") -> GeminiChat:
+        config = types.GenerateContentConfig(
+            response_mime_type="text/plain",
+            thinking_config=types.ThinkingConfig(include_thoughts=False),
+            system_instruction=system_instruction,
+            tools=[types.Tool(code_execution=types.ToolCodeExecution)] if code_execution else None, #type:ignore
+            candidate_count=1
+        )
+        return GeminiChat(self.client.chats.create(model=self.model, config=config, history=history)) #type:ignore
+
+def _stub_image() -> bytes:
+    from PIL import Image, ImageDraw
+    image = Image.new("RGB", (320, 200), "#0e1117")
+    draw = ImageDraw.Draw(image)
+    for i, height in enumerate((60, 120, 170, 140, 100)):
+        draw.rectangle((20 + i * 60, 190 - height, 60 + i * 60, 190), fill="#1f77b4")
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+class StubChat(BackendChat):
+    """
+    Conversación determinista: siempre la misma respuesta troceada (texto, código, tabla, imagen y texto final).
+    Sin ejecución remota (`code_execution=False`) el código llega como un bloque ```python dentro del texto,
+    y con `sql_mode=True` (`response_format="sql"`, lo pide el Playground SQL) responde con una consulta SQL fija.
+    """
+    TABLE = '```table-json\n{"columns":["Año","Matrícula"],"data":[[2020,285000],[2024,205000]]}\n```'
+    SQL = "SELECT name AS tabla FROM sqlite_master WHERE type = 'table' ORDER BY name"
+    LOCAL_CODE = "show(df_main.groupby('ano_inicio_curso')['matricula_total'].sum(), 'Matrícula por curso')\nprint(len(df_main))\n"
+
+    def __init__(self, backend: 'StubBackend', history: List[types.Content] | None = None, code_execution: bool = True, sql_mode: bool = False):
+        self.backend = backend
+        self.history = list(history or [])
+        self.code_execution = code_execution
+        self.sql_mode = sql_mode
+
+    def send_message_stream(self, prompt: str) -> Iterator[Chunk]:
+        chunks: List[Chunk] = [("text", f"Respuesta simulada a: {prompt}\n\n", None)]
+        if prompt.startswith(EXECUTION_FEEDBACK_PREFIX):
+            chunks = [("text", "Interpretación simulada de los resultados de la ejecución.", None)]
+        elif self.sql_mode:
+            chunks = [("text", f"```sql\n{self.SQL}\n```", None)]
+        elif self.code_execution:
+            chunks += [("text", f"Línea {i} de la explicación simulada. ", None) for i in range(self.backend.text_chunks)]
+            chunks += [
+                ("code", "print(df.head())", None),
+                ("result", self.TABLE, None),
+                ("image", self.backend.image, "image/png"),
+                ("text", "Fin de la respuesta simulada.", None),
+            ]
+        else:
+            chunks += [("text", f"Línea {i} de la explicación simulada. ", None) for i in range(self.backend.text_chunks)]
+            code_block = f"\n\n{PYTHON_FENCE}\n{self.LOCAL_CODE}```\n"
+            chunks += [("text", code_block[:12], None), ("text", code_block[12:40], None), ("text", code_block[40:], None)]
+            chunks.append(("text", "Fin de la respuesta simulada.", None))
+        time.sleep(self.backend.first_chunk_delay)
+        for i, chunk in enumerate(chunks):
+            if i and self.backend.chunk_delay: time.sleep(self.backend.chunk_delay)
+            yield chunk
+        self.history += [
+            types.Content(role="user", parts=[types.Part(text=prompt)]),
+            types.Content(role="model", parts=[types.Part(text="".join(c[1] for c in chunks if c[0] == "text"))]),
+        ]
+
+    def get_history(self) -> List[types.Content]:
+        return list(self.history)
+
+class StubBackend(ChatBackend):
+    """
+    Backend local sin red para pruebas, CI y pruebas de carga.
+    `first_chunk_delay` simula la latencia hasta el primer fragmento y `chunk_delay` la separación entre fragmentos.
+    """
+    name = "stub"
+
+    def __init__(self, first_chunk_delay: float = 0.0, chunk_delay: float = 0.0, text_chunks: int = 20):
+        self.first_chunk_delay = first_chunk_delay
+        self.chunk_delay = chunk_delay
+        self.text_chunks = text_chunks
+        self.image = _stub_image()
+
+    def create_chat(self, *, system_instruction: str, history: List[types.Content] | None = None, code_execution: bool = True,
+                    response_format: str = "text") -> StubChat:
+        return StubChat(self, history, code_execution, sql_mode=response_format == "sql")
+
+def split_python_blocks(chunks: Iterable[Chunk]) -> Iterator[Chunk]:
+    """
+    Separa los bloques ```python del texto en streaming: el texto sigue saliendo en fragmentos 'text'
+    y cada bloque completo sale como un fragmento 'code'. Retiene solo lo necesario para reconocer la valla.
+    """
+    pending, in_code = "", False
+    for chunk in chunks:
+        if chunk[0] != "text":
+            if pending and not in_code: yield ("text", pending, None); pending = ""
+            yield chunk
+            continue
+        pending += chunk[1]
+        while True:
+            if in_code:
+                end = pending.find("```")
+                if end == -1: break
+                yield ("code", pending[:end].strip("\n"), None)
+                pending, in_code = pending[end + 3:], False
+                continue
+            start = pending.find(PYTHON_FENCE)
+            if start != -1:
+                if start: yield ("text", pending[:start], None)
+                pending, in_code = pending[start + len(PYTHON_FENCE):], True
+                continue
+            hold = next((k for k in range(min(len(PYTHON_FENCE) - 1, len(pending)), 0, -1) if PYTHON_FENCE.startswith(pending[-k:])), 0)
+            if len(pending) > hold: yield ("text", pending[:len(pending) - hold], None)
+            pending = pending[len(pending) - hold:]
+            break
+    if pending: yield ("text", PYTHON_FENCE + pending if in_code else pending, None)
+
+class LocalExecutionChat(BackendChat):
+    """
+    Modo de ejecución local (AI_EXECUTION_MODE=local): el modelo escribe el código en bloques ```python,
+    que se ejecutan con `run_code` (ver libraries/ai_sandbox.py) y cuyos resultados se emiten como fragmentos
+    'dataframe', 'image' y 'result'. Después se le devuelve al modelo un resumen de los resultados para que
+    los comente, hasta `max_rounds` rondas por pregunta.
+    """
+    def __init__(self, chat: BackendChat, run_code: Callable[[str], Any], max_rounds: int = 2):
+        self.chat = chat
+        self.run_code = run_code
+        self.max_rounds = max_rounds
+
+    @staticmethod
+    def _result_chunks(result: Any) -> Iterator[Chunk]:
+        for title, df in result.tables:
+            if title: yield ("text", f"**{title}**\n\n", None)
+            yield ("dataframe", df, None)
+        for image in result.images: yield ("image", image, "image/png")
+        if result.stdout.strip(): yield ("result", f"```text\n{result.stdout.rstrip()}\n```", None)
+        if result.error: yield ("result", f"```text\nError en ejecución: {result.error}\n```", None)
+
+    def send_message_stream(self, prompt: str) -> Iterator[Chunk]:
+        message = prompt
+        for round_number in range(self.max_rounds):
+            results = []
+            if round_number: yield ("text", "\n\n", None)
+            for chunk in split_python_blocks(self.chat.send_message_stream(message)):
+                yield chunk
+                if chunk[0] != "code": continue
+                result = self.run_code(chunk[1])
+                results.append(result)
+                yield from self._result_chunks(result)
+            if not results or round_number == self.max_rounds - 1: return
+            message = EXECUTION_FEEDBACK_PREFIX + "\n" + "\n\n".join(r.feedback() for r in results)
+
+    def get_history(self) -> List[types.Content]:
+        return self.chat.get_history()
+
+@st.cache_resource(show_spinner=False, ttl=3600)
+def get_ai_backend() -> ChatBackend | None:
+    """
+    Devuelve el backend configurado en AI_BACKEND: 'gemini' (por defecto) o 'stub'.
+    Con 'gemini' se necesita GEMINI_API_KEY (variable de entorno o '.streamlit/secrets.toml'); sin ella devuelve None.
+    """
+    backend = str(get_setting("AI_BACKEND", "gemini")).lower()
+    if backend == "stub":
+        return StubBackend(
+            first_chunk_delay=float(get_setting("AI_STUB_FIRST_CHUNK_S", 0.0)),
+            chunk_delay=float(get_setting("AI_STUB_CHUNK_DELAY_S", 0.0)),
+        )
+    api_key = get_setting("GEMINI_API_KEY")
+    if not api_key: return None
+    return GeminiBackend(genai.Client(api_key=api_key), model=str(get_setting("GEMINI_MODEL", "gemini-2.5-flash")))
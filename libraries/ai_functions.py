@@ -3,29 +3,29 @@ import io
 import re
 import pandas as pd
 from plotly import graph_objects as go
-from google import genai
-from google.genai import types
-from google.generativeai.generative_models import ChatSession
 import streamlit as st
 import json
 import time
+import math
+import base64
+import hashlib
+import threading
 import numpy as np
+from collections import deque
+from typing import Callable, Iterable
+from .general_functions import get_setting, get_session_id, local_store_path
+from .plot_functions import cargar_datos_matricula, cargar_datos_instituciones
+from .ai_scheduler import RequestScheduler, RequestCancelled
+from .ai_sandbox import SandboxPool, ALLOWED_MODULES, write_arrow_dataset, describe_datasets
+from .ai_backends import BackendChat, LocalExecutionChat, get_ai_backend
+from .ai_history import HistoryCompactor, CompactingChat
+from .ai_tasks import AITask, AITaskRegistry
+from .ai_response_cache import get_response_cache
+from .media_store import image_message_content, load_image
+from .chat_store import (init_chat_history, append_chat_messages, earlier_messages_count, load_earlier_messages,
+                         reset_chat_history, get_live_chat, register_live_chat, save_chat_context, load_chat_context,
+                         get_chat_store)
 
-@st.cache_resource(show_spinner=False, ttl=3600)
-def configure_gemini_client():
-    api_key = os.environ.get("GEMINI_API_KEY")
-    if not api_key:
-        try:
-            if "GEMINI_API_KEY" in st.secrets:
-                api_key = st.secrets["GEMINI_API_KEY"]
-            else:
-                st.warning("Error: GEMINI_API_KEY not found, you will use your own api key, you must go to: https://aistudio.google.com/u/0/apikey and load it on a entorn variable or store in: '.streamlit/secrets.toml' and store: 'GEMINI_API_KEY'='Your Own API Key'.")
-                return None
-        except Exception as e:
-            return None
-    return genai.Client(api_key=api_key)
-
-gemini_client = configure_gemini_client()
 PATTERN_BLOCKS  = re.compile(r"```(?P<tipo>\S+)\n(?P<contenido>.*?)```(?:\n|$)", re.DOTALL)
 
 def parse_blocks(pattern, texto):
@@ -84,6 +84,152 @@ def _convert_context_to_string_list(context_list):
         else: st.warning(f"Tipo de contexto no soportado para IA: {type(item)}. Se ignorará.")
     return string_parts
 
+CONTEXT_TRACE_ARRAYS = ('x', 'y', 'z', 'labels', 'values', 'text')
+_context_stats: dict = {}
+_context_stats_lock = threading.Lock()
+
+def _round_number(value, digits: int = 4):
+    """Redondea a `digits` cifras significativas (sin tocar la parte entera) y convierte a int los valores enteros."""
+    if isinstance(value, (bool, np.bool_)) or not isinstance(value, (int, float, np.integer, np.floating)): return value
+    if isinstance(value, (int, np.integer)): return int(value)
+    if not math.isfinite(value): return None
+    if float(value).is_integer(): return int(value)
+    rounded = round(float(value), max(0, digits - 1 - int(math.floor(math.log10(abs(value))))))
+    return int(rounded) if rounded.is_integer() else rounded
+
+def _round_nested(item, digits: int):
+    if isinstance(item, dict): return {k: _round_nested(v, digits) for k, v in item.items()}
+    if isinstance(item, (list, tuple)): return [_round_nested(v, digits) for v in item]
+    if isinstance(item, np.ndarray): return _round_nested(item.tolist(), digits)
+    return _round_number(item, digits)
+
+def _compact_csv(df: pd.DataFrame, digits: int) -> str:
+    df = df.astype(object).map(lambda v: str(v) if isinstance(v, (list, tuple, np.ndarray)) else "" if pd.isna(v) else str(_round_number(v, digits)))
+    return df.to_csv(index=False, lineterminator='\n').strip()
+
+def _context_fingerprint(item) -> str:
+    """Huella estable del contenido de un elemento de contexto (texto, dict, DataFrame, Series o gráfico)."""
+    h = hashlib.sha1()
+    if isinstance(item, (pd.DataFrame, pd.Series)):
+        h.update(type(item).__name__.encode())
+        h.update(repr(list(item.columns) if isinstance(item, pd.DataFrame) else item.name).encode())
+        h.update(pd.util.hash_pandas_object(item, index=True).values.tobytes())
+    elif isinstance(item, go.Figure):
+        h.update(repr(_figure_header(item)).encode())
+        for trace in item.data:
+            h.update(f"{trace.type}|{getattr(trace, 'name', None)}|{getattr(trace, 'orientation', None)}".encode())
+            for attr in CONTEXT_TRACE_ARRAYS:
+                values = getattr(trace, attr, None)
+                if values is not None: h.update(attr.encode()); h.update(repr(np.asarray(values, dtype=object).tolist()).encode())
+    elif isinstance(item, dict):
+        h.update(json.dumps(item, sort_keys=True, default=str, ensure_ascii=False).encode())
+    else:
+        h.update(str(item).encode())
+    return h.hexdigest()
+
+def context_fingerprint(context_list: list) -> str:
+    """Huella combinada de una lista de contexto (ver `_context_fingerprint`)."""
+    return hashlib.sha1("|".join(_context_fingerprint(item) for item in context_list if item is not None).encode()).hexdigest()
+
+def _figure_header(fig: go.Figure) -> dict:
+    layout = fig.layout
+    header = {
+        'title': layout.title.text if layout.title else None,
+        'x': layout.xaxis.title.text if layout.xaxis and layout.xaxis.title else None,
+        'y': layout.yaxis.title.text if layout.yaxis and layout.yaxis.title else None,
+        'barmode': layout.barmode,
+        'legend': layout.legend.title.text if layout.legend and layout.legend.title else None,
+    }
+    return {k: v for k, v in header.items() if v}
+
+def _encode_figure(fig: go.Figure, item_number: int, digits: int) -> str:
+    """Describe un gráfico de Plotly como una cabecera JSON compacta más una tabla CSV por traza."""
+    parts = [f"Gráfico (Contexto {item_number}): " + json.dumps(_figure_header(fig), ensure_ascii=False, separators=(',', ':'))]
+    for i, trace in enumerate(fig.data):
+        columns = {}
+        for attr in CONTEXT_TRACE_ARRAYS:
+            values = getattr(trace, attr, None)
+            if values is None or isinstance(values, str): continue
+            columns[attr] = np.asarray(values, dtype=object)
+        name = f"Traza {i + 1} ({trace.type}{', ' + str(trace.name) if getattr(trace, 'name', None) else ''})"
+        z = columns.pop('z', None)
+        if z is not None and z.ndim == 2:
+            table = pd.DataFrame(z.tolist(), index=columns.get('y'), columns=columns.get('x'))
+            parts.append(f"{name}, matriz z (filas=y, columnas=x):\n```csv\n{_compact_csv(table.reset_index(names=''), digits)}\n```")
+            continue
+        lengths = {len(v) for v in columns.values() if v.ndim == 1}
+        if len(lengths) == 1:
+            table = pd.DataFrame({k: v for k, v in columns.items() if v.ndim == 1})
+            parts.append(f"{name}:\n```csv\n{_compact_csv(table, digits)}\n```")
+        else:
+            values = {k: _round_nested(v.tolist(), digits) for k, v in columns.items()}
+            parts.append(f"{name}: " + json.dumps(values, ensure_ascii=False, separators=(',', ':'), default=str))
+    return "\n".join(parts)
+
+def _encode_context_item(item, item_number: int, digits: int) -> str | None:
+    if isinstance(item, str): return item
+    if isinstance(item, dict):
+        return f"Datos (Contexto {item_number}, JSON):\n```json\n{json.dumps(_round_nested(item, digits), ensure_ascii=False, separators=(',', ':'), default=str)}\n```"
+    if isinstance(item, pd.Series): item = item.to_frame().reset_index()
+    if isinstance(item, pd.DataFrame):
+        return f"Datos de Tabla (Contexto {item_number}, CSV):\n```csv\n{_compact_csv(item, digits)}\n```"
+    if isinstance(item, go.Figure): return _encode_figure(item, item_number, digits)
+    return None
+
+def _describe_context_item(item, item_number: int) -> str | None:
+    """Solo la estructura de un elemento de contexto (sin los datos), para el modo de ejecución local."""
+    if isinstance(item, str): return item
+    if isinstance(item, dict): return f"Datos (Contexto {item_number}): claves {', '.join(map(str, list(item)[:30]))}"
+    if isinstance(item, pd.Series): item = item.to_frame().reset_index()
+    if isinstance(item, pd.DataFrame):
+        return f"Tabla (Contexto {item_number}): {len(item)} filas; columnas: " + ", ".join(f"{c} ({t})" for c, t in item.dtypes.items())
+    if isinstance(item, go.Figure):
+        traces = ", ".join(f"{t.type}{' ' + repr(t.name) if getattr(t, 'name', None) else ''}" for t in item.data)
+        return f"Gráfico (Contexto {item_number}): " + json.dumps(_figure_header(item), ensure_ascii=False, separators=(',', ':')) + f"; trazas: {traces}"
+    return None
+
+@st.cache_data(show_spinner=False, max_entries=512)
+def _encode_context_cached(fingerprint: str, lang: str, item_number: int, digits: int, schema_only: bool, _item) -> str | None:
+    """Codifica un elemento de contexto; Streamlit cachea por (huella, idioma, posición) sin hashear el objeto."""
+    return _describe_context_item(_item, item_number) if schema_only else _encode_context_item(_item, item_number, digits)
+
+def serialize_context(context_list: list, key: str | None = None, schema_only: bool = False) -> list[str]:
+    """
+    Versión compacta y cacheada de `_convert_context_to_string_list`: tablas CSV, números redondeados y JSON sin sangría.
+    Cada elemento se codifica una sola vez por proceso y por (huella del contenido, idioma), y el tamaño resultante
+    (bytes y tokens estimados, ~4 bytes por token) se registra por `key` para la página de administración.
+    La comparación con el formato anterior está en tools/ai_benchmark.py, fuera de la ejecución de la app.
+
+    Args:
+        context_list (list): Textos, dicts, DataFrames, Series o figuras de Plotly.
+        key (str|None): Clave del componente de IA, solo para las estadísticas.
+        schema_only (bool): Solo la estructura de tablas y gráficos, sin sus datos (modo de ejecución local).
+
+    Returns:
+        list[str]: Un texto por elemento de contexto soportado.
+    """
+    translator = st.session_state.get('Translator')
+    lang = getattr(translator, 'actual_lang', '') or ''
+    digits = int(get_setting("AI_CONTEXT_DIGITS", 4))
+    parts = []
+    for item_idx, item in enumerate(context_list):
+        if item is None: continue
+        encoded = _encode_context_cached(_context_fingerprint(item), lang, item_idx + 1, digits, schema_only, item)
+        if encoded is None:
+            st.warning(f"Tipo de contexto no soportado para IA: {type(item)}. Se ignorará.")
+            continue
+        parts.append(encoded)
+    if key is not None:
+        size = len("\n\n---\n\n".join(parts).encode())
+        with _context_stats_lock:
+            _context_stats[key] = {"bytes": size, "tokens": size // 4, "lang": lang, "updated": time.time()}
+    return parts
+
+def context_stats() -> dict:
+    """Tamaño del último contexto enviado por cada componente de IA: {clave: {'bytes', 'tokens', 'lang', 'updated'}}."""
+    with _context_stats_lock:
+        return {k: dict(v) for k, v in _context_stats.items()}
+
 def _try_parse_string_to_df(text_output: str) -> pd.DataFrame | None:
     if not text_output or len(text_output.splitlines()) < 2: return None
     try:
@@ -92,29 +238,288 @@ def _try_parse_string_to_df(text_output: str) -> pd.DataFrame | None:
         return df
     except (ValueError, pd.errors.ParserError, pd.errors.EmptyDataError): return None
 
-def stream_ai_chat_response(chat_session: ChatSession, prompt: str):
-    if not gemini_client:
+def _read_table_json(payload: str) -> pd.DataFrame:
+    return pd.read_json(io.StringIO(payload), orient="split", dtype=False, convert_dates=False)
+
+def _read_table_binary(payload: str) -> pd.DataFrame:
+    data = base64.b64decode(payload)
+    if data[:4] == b"PAR1": return pd.read_parquet(io.BytesIO(data))
+    import pyarrow as pa
+    return (pa.ipc.open_file(data) if data[:6] == b"ARROW1" else pa.ipc.open_stream(data)).read_pandas()
+
+# Protocolo de resultados del código generado: tablas como JSON (orient='split') o Parquet/Arrow en base64,
+# imágenes como PNG/JPEG en base64. Los bloques 'table' y 'dataframe' (texto impreso) siguen usando _try_parse_string_to_df.
+TABLE_BLOCK_DECODERS: dict[str, Callable[[str], pd.DataFrame]] = {
+    "table-json": _read_table_json, "parquet-b64": _read_table_binary, "arrow-b64": _read_table_binary,
+}
+IMAGE_BLOCK_TYPES = {"png-b64": "image/png", "jpeg-b64": "image/jpeg"}
+LEGACY_TABLE_BLOCKS = {"table", "dataframe"}
+
+def decode_table_block(block_type: str, payload: str) -> pd.DataFrame | None:
+    """
+    Convierte el contenido de un bloque ```tipo``` en un DataFrame.
+
+    Args:
+        block_type (str): 'table-json', 'parquet-b64', 'arrow-b64' o los antiguos 'table'/'dataframe'.
+        payload (str): Contenido del bloque.
+
+    Returns:
+        pd.DataFrame | None: La tabla, o None si el contenido no se puede interpretar.
+    """
+    decoder = TABLE_BLOCK_DECODERS.get(block_type)
+    if decoder is None: return _try_parse_string_to_df(payload)
+    try:
+        return decoder(payload.strip())
+    except Exception:
+        return _try_parse_string_to_df(payload) if block_type == "table-json" and not payload.lstrip().startswith("{") else None
+
+def decode_image_block(payload: str) -> bytes | None:
+    try:
+        return base64.b64decode("".join(payload.split()), validate=True)
+    except ValueError:
+        return None
+
+@st.cache_resource(show_spinner=False)
+def get_request_scheduler() -> RequestScheduler:
+    """Planificador de peticiones a la IA compartido por todas las sesiones (límite AI_MAX_CONCURRENT, reintentos ante 429)."""
+    return RequestScheduler(
+        max_concurrent=int(get_setting("AI_MAX_CONCURRENT", 4)),
+        max_retries=int(get_setting("AI_MAX_RETRIES", 3)),
+        base_delay=float(get_setting("AI_RETRY_BASE_S", 2.0)),
+    )
+
+SANDBOX_DATASETS = {"df_main": (cargar_datos_matricula, 'data/db.parquet'), "df_ins": (cargar_datos_instituciones, 'data/db_uni.parquet')}
+
+def local_execution_enabled() -> bool:
+    return str(get_setting("AI_EXECUTION_MODE", "remote")).lower() == "local"
+
+@st.cache_resource(show_spinner=False)
+def get_sandbox_pool() -> SandboxPool:
+    """
+    Procesos de ejecución local del código de la IA (AI_EXECUTION_MODE=local) con `df_main` y `df_ins` en Arrow IPC.
+    Si la app se ejecuta como root, los procesos usan el usuario AI_SANDBOX_USER (por defecto `nobody`; vacío para no
+    cambiarlo), que tiene que poder ejecutar el intérprete de Python.
+    """
+    datasets = {name: write_arrow_dataset(loader(path), local_store_path("sandbox", f"{name}.arrow")) for name, (loader, path) in SANDBOX_DATASETS.items()}
+    return SandboxPool(
+        datasets,
+        workers=int(get_setting("AI_SANDBOX_WORKERS", 2)),
+        timeout_s=float(get_setting("AI_SANDBOX_TIMEOUT_S", 10)),
+        cpu_s=int(get_setting("AI_SANDBOX_CPU_S", 10)),
+        memory_mb=int(get_setting("AI_SANDBOX_MEMORY_MB", 512)),
+        max_rows=int(get_setting("AI_SANDBOX_MAX_ROWS", 500)),
+        user=get_setting("AI_SANDBOX_USER", "nobody") or None,
+    )
+
+@st.cache_data(show_spinner=False)
+def sandbox_schema() -> str:
+    """Esquema de los DataFrames disponibles en la ejecución local (lo único de esos datos que recibe el modelo)."""
+    return describe_datasets({name: loader(path) for name, (loader, path) in SANDBOX_DATASETS.items()})
+
+LOCAL_EXECUTION_INSTRUCTIONS = """
+        **Local Code Execution (replaces the code execution tool and the table display rules above):**
+        - You do NOT have a code execution tool. To compute something, write the Python code in a single ```python block; the app runs it and shows its results to the user.
+        - The code runs with these variables already loaded: `df_main` (enrollment by career, institution and academic year) and `df_ins` (higher education institutions), both pandas DataFrames (text columns use the pandas `string` dtype), plus `pd`, `np` and `plt`. The context below only describes their schema, not the data: compute what you need from them.
+        - Call `show(df, "title")` to display a DataFrame or Series as a table. Matplotlib figures are displayed automatically. `print()` output is shown as plain text.
+        - Only these modules can be imported: {modules}. Work only with the loaded DataFrames: do not read or write files or use the network.
+        - After the code runs you will receive a summary of its results; then explain them to the user in your own words.
+        """
+
+HISTORY_SUMMARY_INSTRUCTION = """
+You summarize a conversation between a user and a data analysis assistant about Cuban higher education enrollment.
+Write at most 150 words in the language of the conversation. Keep the user's questions, the key figures and the conclusions.
+Do not include code, tables or the original data context.
+"""
+_history_stats: dict = {}
+_history_stats_lock = threading.Lock()
+
+def _summarize_with_backend(conversation: str) -> str:
+    chat = get_ai_backend().create_chat(system_instruction=HISTORY_SUMMARY_INSTRUCTION, code_execution=False) #type:ignore
+    stream = get_request_scheduler().stream(get_session_id(), lambda: chat.send_message_stream(conversation))
+    return "".join(content for kind, content, _ in stream if kind == "text")
+
+@st.cache_resource(show_spinner=False)
+def get_history_compactor() -> HistoryCompactor:
+    """Política de compactación de las conversaciones (AI_HISTORY_TOKEN_BUDGET, AI_HISTORY_KEEP_TURNS; AI_HISTORY_SUMMARY=backend|extractive)."""
+    return HistoryCompactor(
+        budget_tokens=int(get_setting("AI_HISTORY_TOKEN_BUDGET", 8000)),
+        keep_turns=int(get_setting("AI_HISTORY_KEEP_TURNS", 2)),
+        summarize=_summarize_with_backend if str(get_setting("AI_HISTORY_SUMMARY", "extractive")).lower() == "backend" else None,
+    )
+
+def _record_history_stats(key: str, chat: CompactingChat):
+    with _history_stats_lock:
+        _history_stats[(key, get_session_id())] = {
+            "history_tokens": chat.history_tokens(), "full_tokens": chat.full_tokens,
+            "saved_tokens": chat.saved_tokens, "compactions": chat.compactions, "updated": time.time(),
+        }
+        while len(_history_stats) > 1000: _history_stats.pop(next(iter(_history_stats)))
+
+def history_stats() -> dict:
+    """Historial de cada conversación en este proceso: {(clave, sesión): {'history_tokens', 'full_tokens', 'saved_tokens', 'compactions', 'updated'}}."""
+    with _history_stats_lock:
+        return {k: dict(v) for k, v in _history_stats.items()}
+
+def stream_ai_chat_response(chat_session: BackendChat, prompt: str, on_wait: Callable[[int], None] | None = None,
+                            session_id: str | None = None, cancel_event: threading.Event | None = None):
+    if chat_session is None:
         yield ("error", "El asistente de IA no está configurado correctamente.", None)
         return
     try:
-        stream = chat_session.send_message_stream(prompt)
-        for chunk in stream:
-            if not chunk.candidates: continue
-            for part in chunk.candidates[0].content.parts:
-                if part.text: yield ("text", part.text, None)
-                elif part.executable_code: yield ("code", part.executable_code.code, None)
-                elif part.code_execution_result:
-                    outcome = getattr(part.code_execution_result, 'outcome', 'UNKNOWN')
-                    output = getattr(part.code_execution_result, 'output', '')
-                    if outcome == "OUTCOME_OK":
-                        if isinstance(output, types.Blob): yield ("image", output.data, output.mime_type)
-                        else: yield ("result", str(output), None)
-                    else: yield ("result", f"Error en ejecución: {outcome}\n{output}", None)
-                elif hasattr(part, 'inline_data') and part.inline_data.data: yield ("image", part.inline_data.data, part.inline_data.mime_type)
+        yield from get_request_scheduler().stream(session_id or get_session_id(), lambda: chat_session.send_message_stream(prompt),
+                                                  on_wait=on_wait, cancel_event=cancel_event)
+    except RequestCancelled:
+        raise
     except Exception as e:
-        st.error(f"Error en la comunicación con Gemini: {e}")
         yield ("error", f"Error al comunicarse con el asistente de IA: {e}.", None)
 
+ACTIVE_SECTION_KEY = "ai_active_section"
+
+@st.cache_resource(show_spinner=False)
+def get_ai_task_registry() -> AITaskRegistry:
+    """Respuestas de la IA en segundo plano de todas las sesiones (ver libraries/ai_tasks.py)."""
+    return AITaskRegistry()
+
+def _ai_request(chat_session: BackendChat, prompt: str, session_id: str, cached_chunks: list | None) -> Callable[[AITask], Iterable]:
+    """Generador de fragmentos de una tarea: la respuesta cacheada o la del backend (las esperas en cola salen como fragmentos 'queue')."""
+    if cached_chunks: return lambda task: cached_chunks
+    return lambda task: stream_ai_chat_response(chat_session, prompt, on_wait=lambda position: task.push(("queue", position, None)),
+                                                session_id=session_id, cancel_event=task.cancel_event)
+
+def cancel_stale_ai_tasks(section: str, interrupted_note: str):
+    """
+    Llamar en cada ejecución completa con la sección visible: cancela las respuestas de esta sesión lanzadas en otra sección,
+    guarda en el historial lo que ya se había recibido y libera el indicador `processing_{clave}` de cada componente.
+    No espera a los hilos: el historial del modelo se guarda cuando cada tarea termina (`AITask.add_done_callback`).
+
+    Args:
+        section (str): Sección visible en esta ejecución.
+        interrupted_note (str): Nota traducida que se añade a las respuestas cortadas.
+    """
+    st.session_state[ACTIVE_SECTION_KEY] = section
+    session_id, store = get_session_id(), get_chat_store()
+    for task in get_ai_task_registry().cancel_stale(session_id, section):
+        text = task.text().strip()
+        if task.status != "completed": text = f"{text}\n\n*{interrupted_note}*" if text else f"*{interrupted_note}*"
+        append_chat_messages(task.key, [{"role": "assistant", "content": text}])
+        chat = st.session_state.get(f"gemini_chat_{task.key}")
+        if chat is not None:
+            task.add_done_callback(lambda task, chat=chat: store.save_context(session_id, task.key, chat.get_history()))
+        st.session_state[f"processing_{task.key}"] = False
+        st.session_state.pop(f"response_cache_{task.key}", None)
+    if not any(k.startswith("processing_") and v for k, v in st.session_state.items()):
+        st.session_state.pop('last_prompt', None)
+
+_render_metrics: deque = deque(maxlen=200)
+_render_metrics_lock = threading.Lock()
+
+class _ResponseTimer:
+    """Mide una respuesta del asistente: tiempo hasta el primer fragmento y tiempo de renderizado por tipo de fragmento."""
+    def __init__(self, key: str, backend: str, cached: bool):
+        self.record = {"component": key, "backend": backend, "cached": cached, "ttfc_s": None, "total_s": 0.0, "chunks": 0, "render_s": {}, "counts": {}}
+        self._start = time.perf_counter()
+        self._chunk_start = None; self._chunk_type = None
+
+    def received(self, chunk_type: str):
+        self._chunk_start = time.perf_counter(); self._chunk_type = chunk_type
+        if self.record["ttfc_s"] is None: self.record["ttfc_s"] = self._chunk_start - self._start
+
+    def rendered(self):
+        if self._chunk_start is None: return
+        elapsed = time.perf_counter() - self._chunk_start
+        self.record["chunks"] += 1
+        self.record["render_s"][self._chunk_type] = self.record["render_s"].get(self._chunk_type, 0.0) + elapsed
+        self.record["counts"][self._chunk_type] = self.record["counts"].get(self._chunk_type, 0) + 1
+        self._chunk_start = None
+
+    def finish(self, text_updates: int = 0):
+        self.record["total_s"] = time.perf_counter() - self._start
+        self.record["text_updates"] = text_updates
+        self.record["timestamp"] = time.time()
+        with _render_metrics_lock: _render_metrics.append(self.record)
+
+class _StreamRenderer:
+    """
+    Muestra el texto de una respuesta en streaming sin reenviar el mensaje completo con cada fragmento.
+
+    - Agrupa los fragmentos: el texto se actualiza como mucho cada AI_STREAM_RENDER_MS milisegundos,
+      o antes si hay más de AI_STREAM_RENDER_CHARS caracteres pendientes.
+    - Los párrafos terminados (separados por una línea en blanco y fuera de un bloque ```) se fijan en su propio
+      elemento; solo el párrafo en curso se vuelve a enviar en cada actualización.
+    - `updates` cuenta las actualizaciones de texto enviadas al navegador.
+    """
+    def __init__(self, container):
+        self.container = container
+        self.interval_s = float(get_setting("AI_STREAM_RENDER_MS", 100)) / 1000
+        self.max_pending_chars = int(get_setting("AI_STREAM_RENDER_CHARS", 1000))
+        self.updates = 0
+        self._placeholder = None
+        self._last_flush = 0.0
+        self._reset()
+
+    def _reset(self):
+        self.text = ""; self._frozen = 0; self._shown = 0; self._placeholder = None
+
+    def add(self, delta: str):
+        self.text += delta
+        if len(self.text) - self._shown >= self.max_pending_chars or time.perf_counter() - self._last_flush >= self.interval_s:
+            self.flush()
+
+    def _paragraph_end(self) -> int:
+        """Final del último párrafo completo que no deja un bloque de código abierto."""
+        i = self.text.rfind("\n\n", self._frozen)
+        while i != -1 and self.text.count("```", 0, i) % 2:
+            i = self.text.rfind("\n\n", self._frozen, i)
+        return self._frozen if i == -1 else i + 2
+
+    def _render(self, text: str):
+        if self._placeholder is None: self._placeholder = self.container.empty()
+        self._placeholder.markdown(text)
+        self.updates += 1
+
+    def flush(self):
+        if self._shown == len(self.text): return
+        end = self._paragraph_end()
+        if end > self._frozen:
+            self._render(self.text[self._frozen:end])
+            self._placeholder = None; self._frozen = end
+        if self._frozen < len(self.text): self._render(self.text[self._frozen:])
+        self._shown = len(self.text)
+        self._last_flush = time.perf_counter()
+
+    def finish_segment(self) -> str:
+        """Muestra el texto pendiente y cierra el bloque de texto actual (antes de un código, imagen o tabla). Devuelve su texto."""
+        self.flush()
+        text = self.text
+        self._reset()
+        return text
+
+def render_metrics() -> list[dict]:
+    """Métricas de las últimas respuestas del asistente en este proceso (ver `_ResponseTimer`)."""
+    with _render_metrics_lock:
+        return [dict(r) for r in _render_metrics]
+
+def _render_history_message(message: dict, key: str, i: int, translation: dict):
+    with st.chat_message(message["role"]):
+        content = message["content"]
+        if isinstance(content, dict) and content.get("type") == "image":
+            caption = f"{translation.get('generated_image', 'Imagen generada')} ({content.get('mime_type', 'image/png')})"
+            full_size = translation.get('full_size_image', "🔍 Tamaño completo ({width}×{height})")
+            if content.get("ref") is None:
+                st.image(content["data"], caption=caption)
+            elif st.toggle(full_size.format(width=content.get('width'), height=content.get('height')), key=f"full_image_{key}_{i}") and (full_image := load_image(content)) is not None:
+                st.image(full_image, caption=caption)
+            else:
+                st.image(content["thumbnail"], caption=caption)
+        elif isinstance(content, dict) and content.get("type") == "dataframe":
+            st.dataframe(content["data"], use_container_width=True)
+        elif isinstance(content, dict) and content.get("type") == "code_result":
+            st.code(content["data"], language=None)
+        elif isinstance(content, dict) and content.get("type") == "code_download":
+            st.download_button(label="📥 Descargar Código", data=content["code"], file_name=f"codigo_{key}_{i}.py", mime="text/x-python", key=f"download_hist_{key}_{i}")
+        else:
+            st.markdown(content)
+
 @st.fragment
 def ask_ai_component(*, 
                      key: str, 
@@ -132,7 +537,9 @@ def ask_ai_component(*,
     """
     if translation is None:
         translation = {}
-    if not gemini_client: 
+    backend = get_ai_backend()
+    local_execution = local_execution_enabled()
+    if backend is None: 
         st.warning(
             f"Error loading GEMINI_API_KEY: You must use your own API key. "
             "Go to https://aistudio.google.com/u/0/apikey, set it as an environment variable, "
@@ -147,30 +554,25 @@ def ask_ai_component(*,
         gemini_chat_key = f"gemini_chat_{key}"
         processing_key = f"processing_{key}"
 
-        if display_history_key not in st.session_state: st.session_state[display_history_key] = [{"role": 'assistant' , "content": ai_initial_response_text}]
+        init_chat_history(key, [{"role": 'assistant' , "content": ai_initial_response_text}])
         if gemini_chat_key not in st.session_state: st.session_state[gemini_chat_key] = None
         if processing_key not in st.session_state: st.session_state[processing_key] = False
 
-        for i, message in enumerate(st.session_state[display_history_key]):
-            with st.chat_message(message["role"]):
-                content = message["content"]
-                if isinstance(content, dict) and content.get("type") == "image":
-                    st.image(content["data"], caption=f"Imagen generada ({content.get('mime_type', 'image/png')})")
-                elif isinstance(content, dict) and content.get("type") == "dataframe":
-                    st.dataframe(content["data"], use_container_width=True)
-                elif isinstance(content, dict) and content.get("type") == "code_result":
-                    st.code(content["data"], language=None)
-                elif isinstance(content, dict) and content.get("type") == "code_download":
-                    st.download_button(label="📥 Descargar Código", data=content["code"], file_name=f"codigo_{key}_{i}.py", mime="text/x-python", key=f"download_hist_{key}_{i}")
-                else:
-                    st.markdown(content)
+        earlier_count = earlier_messages_count(key)
+        if earlier_count and not st.session_state.get(f"show_earlier_{key}", False):
+            if st.button(translation.get('load_earlier_messages', "⬆️ Cargar {n} mensajes anteriores").format(n=earlier_count), key=f"load_earlier_{key}"):
+                st.session_state[f"show_earlier_{key}"] = True; st.rerun(scope='fragment')
+        earlier = load_earlier_messages(key) if earlier_count and st.session_state.get(f"show_earlier_{key}", False) else []
+
+        for i, message in enumerate(earlier + st.session_state[display_history_key]):
+            _render_history_message(message, key, i, translation)
         
         system_instruction = """
         You are a highly efficient data analysis assistant, an expert in the Cuban higher education system. Your goal is to respond to the user's questions clearly and accurately, based EXCLUSIVELY on the context provided to you.
 
         **Analysis Guidelines:**
-        1. **Context:** You will receive context in the form of text and structured data (Markdown, dict, etc.). Chart data will be provided in dict format for your precise reading and use.
-        2. **Data Processing:** When you see chart data in dict format, **NEVER attempt to reconstruct the full chart object in your Python code.** Instead, **extract only the specific data you need** (such as totals, years, x and y axes, etc.) and use it directly to build your pandas DataFrame and perform analysis.
+        1. **Context:** You will receive context in the form of text and structured data (Markdown, dict, etc.). Tables and chart traces will be provided as compact CSV blocks (one per trace, numbers rounded), with chart titles and axes as JSON.
+        2. **Data Processing:** When you see chart data, **NEVER attempt to reconstruct the full chart object in your Python code.** Instead, **extract only the specific data you need** (such as totals, years, x and y axes, etc.) and use it directly to build your pandas DataFrame and perform analysis.
         3. **Code Execution:** You have access to a Python code execution tool. Use it to perform calculations, analyze data, or generate new visualizations for the user.
         4. **Available Libraries:** You may ONLY use standard libraries and the following third-party packages:
         `attrs, chess, contourpy, fpdf, geopandas, imageio, jinja2, joblib, jsonschema, jsonschema-specifications, lxml, matplotlib, mpmath, numpy, opencv-python, openpyxl, packaging, pandas, pillow, protobuf, pylatex, pyparsing, PyPDF2, python-dateutil, python-docx, python-pptx, reportlab, scikit-learn, scipy, seaborn, six, striprtf, sympy, tabulate, tensorflow, toolz, xlrd`. Do not attempt to use any others.
@@ -182,9 +584,11 @@ def ask_ai_component(*,
 
         **Response Structure:**
         - Provide a clear and concise summary of the results in text.
-        - **Displaying Tables to the User (IMPORTANT):** To show a table or DataFrame to the user, you **MUST** print it between special delimiters.
+        - **Displaying Tables to the User (IMPORTANT):** To show a table or DataFrame to the user, you **MUST** print it as JSON between special delimiters, exactly like this:
+          `print("```table-json"); print(df.to_json(orient="split", index=False, date_format="iso", force_ascii=False)); print("```")`
+          Never print a table as plain text: the user only sees it if it is sent in this format.
 
-        - The user does NOT see the raw output of your executed code—only what you express inside print("```(type)") and print("```"). For example, if you generate a DataFrame, you must print it between those delimiters. To show text directly from the code result, use print('```text') or print('```markdown'), depending on the format—but ideally, explain the result to the user in your own words.
+        - The user does NOT see the raw output of your executed code—only what you express inside print("```(type)") and print("```"). To show text directly from the code result, use print('```text') or print('```markdown'), depending on the format—but ideally, explain the result to the user in your own words.
 
         - If you generate a chart, the user will see it as an image, so you don’t need to print it between delimiters—just use `plt.show()` to display it.
 
@@ -200,90 +604,132 @@ def ask_ai_component(*,
                 col_reset, col_input = st.columns([1, 20])
                 with col_reset:
                     if st.button("🔄", key=f"reset_chat_{key}", help=translation.get('restart_conversation',"Reiniciar esta conversación")):
-                        st.session_state[display_history_key] = [{"role": "assistant", "content": ai_initial_response_text + f"\nCurrent user language: {translation.get('current_language', "English")}"}]; st.session_state[gemini_chat_key] = None; st.session_state[processing_key] = False; st.rerun(scope='fragment')
+                        reset_chat_history(key, [{"role": "assistant", "content": ai_initial_response_text + f"\nCurrent user language: {translation.get('current_language', "English")}"}]); st.session_state[f"show_earlier_{key}"] = False; st.session_state[processing_key] = False; st.rerun(scope='fragment')
                 with col_input:
                     prompt = st.chat_input(translation.get('your_question_here', "Escribe tu pregunta aquí..."), key=f"chat_input_{key}")
 
             if prompt:
-                st.session_state[display_history_key].append({"role": "user", "content": prompt})
-                chat_session = st.session_state.get(gemini_chat_key)
+                append_chat_messages(key, [{"role": "user", "content": prompt}])
+                chat_session = get_live_chat(key)
                 if chat_session is None:
                     initial_context_data = [analysis_context] + (extra_data if extra_data else [])
-                    string_list_for_history = _convert_context_to_string_list(initial_context_data)
+                    history = load_chat_context(key)
+                    cached_response = None
+                    if history is None:
+                        # Primer turno: la respuesta solo depende del contexto, del idioma y de la pregunta.
+                        cache_lookup = (key, context_fingerprint(initial_context_data) + (":local" if local_execution else ""), getattr(st.session_state.get('Translator'), 'actual_lang', ''), prompt)
+                        cached_response = get_response_cache().get(*cache_lookup)
+                        # Solo se guarda la clave: los fragmentos (imágenes incluidas) siguen en la caché compartida, no en la sesión.
+                        st.session_state[f"response_cache_{key}"] = {"lookup": cache_lookup, "entry": cached_response.key if cached_response else None}
+                        if cached_response: history = cached_response.history_contents()
+                    if local_execution:
+                        system_instruction += LOCAL_EXECUTION_INSTRUCTIONS.format(modules=", ".join(sorted(ALLOWED_MODULES)))
+                        string_list_for_history = serialize_context(initial_context_data + [f"Esquema de los datos disponibles en el código:\n{sandbox_schema()}"], key=key, schema_only=True)
+                    else:
+                        string_list_for_history = serialize_context(initial_context_data, key=key)
                     full_context_string = "\n\n---\n\n".join(string_list_for_history)
-                    tools = [types.Tool(code_execution=types.ToolCodeExecution)];  #type:ignore
-                    config = types.GenerateContentConfig(
-                        response_mime_type="text/plain", 
-                        thinking_config=types.ThinkingConfig(include_thoughts=False), 
-                        system_instruction=system_instruction + 'datos de contexto:\n'+ full_context_string, 
-                        tools=tools,  #type:ignore
-                        candidate_count=1
-                    )
-
-                    #initial_history = [types.Content(role="user", parts=[types.Part.from_text(text=full_context_string)]), types.Content(role="model", parts=[types.Part.from_text(text="Contexto y datos recibidos. Estoy listo para tus preguntas.")])]
-                    chat_session = gemini_client.chats.create(model="gemini-2.5-flash", config=config)#, history=initial_history)
-                    st.session_state[gemini_chat_key] = chat_session
+                    full_system_instruction = system_instruction + 'datos de contexto:\n'+ full_context_string
+
+                    def create_chat(history):
+                        chat = backend.create_chat(system_instruction=full_system_instruction, history=history, code_execution=not local_execution)
+                        if local_execution:
+                            chat = LocalExecutionChat(chat, get_sandbox_pool().run, max_rounds=int(get_setting("AI_SANDBOX_MAX_ROUNDS", 2)))
+                        return chat
+                    chat_session = CompactingChat(create_chat, history, get_history_compactor())
+                    register_live_chat(key, chat_session)
                 st.session_state['last_prompt'] = prompt; st.session_state[processing_key] = True; st.rerun(scope='fragment')
         else:
             with st.chat_message("assistant"):
                 response_container = st.container()
-                text_placeholder = response_container.empty()
-                accumulated_text = ""; display_messages_to_add = []
+                renderer = _StreamRenderer(response_container)
+                display_messages_to_add = []
                 chat_session = st.session_state[gemini_chat_key]
                 prompt_to_send = st.session_state.get('last_prompt', "")
+                response_cache = st.session_state.get(f"response_cache_{key}") or {}
+                cached_response = get_response_cache().entry(response_cache["entry"]) if response_cache.get("entry") else None
+                cached_chunks = cached_response.chunks if cached_response else None
+                session_id, tasks = get_session_id(), get_ai_task_registry()
+                # La respuesta se genera en segundo plano: si esta ejecución se interrumpe, la siguiente vuelve a leerla desde el principio.
+                task = tasks.get(session_id, key)
+                if task is None:
+                    if not prompt_to_send:
+                        st.session_state[processing_key] = False; st.rerun(scope='fragment')
+                    task = tasks.start(session_id, key, st.session_state.get(ACTIVE_SECTION_KEY, ""), prompt_to_send,
+                                       _ai_request(chat_session, prompt_to_send, session_id, cached_chunks))
+                received_chunks = []
+                timer = _ResponseTimer(key, backend.name, cached=bool(cached_chunks))
                 with st.spinner(translation.get('thinking', "Procesando tu solicitud...")):
-                    stream_generator = stream_ai_chat_response(chat_session=chat_session, prompt=prompt_to_send)
-                    for response_type, content, mime_type in stream_generator:
+                    if cached_chunks:
+                        st.caption(translation.get('cached_response', "⚡ Respuesta reutilizada de una pregunta anterior."))
+                    queue_placeholder = response_container.empty()
+                    queue_text = translation.get('queue_position', "⏳ Hay mucha demanda ahora mismo: tu pregunta es la número {position} en la cola.")
+                    for response_type, content, mime_type in task.iter_chunks():
+                        if response_type == "queue":
+                            queue_placeholder.info(queue_text.format(position=content)); continue
+                        timer.received(response_type)
+                        if not received_chunks: queue_placeholder.empty()
+                        received_chunks.append((response_type, content, mime_type))
                         if response_type == "text":
-                            accumulated_text += content #type:ignore
-                            text_placeholder.markdown(accumulated_text)
+                            renderer.add(content) #type:ignore
 
                         elif response_type == "code":
-                            if accumulated_text:
-                                text_placeholder.markdown(accumulated_text); display_messages_to_add.append({"role": "assistant", "content": accumulated_text}); accumulated_text = ""
+                            if segment := renderer.finish_segment(): display_messages_to_add.append({"role": "assistant", "content": segment})
                             
                             with response_container.container():
                                 st.download_button(label=translation.get('code_download', "📥 Descargar Código"), data=content, file_name=f"codigo_{key}.py", mime="text/x-python", key=f"download_live_code_{key}_{time.time()}")
                             
                             display_messages_to_add.append({"role": "assistant", "content": {"type": "code_download", "code": content}})
-                            text_placeholder = response_container.empty()
 
                         elif response_type == "image":
-                            if accumulated_text:
-                                text_placeholder.markdown(accumulated_text); display_messages_to_add.append({"role": "assistant", "content": accumulated_text}); accumulated_text = ""
+                            if segment := renderer.finish_segment(): display_messages_to_add.append({"role": "assistant", "content": segment})
                             
                             with response_container.container():
                                 st.image(content, caption=f"{translation.get('generated_image', "Imagen generada")} ({mime_type})") #type:ignore
                             
-                            display_messages_to_add.append({"role": "assistant", "content": {"type": "image", "data": content, "mime_type": mime_type}})
-                            text_placeholder = response_container.empty()
+                            display_messages_to_add.append({"role": "assistant", "content": image_message_content(content, mime_type)})
                         
+                        elif response_type == "dataframe":
+                            if segment := renderer.finish_segment(): display_messages_to_add.append({"role": "assistant", "content": segment})
+                            with response_container.container(): st.dataframe(content)
+                            display_messages_to_add.append({"role": "assistant", "content": {"type": "dataframe", "data": content}})
+
                         elif response_type == "result":
-                            if accumulated_text:
-                                text_placeholder.markdown(accumulated_text); display_messages_to_add.append({"role": "assistant", "content": accumulated_text}); accumulated_text = ""
+                            if segment := renderer.finish_segment(): display_messages_to_add.append({"role": "assistant", "content": segment})
                             
                             for type, data_str in parse_blocks(PATTERN_BLOCKS,content):
-                                if type == 'table' or type == 'dataframe':
-                                    df_from_result = _try_parse_string_to_df(data_str)
+                                if type in LEGACY_TABLE_BLOCKS or type in TABLE_BLOCK_DECODERS:
+                                    df_from_result = decode_table_block(type, data_str)
                                     if df_from_result is not None:
                                         with response_container.container(): st.dataframe(df_from_result)
                                         display_messages_to_add.append({"role": "assistant", "content": {"type": "dataframe", "data": df_from_result}})
                                     else:
                                         with response_container.container(): st.code(f"Error al parsear tabla:\n{data_str}", language=None)
                                         display_messages_to_add.append({"role": "assistant", "content": {"type": "code_result", "data": f"{translation.get('error_parsing_table',"Error al parsear tabla")}:\n{data_str}"}})
+                                elif type in IMAGE_BLOCK_TYPES and (image_bytes := decode_image_block(data_str)):
+                                    with response_container.container(): st.image(image_bytes)
+                                    display_messages_to_add.append({"role": "assistant", "content": image_message_content(image_bytes, IMAGE_BLOCK_TYPES[type])})
                                 elif type == 'text' or type == 'markdown':
                                     with response_container.container():
                                         st.markdown(data_str)
                                     display_messages_to_add.append({"role": "assistant", "content": data_str})
 
-                            text_placeholder = response_container.empty()
                         elif response_type == "error":
-                            st.error(content); accumulated_text = content; break
+                            if segment := renderer.finish_segment(): display_messages_to_add.append({"role": "assistant", "content": segment})
+                            st.error(content); renderer.add(content); break
+                        timer.rendered()
                 
-                if accumulated_text:
-                    text_placeholder.markdown(accumulated_text); display_messages_to_add.append({"role": "assistant", "content": accumulated_text})
+                if segment := renderer.finish_segment(): display_messages_to_add.append({"role": "assistant", "content": segment})
+                timer.finish(text_updates=renderer.updates)
                 
-            st.session_state[display_history_key].extend(display_messages_to_add)
+            tasks.remove(session_id, key, task)
+            st.session_state.pop(f"response_cache_{key}", None)
+            append_chat_messages(key, display_messages_to_add)
+            if response_cache.get("lookup") and not response_cache.get("entry") and not any(c[0] == "error" for c in received_chunks):
+                get_response_cache().put(*response_cache["lookup"], received_chunks, chat_session.get_history())
+            if isinstance(chat_session, CompactingChat):
+                chat_session.compact()
+                _record_history_stats(key, chat_session)
+            save_chat_context(key, chat_session)
             st.session_state[processing_key] = False
             if 'last_prompt' in st.session_state: del st.session_state['last_prompt']
             st.rerun(scope='fragment')
\ No newline at end of file
@@ -0,0 +1,133 @@
+import re
+from google.genai import types
+from typing import Callable, Iterator, List
+from .ai_backends import BackendChat, Chunk, EXECUTION_FEEDBACK_PREFIX
+
+CHARS_PER_TOKEN = 4
+IMAGE_TOKENS = 258
+SUMMARY_PREFIX = "[Resumen de la conversación anterior]"
+SUMMARY_ACK = "De acuerdo, continúo la conversación a partir de este resumen."
+PATTERN_CODE_FENCES = re.compile(r"```.*?(?:```|$)", re.DOTALL)
+
+Turn = List[types.Content]
+
+def _part_text(part: types.Part) -> str:
+    if part.text: return part.text
+    if part.executable_code: return part.executable_code.code or ""
+    if part.code_execution_result: return part.code_execution_result.output or ""
+    return ""
+
+def estimate_tokens(history: List[types.Content]) -> int:
+    """Tokens aproximados que ocupa el historial en cada petición (4 caracteres por token y 258 por imagen)."""
+    chars, images = 0, 0
+    for content in history:
+        for part in content.parts or []:
+            if part.inline_data: images += 1
+            else: chars += len(_part_text(part))
+    return chars // CHARS_PER_TOKEN + images * IMAGE_TOKENS
+
+def _text_of(content: types.Content) -> str:
+    return "".join(part.text or "" for part in content.parts or [])
+
+def split_turns(history: List[types.Content]) -> List[Turn]:
+    """Agrupa el historial en turnos: cada mensaje del usuario con todo lo que le sigue (código, resultados y la
+    realimentación de la ejecución local, que también llega con el rol 'user')."""
+    turns: List[Turn] = []
+    for content in history:
+        if content.role == "user" and not _text_of(content).startswith(EXECUTION_FEEDBACK_PREFIX) or not turns:
+            turns.append([content])
+        else:
+            turns[-1].append(content)
+    return turns
+
+def _is_summary(turn: Turn) -> bool:
+    return _text_of(turn[0]).startswith(SUMMARY_PREFIX)
+
+def _clip(text: str, max_chars: int) -> str:
+    text = " ".join(PATTERN_CODE_FENCES.sub(" ", text).split())
+    return text if len(text) <= max_chars else text[:max_chars].rsplit(" ", 1)[0] + "…"
+
+def transcript(turns: List[Turn], max_chars_per_message: int = 300) -> str:
+    """Texto de los turnos sin código, resultados ni imágenes. Un resumen anterior se conserva tal cual al principio."""
+    lines = []
+    for turn in turns:
+        if _is_summary(turn):
+            lines.append(_text_of(turn[0])[len(SUMMARY_PREFIX):].strip())
+            continue
+        lines.append(f"- Usuario: {_clip(_text_of(turn[0]), max_chars_per_message)}")
+        answer = " ".join(_text_of(c) for c in turn[1:] if c.role == "model")
+        if answer.strip(): lines.append(f"  Asistente: {_clip(answer, max_chars_per_message)}")
+    return "\n".join(lines)
+
+class HistoryCompactor:
+    """
+    Política de compactación del historial de una conversación con la IA.
+
+    Cuando el historial supera `budget_tokens`, los turnos anteriores a los `keep_turns` más recientes se sustituyen
+    por un resumen: el que devuelve `summarize(transcripción)` (p. ej. el propio backend) o, si no hay función o falla,
+    uno extractivo con el principio de cada pregunta y respuesta. Las instrucciones de sistema con los datos de contexto
+    van en la configuración del chat y nunca se copian al historial, así que se envían una sola vez por petición.
+
+    No depende de Streamlit; ver `get_history_compactor` en ai_functions.py.
+    """
+    def __init__(self, budget_tokens: int = 8000, keep_turns: int = 2, summarize: Callable[[str], str] | None = None):
+        self.budget_tokens = budget_tokens
+        self.keep_turns = keep_turns
+        self.summarize = summarize
+        self.max_summary_chars = budget_tokens * CHARS_PER_TOKEN // 4
+
+    def _summary(self, turns: List[Turn]) -> str:
+        if self.summarize is not None:
+            try:
+                summary = self.summarize(transcript(turns, max_chars_per_message=2000)).strip()
+                if summary: return summary[:self.max_summary_chars]
+            except Exception:
+                pass
+        summary = transcript(turns)
+        return summary if len(summary) <= self.max_summary_chars else "…" + summary[-self.max_summary_chars:].split("\n", 1)[-1]
+
+    def compact(self, history: List[types.Content]) -> List[types.Content] | None:
+        """Devuelve el historial compactado, o None si no supera el presupuesto o no hay nada que resumir."""
+        tokens = estimate_tokens(history)
+        if tokens <= self.budget_tokens: return None
+        turns = split_turns(history)
+        cut = max(0, len(turns) - self.keep_turns)
+        if cut == 0 or (cut == 1 and _is_summary(turns[0])): return None
+        compacted = [
+            types.Content(role="user", parts=[types.Part(text=f"{SUMMARY_PREFIX}\n{self._summary(turns[:cut])}")]),
+            types.Content(role="model", parts=[types.Part(text=SUMMARY_ACK)]),
+        ] + [content for turn in turns[cut:] for content in turn]
+        return compacted if estimate_tokens(compacted) < tokens else None
+
+class CompactingChat(BackendChat):
+    """
+    Conversación cuyo historial se compacta con `compactor` al llamar a `compact()` (tras cada respuesta, fuera del
+    streaming). Como el historial de un chat no se puede sustituir, `create_chat(historial)` crea uno nuevo con las
+    mismas instrucciones. `saved_tokens` acumula los tokens de historial que no se han reenviado gracias a la compactación.
+    """
+    def __init__(self, create_chat: Callable[[List[types.Content] | None], BackendChat], history: List[types.Content] | None, compactor: HistoryCompactor):
+        self._create_chat = create_chat
+        self.compactor = compactor
+        self.chat = create_chat(history)
+        self.full_tokens = estimate_tokens(history or [])
+        self.saved_tokens = 0
+        self.compactions = 0
+
+    def send_message_stream(self, prompt: str) -> Iterator[Chunk]:
+        sent = estimate_tokens(self.chat.get_history())
+        self.saved_tokens += max(0, self.full_tokens - sent)
+        yield from self.chat.send_message_stream(prompt)
+        self.full_tokens += estimate_tokens(self.chat.get_history()) - sent
+
+    def get_history(self) -> List[types.Content]:
+        return self.chat.get_history()
+
+    def history_tokens(self) -> int:
+        return estimate_tokens(self.chat.get_history())
+
+    def compact(self) -> bool:
+        compacted = self.compactor.compact(self.chat.get_history())
+        if compacted is None: return False
+        self.chat = self._create_chat(compacted)
+        self.compactions += 1
+        return True
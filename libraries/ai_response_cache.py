@@ -0,0 +1,150 @@
+import re
+import json
+import hashlib
+import threading
+import unicodedata
+import pandas as pd
+import streamlit as st
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from google.genai import types
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.metrics.pairwise import linear_kernel
+from typing import Any, Dict, List, Tuple
+from .general_functions import get_setting
+
+Chunk = Tuple[str, Any, str | None]
+
+def normalize_prompt(prompt: str) -> str:
+    """Minúsculas, sin tildes ni signos de puntuación y con los espacios colapsados."""
+    text = unicodedata.normalize("NFKD", prompt.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return re.sub(r"\s+", " ", re.sub(r"[^\w\s]", " ", text)).strip()
+
+def _chunk_size(content: Any) -> int:
+    """Bytes aproximados de un fragmento: texto e imágenes por longitud, tablas por su memoria y figuras por su JSON."""
+    if isinstance(content, (str, bytes)): return len(content)
+    if isinstance(content, pd.DataFrame): return int(content.memory_usage(index=True, deep=True).sum())
+    if hasattr(content, "to_json"): return len(content.to_json())
+    return len(json.dumps(content, default=str))
+
+@dataclass
+class CachedResponse:
+    """Una respuesta completa del asistente: los fragmentos tal como los produce `stream_ai_chat_response` y el historial del modelo."""
+    chunks: List[Chunk]
+    history: List[dict]
+    key: str = ""
+    size: int = 0
+    hits: int = 0
+
+    def history_contents(self) -> List[types.Content]:
+        return [types.Content.model_validate(c) for c in self.history]
+
+@dataclass
+class _Bucket:
+    """Preguntas cacheadas de un mismo (componente, contexto, idioma), para el nivel por similitud."""
+    prompts: Dict[str, str] = field(default_factory=dict) # prompt normalizado -> clave exacta
+    vectorizer: TfidfVectorizer | None = None
+    matrix: Any = None
+
+class ResponseCache:
+    """
+    Caché de respuestas del asistente de IA para preguntas de primer turno, compartida por todo el proceso.
+
+    Nivel exacto: clave = (componente, huella del contexto, idioma, pregunta normalizada).
+    Nivel por similitud (opcional, `similarity_threshold` > 0): TF-IDF de n-gramas de caracteres sobre las preguntas
+    ya cacheadas con el mismo componente, contexto e idioma; se reutiliza la más parecida si supera el umbral.
+    Se expulsan las entradas menos usadas recientemente al superar `max_entries` o `max_bytes`.
+    """
+    def __init__(self, max_entries: int = 256, max_bytes: int = 64 * 1024 * 1024, similarity_threshold: float = 0.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.similarity_threshold = similarity_threshold
+        self._entries: OrderedDict[str, CachedResponse] = OrderedDict()
+        self._bucket_of: Dict[str, Tuple[str, str]] = {}
+        self._buckets: Dict[str, _Bucket] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "similar_hits": 0, "misses": 0, "evictions": 0}
+
+    @staticmethod
+    def make_key(component: str, context_fingerprint: str, lang: str, prompt: str) -> str:
+        return hashlib.sha1(json.dumps([component, context_fingerprint, lang, normalize_prompt(prompt)]).encode()).hexdigest()
+
+    @staticmethod
+    def _bucket_key(component: str, context_fingerprint: str, lang: str) -> str:
+        return f"{component}|{context_fingerprint}|{lang}"
+
+    def get(self, component: str, context_fingerprint: str, lang: str, prompt: str) -> CachedResponse | None:
+        key = self.make_key(component, context_fingerprint, lang, prompt)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+            elif self.similarity_threshold > 0:
+                entry = self._similar(self._bucket_key(component, context_fingerprint, lang), normalize_prompt(prompt))
+                if entry is not None: self.stats["similar_hits"] += 1
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            entry.hits += 1
+            return entry
+
+    def entry(self, key: str) -> CachedResponse | None:
+        """Entrada por su clave exacta sin contarla como acierto, para reproducirla en la ejecución siguiente."""
+        with self._lock:
+            return self._entries.get(key)
+
+    def _similar(self, bucket_key: str, normalized: str) -> CachedResponse | None:
+        bucket = self._buckets.get(bucket_key)
+        if bucket is None or not bucket.prompts: return None
+        prompts = list(bucket.prompts)
+        if bucket.vectorizer is None:
+            bucket.vectorizer = TfidfVectorizer(analyzer="char_wb", ngram_range=(3, 5))
+            bucket.matrix = bucket.vectorizer.fit_transform(prompts)
+        scores = linear_kernel(bucket.vectorizer.transform([normalized]), bucket.matrix).ravel()
+        best = int(scores.argmax())
+        if scores[best] < self.similarity_threshold: return None
+        key = bucket.prompts[prompts[best]]
+        self._entries.move_to_end(key)
+        return self._entries[key]
+
+    def put(self, component: str, context_fingerprint: str, lang: str, prompt: str, chunks: List[Chunk], history: List[types.Content]):
+        key = self.make_key(component, context_fingerprint, lang, prompt)
+        bucket_key = self._bucket_key(component, context_fingerprint, lang)
+        entry = CachedResponse(chunks=list(chunks), history=[c.model_dump(mode="json", exclude_none=True) for c in history], key=key)
+        entry.size = sum(_chunk_size(c[1]) for c in chunks) + len(json.dumps(entry.history))
+        if entry.size > self.max_bytes: return
+        with self._lock:
+            if key in self._entries: self._remove(key)
+            self._entries[key] = entry
+            self._bytes += entry.size
+            self._bucket_of[key] = (bucket_key, normalize_prompt(prompt))
+            bucket = self._buckets.setdefault(bucket_key, _Bucket())
+            bucket.prompts[normalize_prompt(prompt)] = key
+            bucket.vectorizer = None
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.stats["evictions"] += 1
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+        bucket_key, normalized = self._bucket_of.pop(key)
+        bucket = self._buckets[bucket_key]
+        bucket.prompts.pop(normalized, None)
+        bucket.vectorizer = None
+        if not bucket.prompts: del self._buckets[bucket_key]
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.stats, "entries": len(self._entries), "bytes": self._bytes}
+
+@st.cache_resource(show_spinner=False)
+def get_response_cache() -> ResponseCache:
+    return ResponseCache(
+        max_entries=int(get_setting("AI_RESPONSE_CACHE_SIZE", 256)),
+        max_bytes=int(float(get_setting("AI_RESPONSE_CACHE_MB", 64)) * 1024 * 1024),
+        similarity_threshold=float(get_setting("AI_RESPONSE_CACHE_SIMILARITY", 0.0)),
+    )
@@ -0,0 +1,399 @@
+import io
+import os
+import sys
+import json
+import time
+import queue
+import atexit
+import ctypes
+import shutil
+import socket
+import builtins
+import tempfile
+import threading
+import contextlib
+import subprocess
+import pandas as pd
+from multiprocessing.connection import Connection
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Tuple
+
+try:
+    import resource
+except ImportError:  # Windows: sin límites de CPU/memoria por proceso
+    resource = None
+
+ALLOWED_MODULES = {
+    "pandas", "numpy", "math", "statistics", "datetime", "re", "json", "collections", "itertools", "functools",
+    "string", "textwrap", "matplotlib", "seaborn", "scipy",
+}
+BLOCKED_BUILTINS = {"open", "input", "breakpoint", "exit", "quit", "help", "compile", "exec", "eval", "__import__"}
+MAX_STDOUT_CHARS = 20000
+
+@dataclass
+class SandboxResult:
+    """Resultado de ejecutar un bloque de código: salida de `print`, tablas mostradas con `show()`, figuras PNG y error."""
+    stdout: str = ""
+    tables: List[Tuple[str | None, pd.DataFrame]] = field(default_factory=list)
+    images: List[bytes] = field(default_factory=list)
+    error: str | None = None
+    duration_s: float = 0.0
+
+    def feedback(self, max_rows: int = 20, max_chars: int = 2000) -> str:
+        """Resumen compacto del resultado para devolvérselo al modelo."""
+        parts = []
+        if self.error: parts.append(f"Error: {self.error}")
+        if self.stdout.strip(): parts.append(f"Salida:\n```text\n{self.stdout[:max_chars]}\n```")
+        for title, df in self.tables:
+            parts.append(f"Tabla{' ' + title if title else ''} ({len(df)} filas):\n```csv\n{df.head(max_rows).to_csv(index=False)[:max_chars]}```")
+        if self.images: parts.append(f"{len(self.images)} gráfico(s) mostrados al usuario.")
+        return "\n".join(parts) or "El código no produjo salida."
+
+def write_arrow_dataset(df: pd.DataFrame, path: str) -> str:
+    """Escribe `df` en formato Arrow IPC sin comprimir (para abrirlo con memory-map) de forma atómica."""
+    import pyarrow as pa
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(tmp_path, path)
+    return path
+
+def describe_datasets(frames: Dict[str, pd.DataFrame], max_examples: int = 5) -> str:
+    """Esquema de los DataFrames disponibles en el entorno de ejecución: filas, columnas, tipos y algunos valores de ejemplo."""
+    lines = []
+    for name, df in frames.items():
+        lines.append(f"`{name}`: {len(df)} filas")
+        for column, dtype in df.dtypes.items():
+            detail = str(dtype)
+            if dtype == object:
+                values = df[column].dropna().unique()
+                detail += f", {len(values)} valores distintos, p. ej. {', '.join(map(str, values[:max_examples]))}"
+            elif pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype) and len(df):
+                detail += f", rango {df[column].min()} – {df[column].max()}"
+            lines.append(f"  - {column}: {detail}")
+    return "\n".join(lines)
+
+def _restricted_import(name, globals=None, locals=None, fromlist=(), level=0):
+    if level or name.split(".")[0] not in ALLOWED_MODULES:
+        raise ImportError(f"Módulo no permitido en el entorno de ejecución: {name}")
+    return builtins.__import__(name, globals, locals, fromlist, level)
+
+def _safe_builtins() -> dict:
+    safe = {k: v for k, v in vars(builtins).items() if k not in BLOCKED_BUILTINS}
+    safe["__import__"] = _restricted_import
+    return safe
+
+def _address_space_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f: return int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+def _apply_memory_limit(memory_mb: int):
+    """Limita la memoria virtual a la ya reservada tras la precarga (bibliotecas y datos) más `memory_mb`."""
+    if resource is None or not memory_mb: return
+    limit = _address_space_bytes() + memory_mb * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+def _apply_cpu_limit(cpu_s: int):
+    """Límite de CPU para la próxima ejecución: el proceso es reutilizable, así que se suma al tiempo ya consumido."""
+    if resource is None or not cpu_s: return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    soft = int(usage.ru_utime + usage.ru_stime) + cpu_s
+    resource.setrlimit(resource.RLIMIT_CPU, (soft if hard == resource.RLIM_INFINITY else min(soft, hard), hard))
+
+def _execute(code: str, frames: Dict[str, pd.DataFrame], cpu_s: int, max_rows: int) -> SandboxResult:
+    import numpy as np
+    import matplotlib.pyplot as plt
+    result, stdout = SandboxResult(), io.StringIO()
+
+    def show(obj: Any, title: str | None = None):
+        """Muestra una tabla al usuario."""
+        if isinstance(obj, pd.Series): obj = obj.to_frame()
+        if not isinstance(obj, pd.DataFrame): obj = pd.DataFrame(obj)
+        if not isinstance(obj.index, pd.RangeIndex): obj = obj.reset_index()
+        result.tables.append((title, obj.head(max_rows)))
+
+    namespace = {
+        "__builtins__": _safe_builtins(), "__name__": "__sandbox__",
+        "pd": pd, "np": np, "plt": plt, "show": show,
+        **{name: df.copy(deep=False) for name, df in frames.items()},
+    }
+    start = time.perf_counter()
+    _apply_cpu_limit(cpu_s)
+    try:
+        with contextlib.redirect_stdout(stdout):
+            exec(builtins.compile(code, "<codigo_ia>", "exec"), namespace)
+    except BaseException as e:
+        result.error = f"{type(e).__name__}: {e}"
+    result.duration_s = time.perf_counter() - start
+    result.stdout = stdout.getvalue()[:MAX_STDOUT_CHARS]
+    for number in plt.get_fignums():
+        buffer = io.BytesIO()
+        plt.figure(number).savefig(buffer, format="png", bbox_inches="tight")
+        result.images.append(buffer.getvalue())
+    plt.close("all")
+    return result
+
+def _map_dataset(fd: int) -> pd.DataFrame:
+    """DataFrame sobre el archivo Arrow IPC abierto en `fd`, con memory-map de solo lectura (ver SandboxPool)."""
+    import mmap
+    import pyarrow as pa
+    mapped = mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+    os.close(fd)
+    table = pa.ipc.open_file(pa.py_buffer(mapped)).read_all()
+    strings = pd.StringDtype("pyarrow")
+    return table.to_pandas(types_mapper={pa.string(): strings, pa.large_string(): strings}.get, split_blocks=True)
+
+def _table_bytes(df: pd.DataFrame) -> bytes:
+    """Serializa una tabla de `show()` en Arrow IPC (nombres de columna como texto y únicos; si no, todo como texto)."""
+    import pyarrow as pa
+    names, seen = [], {}
+    for name in map(str, df.columns):
+        n = seen.get(name, 0)
+        seen[name] = n + 1
+        names.append(f"{name}.{n}" if n else name)
+    df = df.set_axis(names, axis=1)
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowException, ValueError, TypeError):
+        table = pa.Table.from_pandas(df.astype(str), preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer: writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+def _read_table(data: bytes) -> pd.DataFrame:
+    import pyarrow as pa
+    return pa.ipc.open_stream(pa.py_buffer(data)).read_all().to_pandas()
+
+# Landlock (Linux >= 5.13): llamadas al sistema y permisos (include/uapi/linux/landlock.h).
+_SYS_LANDLOCK_CREATE_RULESET, _SYS_LANDLOCK_ADD_RULE, _SYS_LANDLOCK_RESTRICT_SELF = 444, 445, 446
+_LANDLOCK_FS_EXECUTE, _LANDLOCK_FS_READ_FILE, _LANDLOCK_FS_READ_DIR = 1 << 0, 1 << 2, 1 << 3
+_LANDLOCK_FS_READ = _LANDLOCK_FS_EXECUTE | _LANDLOCK_FS_READ_FILE | _LANDLOCK_FS_READ_DIR
+_PR_SET_NO_NEW_PRIVS = 38
+
+class _LandlockRulesetAttr(ctypes.Structure):
+    _fields_ = [("handled_access_fs", ctypes.c_uint64), ("handled_access_net", ctypes.c_uint64), ("scoped", ctypes.c_uint64)]
+
+class _LandlockPathBeneathAttr(ctypes.Structure):
+    _pack_ = 1
+    _fields_ = [("allowed_access", ctypes.c_uint64), ("parent_fd", ctypes.c_int32)]
+
+def _apply_landlock(read_paths: List[str], write_paths: List[str]) -> int:
+    """
+    Restringe el proceso (de forma irreversible) a leer en los directorios `read_paths` y leer y escribir en `write_paths`;
+    desde la versión 4 de Landlock, además, sin conexiones TCP. Devuelve la versión aplicada (0 si no hay Landlock).
+    """
+    if not sys.platform.startswith("linux"): return 0
+    libc = ctypes.CDLL(None, use_errno=True)
+    libc.syscall.restype = ctypes.c_long
+    abi = libc.syscall(_SYS_LANDLOCK_CREATE_RULESET, None, ctypes.c_size_t(0), ctypes.c_uint32(1))
+    if abi < 1: return 0
+    handled_fs = (1 << 13) - 1 | (1 << 13 if abi >= 2 else 0) | (1 << 14 if abi >= 3 else 0) | (1 << 15 if abi >= 5 else 0)
+    attr = _LandlockRulesetAttr(handled_fs, 0b11 if abi >= 4 else 0, 0b11 if abi >= 6 else 0)
+    size = 8 if abi < 4 else 16 if abi < 6 else 24
+    ruleset = libc.syscall(_SYS_LANDLOCK_CREATE_RULESET, ctypes.byref(attr), ctypes.c_size_t(size), ctypes.c_uint32(0))
+    if ruleset < 0: raise OSError(ctypes.get_errno(), "landlock_create_ruleset")
+    try:
+        for paths, access in ((read_paths, _LANDLOCK_FS_READ), (write_paths, handled_fs)):
+            for path in dict.fromkeys(p for p in paths if os.path.isdir(p)):
+                fd = os.open(path, os.O_PATH | os.O_CLOEXEC)
+                try:
+                    rule = _LandlockPathBeneathAttr(access & handled_fs, fd)
+                    if libc.syscall(_SYS_LANDLOCK_ADD_RULE, ctypes.c_int(ruleset), ctypes.c_int(1), ctypes.byref(rule), ctypes.c_uint32(0)) < 0:
+                        raise OSError(ctypes.get_errno(), f"landlock_add_rule {path}")
+                finally:
+                    os.close(fd)
+        if libc.prctl(_PR_SET_NO_NEW_PRIVS, 1, 0, 0, 0) != 0: raise OSError(ctypes.get_errno(), "PR_SET_NO_NEW_PRIVS")
+        if libc.syscall(_SYS_LANDLOCK_RESTRICT_SELF, ctypes.c_int(ruleset), ctypes.c_uint32(0)) < 0:
+            raise OSError(ctypes.get_errno(), "landlock_restrict_self")
+    finally:
+        os.close(ruleset)
+    return abi
+
+def _python_paths() -> List[str]:
+    """Directorios de la instalación de Python y de las bibliotecas del sistema que el proceso necesita leer."""
+    paths = [sys.prefix, sys.base_prefix, sys.exec_prefix, *(p for p in sys.path if p and os.path.isdir(p))]
+    return paths + [p for p in ("/usr", "/lib", "/lib64") if os.path.isdir(p)]
+
+def _send_result(conn: Connection, result: SandboxResult):
+    header = {"stdout": result.stdout, "error": result.error, "duration_s": result.duration_s,
+              "tables": [title for title, _ in result.tables], "images": len(result.images)}
+    conn.send_bytes(json.dumps(header).encode("utf-8"))
+    for _, df in result.tables: conn.send_bytes(_table_bytes(df))
+    for image in result.images: conn.send_bytes(image)
+
+def _worker_main(config: Dict[str, Any]):
+    """
+    Proceso de ejecución: abre los datos (memory-map de los descriptores que recibe), precarga las bibliotecas, se
+    aísla (límite de memoria y Landlock) y ejecuta los bloques de código que recibe por `conn_fd`.
+    Solo intercambia bytes con la app (texto, JSON, Arrow IPC y PNG), nunca objetos serializados con pickle.
+    """
+    conn = Connection(config["conn_fd"])
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot  # noqa: F401  (precarga)
+    pd.set_option("mode.copy_on_write", True)
+    frames = {name: _map_dataset(fd) for name, fd in config["datasets"].items()}
+    _apply_memory_limit(config["memory_mb"])
+    landlock = _apply_landlock(_python_paths(), [os.getcwd()])
+    conn.send_bytes(json.dumps({"uid": os.getuid() if hasattr(os, "getuid") else None, "landlock": landlock}).encode("utf-8"))
+    while True:
+        try:
+            code = conn.recv_bytes().decode("utf-8")
+        except (EOFError, KeyboardInterrupt):
+            return
+        result = _execute(code, frames, config["cpu_s"], config["max_rows"])
+        try:
+            _send_result(conn, result)
+        except (BrokenPipeError, EOFError):
+            return
+
+class _Worker:
+    __slots__ = ("process", "conn", "workdir", "ready")
+    def __init__(self, process, conn, workdir):
+        self.process = process
+        self.conn = conn
+        self.workdir = workdir
+        self.ready = False
+
+    def kill(self):
+        with contextlib.suppress(Exception): self.conn.close()
+        if self.process.poll() is None: self.process.kill()
+        with contextlib.suppress(subprocess.TimeoutExpired): self.process.wait(timeout=1)
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+class SandboxPool:
+    """
+    Grupo de procesos precalentados que ejecutan el código pandas generado por el asistente de IA (solo POSIX).
+
+    - Aislamiento de cada proceso: se lanza como un intérprete nuevo (`python -I`) con un entorno vacío (sin las
+      claves ni los secretos de la app), en un directorio temporal propio que se borra al terminar y, si la app se
+      ejecuta como root, con el usuario sin privilegios `user`. Después de cargar los datos se restringe con
+      Landlock (Linux >= 5.13): solo puede leer la instalación de Python y escribir en su directorio, y desde
+      Landlock 4 no puede abrir conexiones TCP. `isolation` dice qué se aplicó; sin usuario distinto ni Landlock el
+      código puede leer lo mismo que la app, y `summary()` lo indica.
+    - `__import__` solo permite ALLOWED_MODULES y no hay `open`, `eval` ni `exec`, pero eso no es una frontera de
+      seguridad (`pd` da acceso a `os` y a archivos): la frontera es el proceso y las restricciones anteriores.
+    - Los datos (`datasets`: nombre -> archivo Arrow IPC sin comprimir) se pasan como descriptores de solo lectura
+      y cada proceso los abre con memory-map sin copiarlos: las columnas de texto quedan como `string[pyarrow]` y
+      las numéricas sin nulos apuntan al mapa. Solo se copian las numéricas con nulos (unos 1,3 MB por proceso con
+      db.parquet, frente a unos 11 MB al convertirlo todo a objetos de Python). Las páginas del mapa las comparten
+      todos los procesos a través de la caché de archivos del sistema. Cada ejecución recibe una copia superficial
+      con copy-on-write: el código no puede alterar los originales.
+    - Límites por ejecución: `timeout_s` de tiempo real (el proceso se mata y se sustituye), `cpu_s` de CPU
+      y `memory_mb` de memoria virtual además de la precargada (RLIMIT_CPU / RLIMIT_AS).
+    - Con la app solo se intercambian bytes (JSON, Arrow IPC, PNG), nunca pickle: un proceso comprometido no
+      puede ejecutar código en la app a través de sus respuestas.
+
+    No depende de Streamlit; ver `get_sandbox_pool` en ai_functions.py.
+    """
+    MAX_MESSAGE_BYTES = 64 * 1024 * 1024
+
+    def __init__(self, datasets: Dict[str, str], workers: int = 2, timeout_s: float = 10.0, cpu_s: int = 10,
+                 memory_mb: int = 512, max_rows: int = 500, startup_timeout_s: float = 60.0, user: str | None = "nobody"):
+        self.datasets = datasets
+        self.timeout_s = timeout_s
+        self.cpu_s = cpu_s
+        self.memory_mb = memory_mb
+        self.max_rows = max_rows
+        self.startup_timeout_s = startup_timeout_s
+        self.user = user if user and hasattr(os, "geteuid") and os.geteuid() == 0 else None
+        self.isolation: Dict[str, Any] = {}
+        self._idle: queue.Queue = queue.Queue()
+        self._workers: List[_Worker] = []
+        self._lock = threading.Lock()
+        self.stats = {"runs": 0, "errors": 0, "timeouts": 0, "crashes": 0, "respawns": 0, "total_s": 0.0}
+        for _ in range(workers): self._idle.put(self._spawn())
+        atexit.register(self.close)
+
+    def _spawn(self) -> _Worker:
+        workdir = tempfile.mkdtemp(prefix="ai_sandbox_")
+        popen_user = {}
+        if self.user:
+            import pwd
+            account = pwd.getpwnam(self.user)
+            os.chown(workdir, account.pw_uid, account.pw_gid)
+            popen_user = {"user": account.pw_uid, "group": account.pw_gid, "extra_groups": []}
+        parent_sock, child_sock = socket.socketpair()
+        data_fds = {name: os.open(path, os.O_RDONLY) for name, path in self.datasets.items()}
+        config = {"conn_fd": child_sock.fileno(), "datasets": data_fds, "memory_mb": self.memory_mb, "cpu_s": self.cpu_s, "max_rows": self.max_rows}
+        env = {"PATH": os.defpath, "HOME": workdir, "TMPDIR": workdir, "MPLCONFIGDIR": workdir, "LC_ALL": "C.UTF-8"}
+        try:
+            process = subprocess.Popen(
+                [sys.executable, "-I", os.path.abspath(__file__), json.dumps(config)],
+                env=env, cwd=workdir, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                pass_fds=(child_sock.fileno(), *data_fds.values()), start_new_session=True, **popen_user,
+            )
+        finally:
+            child_sock.close()
+            for fd in data_fds.values(): os.close(fd)
+        worker = _Worker(process, Connection(parent_sock.detach()), workdir)
+        with self._lock: self._workers.append(worker)
+        return worker
+
+    def _replace(self, worker: _Worker) -> _Worker:
+        worker.kill()
+        with self._lock:
+            if worker in self._workers: self._workers.remove(worker)
+            self.stats["respawns"] += 1
+        return self._spawn()
+
+    def _receive(self, worker: _Worker, timeout: float) -> bytes:
+        if not worker.conn.poll(timeout): raise TimeoutError
+        return worker.conn.recv_bytes(self.MAX_MESSAGE_BYTES)
+
+    def _receive_result(self, worker: _Worker) -> SandboxResult:
+        header = json.loads(self._receive(worker, self.timeout_s))
+        titles, images = list(header["tables"]), int(header["images"])
+        result = SandboxResult(stdout=str(header["stdout"])[:MAX_STDOUT_CHARS], error=header["error"] and str(header["error"]),
+                               duration_s=float(header["duration_s"]))
+        result.tables = [(title and str(title), _read_table(self._receive(worker, self.timeout_s))) for title in titles]
+        result.images = [self._receive(worker, self.timeout_s) for _ in range(images)]
+        return result
+
+    def run(self, code: str) -> SandboxResult:
+        """
+        Ejecuta `code` en un proceso libre (espera si todos están ocupados). Un proceso que agota el tiempo o muere se
+        sustituye por uno nuevo; solo el sustituto vuelve al grupo (si no se puede lanzar, el grupo queda con uno menos).
+        """
+        worker = self._idle.get()
+        start = time.perf_counter()
+        failure = None
+        try:
+            if not worker.ready:
+                isolation = json.loads(self._receive(worker, self.startup_timeout_s))
+                with self._lock: self.isolation = {"uid": isolation.get("uid"), "landlock": isolation.get("landlock")}
+                worker.ready = True
+            worker.conn.send_bytes(code.encode("utf-8"))
+            result = self._receive_result(worker)
+        except TimeoutError:
+            failure, result = "timeouts", SandboxResult(error=f"Tiempo de ejecución agotado ({self.timeout_s:g} s).")
+        except (EOFError, OSError, ValueError, KeyError, TypeError):
+            failure, result = "crashes", SandboxResult(error="El proceso de ejecución terminó inesperadamente (límite de CPU o memoria superado).")
+        except BaseException:
+            # Intercambio interrumpido a medias: el proceso ya no está sincronizado con la app.
+            self._idle.put(self._replace(worker))
+            raise
+        if failure is not None: worker = self._replace(worker)
+        self._idle.put(worker)
+        with self._lock:
+            if failure is not None: self.stats[failure] += 1
+            self.stats["runs"] += 1
+            self.stats["errors"] += result.error is not None
+            self.stats["total_s"] += time.perf_counter() - start
+        return result
+
+    def close(self):
+        with self._lock: workers, self._workers = self._workers, []
+        for worker in workers: worker.kill()
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            isolated = bool(self.isolation.get("landlock")) or (self.isolation.get("uid") not in (None, 0) and self.user is not None)
+            return {**self.stats, "workers": len(self._workers), "idle": self._idle.qsize(), **self.isolation, "isolated": isolated}
+
+if __name__ == "__main__":
+    _worker_main(json.loads(sys.argv[1]))
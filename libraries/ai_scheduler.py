@@ -0,0 +1,180 @@
+import time
+import random
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, Iterable, Iterator
+
+class RateLimitError(Exception):
+    """Error de cuota (HTTP 429 / RESOURCE_EXHAUSTED) de un backend de IA."""
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """Reconoce los errores de cuota de Gemini (`google.genai.errors.ClientError` con código 429) y los de los stubs locales."""
+    if isinstance(error, RateLimitError): return True
+    if getattr(error, 'code', None) == 429 or getattr(error, 'status_code', None) == 429: return True
+    message = str(error)
+    return "429" in message or "RESOURCE_EXHAUSTED" in message
+
+class RequestCancelled(Exception):
+    """La petición se canceló (ver `cancel_event`) mientras esperaba su turno."""
+
+class _Ticket:
+    __slots__ = ("session_id", "granted")
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.granted = False
+
+class RequestScheduler:
+    """
+    Planificador de peticiones a la IA compartido por todas las sesiones del proceso.
+
+    - Como máximo `max_concurrent` peticiones en curso a la vez.
+    - Equidad por sesión: las peticiones en espera se conceden por turnos (round-robin) entre sesiones,
+      así una sesión con varias preguntas encoladas no bloquea al resto.
+    - Reintentos con espera exponencial (y algo de azar) ante errores de cuota, solo antes del primer fragmento
+      de la respuesta: después ya se ha mostrado contenido y reintentar lo duplicaría.
+
+    No depende de Streamlit, por lo que puede probarse con un backend falso (ver tests/test_ai_scheduler.py).
+    """
+    def __init__(self, max_concurrent: int = 4, max_retries: int = 3, base_delay: float = 2.0, max_delay: float = 30.0,
+                 poll_interval: float = 0.5, sleep: Callable[[float], None] = time.sleep):
+        self.max_concurrent = max_concurrent
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.sleep = sleep
+        self._cond = threading.Condition()
+        self._active = 0
+        self._waiting: Dict[str, deque] = {}
+        self._turns: deque = deque()
+        self.stats = {"granted": 0, "queued": 0, "retries": 0, "rate_limited": 0, "max_active": 0, "max_queue": 0}
+
+    def _dispatch(self):
+        """Concede huecos libres por turnos entre sesiones. Debe llamarse con el candado tomado."""
+        while self._active < self.max_concurrent and self._turns:
+            session_id = self._turns.popleft()
+            queue = self._waiting[session_id]
+            ticket = queue.popleft()
+            if queue: self._turns.append(session_id)
+            else: del self._waiting[session_id]
+            ticket.granted = True
+            self._active += 1
+            self.stats["granted"] += 1
+            self.stats["max_active"] = max(self.stats["max_active"], self._active)
+        self._cond.notify_all()
+
+    def _position(self, ticket: _Ticket) -> int:
+        """Posición (1 = la siguiente) del ticket si los turnos siguieran el orden actual."""
+        queues = {sid: list(q) for sid, q in self._waiting.items()}
+        order, position = list(self._turns), 0
+        while order:
+            session_id = order.pop(0)
+            position += 1
+            if queues[session_id].pop(0) is ticket: return position
+            if queues[session_id]: order.append(session_id)
+        return 0
+
+    def acquire(self, session_id: str, on_wait: Callable[[int], None] | None = None, cancel_event: threading.Event | None = None) -> _Ticket:
+        """
+        Espera un hueco. Mientras espera, llama a `on_wait(posición)` cada vez que cambia su posición en la cola;
+        si se activa `cancel_event`, deja la cola y lanza RequestCancelled.
+        """
+        ticket = _Ticket(session_id)
+        with self._cond:
+            if session_id not in self._waiting:
+                self._waiting[session_id] = deque()
+                self._turns.append(session_id)
+            self._waiting[session_id].append(ticket)
+            self._dispatch()
+            if not ticket.granted:
+                self.stats["queued"] += 1
+                self.stats["max_queue"] = max(self.stats["max_queue"], self.queue_length())
+            last_position = None
+            try:
+                while not ticket.granted:
+                    if cancel_event is not None and cancel_event.is_set(): raise RequestCancelled()
+                    position = self._position(ticket)
+                    if on_wait is not None and position != last_position:
+                        last_position = position
+                        self._cond.release()
+                        try: on_wait(position)
+                        finally: self._cond.acquire()
+                        continue
+                    self._cond.wait(self.poll_interval)
+            except BaseException:
+                # La ejecución que esperaba se ha interrumpido (p. ej. el usuario detuvo el script): no dejar el ticket colgado.
+                self._discard(ticket)
+                raise
+        return ticket
+
+    def _discard(self, ticket: _Ticket):
+        """Retira un ticket de la cola o libera su hueco. Debe llamarse con el candado tomado."""
+        if ticket.granted:
+            ticket.granted = False
+            self._active -= 1
+        queue = self._waiting.get(ticket.session_id)
+        if queue and ticket in queue:
+            queue.remove(ticket)
+            if not queue:
+                del self._waiting[ticket.session_id]
+                self._turns.remove(ticket.session_id)
+        self._dispatch()
+
+    def release(self, ticket: _Ticket):
+        """Libera el hueco de un ticket concedido (o lo retira de la cola si aún esperaba)."""
+        with self._cond:
+            self._discard(ticket)
+
+    def queue_length(self) -> int:
+        return sum(len(q) for q in self._waiting.values())
+
+    def active(self) -> int:
+        return self._active
+
+    def _backoff(self, attempt: int) -> float:
+        return min(self.max_delay, self.base_delay * 2 ** attempt) * random.uniform(0.75, 1.25)
+
+    def stream(self, session_id: str, request: Callable[[], Iterable[Any]], on_wait: Callable[[int], None] | None = None,
+               cancel_event: threading.Event | None = None) -> Iterator[Any]:
+        """
+        Ejecuta `request()` (que devuelve un iterable de fragmentos) dentro de un hueco del planificador y reemite sus fragmentos.
+        El hueco se libera al terminar, al fallar o al cerrarse el generador, y también durante la espera antes de cada
+        reintento: las demás sesiones no quedan bloqueadas por una petición que espera a que pase el error de cuota.
+        """
+        ticket = self.acquire(session_id, on_wait, cancel_event)
+        try:
+            attempt = 0
+            while True:
+                iterator = iter(request())
+                try:
+                    first = next(iterator)
+                except StopIteration:
+                    return
+                except Exception as e:
+                    if not is_rate_limit_error(e): raise
+                    with self._cond:
+                        self.stats["rate_limited"] += 1
+                        if attempt >= self.max_retries: raise
+                        self.stats["retries"] += 1
+                    self.release(ticket)
+                    ticket = None
+                    self._wait_backoff(self._backoff(attempt), cancel_event)
+                    attempt += 1
+                    ticket = self.acquire(session_id, on_wait, cancel_event)
+                    continue
+                yield first
+                yield from iterator
+                return
+        finally:
+            if ticket is not None: self.release(ticket)
+
+    def _wait_backoff(self, delay: float, cancel_event: threading.Event | None):
+        """Espera `delay` segundos sin hueco; si se activa `cancel_event` mientras tanto, lanza RequestCancelled."""
+        if cancel_event is None:
+            self.sleep(delay)
+        elif cancel_event.wait(delay):
+            raise RequestCancelled()
+
+    def summary(self) -> Dict[str, Any]:
+        with self._cond:
+            return {**self.stats, "active": self._active, "queued_now": self.queue_length(), "max_concurrent": self.max_concurrent}
@@ -0,0 +1,162 @@
+import time
+import threading
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple
+from .ai_backends import Chunk
+from .ai_history import CHARS_PER_TOKEN, IMAGE_TOKENS
+from .ai_scheduler import RequestCancelled
+
+def chunk_tokens(chunk: Chunk) -> int:
+    """Tokens aproximados de un fragmento de respuesta (4 caracteres por token; 258 por imagen)."""
+    kind, content, _ = chunk
+    if kind == "image": return IMAGE_TOKENS
+    return len(content) // CHARS_PER_TOKEN if isinstance(content, str) else 0
+
+class AITask:
+    """
+    Una respuesta del asistente que se genera en un hilo en segundo plano, independiente de la ejecución del script.
+
+    `produce(tarea)` devuelve los fragmentos; la tarea los guarda todos, así que `iter_chunks()` puede volver a
+    leerlos desde el principio si la ejecución que los mostraba se interrumpe. `cancel()` activa `cancel_event`:
+    el hilo deja de leer (o sale de la cola del planificador) y cierra el generador, lo que corta la respuesta del backend.
+    `add_done_callback` registra trabajo para cuando el hilo termine, sin que quien cancela tenga que esperarlo.
+    """
+    def __init__(self, key: str, section: str, prompt: str, produce: Callable[['AITask'], Iterable[Chunk]],
+                 on_done: Callable[['AITask'], None] | None = None):
+        self.key = key
+        self.section = section
+        self.prompt = prompt
+        self.cancel_event = threading.Event()
+        self.chunks: List[Chunk] = []
+        self.status = "running"
+        self.started = time.time()
+        self.finished: float | None = None
+        self._produce = produce
+        self._on_done = on_done
+        self._callbacks: List[Callable[['AITask'], None]] = []
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name=f"ai-task-{key}", daemon=True)
+        self._thread.start()
+
+    def push(self, chunk: Chunk):
+        with self._cond:
+            self.chunks.append(chunk)
+            self._cond.notify_all()
+
+    def _run(self):
+        stream = iter(self._produce(self))
+        try:
+            for chunk in stream:
+                if self.cancel_event.is_set(): break
+                self.push(chunk)
+            status = "cancelled" if self.cancel_event.is_set() else "completed"
+        except RequestCancelled:
+            status = "cancelled"
+        except Exception as e:
+            self.push(("error", f"Error al comunicarse con el asistente de IA: {e}.", None))
+            status = "failed"
+        finally:
+            close = getattr(stream, "close", None)
+            if close is not None: close()
+        with self._cond:
+            self.status, self.finished = status, time.time()
+            callbacks, self._callbacks = self._callbacks, []
+            self._cond.notify_all()
+        if self._on_done is not None: self._on_done(self)
+        for callback in callbacks: callback(self)
+
+    @property
+    def done(self) -> bool:
+        return self.status != "running"
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def add_done_callback(self, callback: Callable[['AITask'], None]):
+        """Llama a `callback(tarea)` desde el hilo de la tarea al terminar, o enseguida si ya terminó."""
+        with self._cond:
+            if not self.done:
+                self._callbacks.append(callback); return
+        callback(self)
+
+    def wait(self, timeout: float | None = None) -> bool:
+        with self._cond:
+            return self._cond.wait_for(lambda: self.done, timeout)
+
+    def iter_chunks(self, poll_s: float = 0.1) -> Iterator[Chunk]:
+        """Fragmentos desde el principio, esperando a los nuevos hasta que la tarea termina."""
+        i = 0
+        while True:
+            with self._cond:
+                while i >= len(self.chunks) and not self.done: self._cond.wait(poll_s)
+                pending, finished = self.chunks[i:], self.done
+            yield from pending
+            i += len(pending)
+            if finished: return
+
+    def text(self) -> str:
+        with self._cond:
+            return "".join(content for kind, content, _ in self.chunks if kind == "text")
+
+    def output_tokens(self) -> int:
+        with self._cond:
+            return sum(chunk_tokens(c) for c in self.chunks if c[0] != "queue")
+
+class AITaskRegistry:
+    """
+    Tareas de IA en curso por (sesión, componente), etiquetadas con la sección de la app en la que se lanzaron.
+
+    Al navegar a otra sección, `cancel_stale` cancela las de la sesión lanzadas en otras secciones. Los tokens
+    ahorrados por cada cancelación se estiman como la media de tokens de las respuestas completas menos los ya recibidos.
+
+    No depende de Streamlit; ver `get_ai_task_registry` en ai_functions.py.
+    """
+    def __init__(self, max_age_s: float = 3600):
+        self.max_age_s = max_age_s
+        self._tasks: Dict[Tuple[str, str], AITask] = {}
+        self._lock = threading.Lock()
+        self.stats = {"started": 0, "completed": 0, "failed": 0, "cancelled": 0, "cancelled_queued": 0,
+                      "completed_tokens": 0, "tokens_saved": 0}
+
+    def _finished(self, task: AITask):
+        tokens, streamed = task.output_tokens(), any(c[0] != "queue" for c in list(task.chunks))
+        with self._lock:
+            if task.status == "cancelled":
+                self.stats["cancelled"] += 1
+                self.stats["cancelled_queued"] += not streamed
+                if self.stats["completed"]:
+                    self.stats["tokens_saved"] += max(0, self.stats["completed_tokens"] // self.stats["completed"] - tokens)
+            else:
+                self.stats[task.status] += 1
+                if task.status == "completed": self.stats["completed_tokens"] += tokens
+
+    def start(self, session_id: str, key: str, section: str, prompt: str, produce: Callable[[AITask], Iterable[Chunk]]) -> AITask:
+        with self._lock:
+            previous = self._tasks.pop((session_id, key), None)
+            self.stats["started"] += 1
+            # Tareas terminadas que nadie ha recogido (p. ej. la sesión se cerró a mitad de respuesta).
+            now = time.time()
+            for k in [k for k, t in self._tasks.items() if t.finished and now - t.finished > self.max_age_s]: del self._tasks[k]
+        if previous is not None: previous.cancel()
+        task = AITask(key, section, prompt, produce, on_done=self._finished)
+        with self._lock: self._tasks[(session_id, key)] = task
+        return task
+
+    def get(self, session_id: str, key: str) -> AITask | None:
+        with self._lock:
+            return self._tasks.get((session_id, key))
+
+    def remove(self, session_id: str, key: str, task: AITask):
+        with self._lock:
+            if self._tasks.get((session_id, key)) is task: del self._tasks[(session_id, key)]
+
+    def cancel_stale(self, session_id: str, section: str) -> List[AITask]:
+        """Cancela y retira las tareas de la sesión lanzadas en otra sección. Devuelve las tareas retiradas (ya terminadas o no)."""
+        with self._lock:
+            stale = [(k, t) for k, t in self._tasks.items() if k[0] == session_id and t.section != section]
+            for k, _ in stale: del self._tasks[k]
+        for _, task in stale: task.cancel()
+        return [task for _, task in stale]
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.stats, "running": sum(not t.done for t in self._tasks.values()), "tracked": len(self._tasks)}
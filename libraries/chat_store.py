@@ -0,0 +1,198 @@
+import io
+import json
+import time
+import sqlite3
+import threading
+import pandas as pd
+import streamlit as st
+from google.genai import types
+from typing import Any, Dict, List
+from .general_functions import get_setting, local_store_path, get_session_id
+
+LIVE_CHATS_ORDER_KEY = "ai_live_chats_order"
+
+class ChatStore:
+    """
+    Almacén local (SQLite) de los historiales del asistente de IA, por sesión y componente.
+
+    Guarda los mensajes tal como los muestra `ask_ai_component` (texto, miniaturas y referencias de imágenes del
+    almacén de medios, tablas, código) y el historial
+    del modelo de cada conversación, para poder reconstruir el chat sin mantener el objeto vivo en memoria.
+    Es compartido por todas las sesiones del proceso (ver `get_chat_store`).
+    """
+    def __init__(self, path: str, ttl_s: float = 24 * 3600, cleanup_every_s: float = 3600):
+        self.path = path
+        self.ttl_s = ttl_s
+        self.cleanup_every_s = cleanup_every_s
+        self._last_cleanup = 0.0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS messages (
+                session_id TEXT NOT NULL, component TEXT NOT NULL, seq INTEGER NOT NULL,
+                role TEXT NOT NULL, meta TEXT NOT NULL, blob BLOB, created REAL NOT NULL,
+                PRIMARY KEY (session_id, component, seq)
+            );
+            CREATE TABLE IF NOT EXISTS chat_contexts (
+                session_id TEXT NOT NULL, component TEXT NOT NULL, history TEXT NOT NULL, updated REAL NOT NULL,
+                PRIMARY KEY (session_id, component)
+            );
+        """)
+
+    @staticmethod
+    def _encode(message: Dict[str, Any]) -> tuple[str, str, bytes | None]:
+        content = message["content"]
+        if not isinstance(content, dict):
+            return message["role"], json.dumps({"content": content}, ensure_ascii=False), None
+        if content.get("type") == "image" and content.get("ref"):
+            meta = {k: content.get(k) for k in ("ref", "mime_type", "width", "height")}
+            return message["role"], json.dumps({"type": "image", **meta}), content["thumbnail"]
+        if content.get("type") == "image":
+            return message["role"], json.dumps({"type": "image", "mime_type": content.get("mime_type")}), content["data"]
+        if content.get("type") == "dataframe":
+            buffer = io.BytesIO()
+            try:
+                content["data"].to_parquet(buffer)
+                return message["role"], json.dumps({"type": "dataframe", "format": "parquet"}), buffer.getvalue()
+            except Exception:
+                return message["role"], json.dumps({"type": "dataframe", "format": "json"}), content["data"].to_json(orient="split").encode()
+        return message["role"], json.dumps(content, ensure_ascii=False), None
+
+    @staticmethod
+    def _decode(role: str, meta: str, blob: bytes | None) -> Dict[str, Any]:
+        data = json.loads(meta)
+        if "content" in data and "type" not in data:
+            return {"role": role, "content": data["content"]}
+        if data["type"] == "image" and data.get("ref"):
+            return {"role": role, "content": {**data, "thumbnail": blob}}
+        if data["type"] == "image":
+            return {"role": role, "content": {"type": "image", "data": blob, "mime_type": data.get("mime_type")}}
+        if data["type"] == "dataframe":
+            df = pd.read_parquet(io.BytesIO(blob)) if data.get("format") == "parquet" else pd.read_json(io.BytesIO(blob), orient="split") #type:ignore
+            return {"role": role, "content": {"type": "dataframe", "data": df}}
+        return {"role": role, "content": data}
+
+    def append(self, session_id: str, component: str, messages: List[Dict[str, Any]]):
+        now = time.time()
+        with self._lock:
+            start = self._conn.execute("SELECT COALESCE(MAX(seq) + 1, 0) FROM messages WHERE session_id=? AND component=?", (session_id, component)).fetchone()[0]
+            self._conn.executemany(
+                "INSERT INTO messages VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(session_id, component, start + i, *self._encode(m), now) for i, m in enumerate(messages)]
+            )
+        if now - self._last_cleanup > self.cleanup_every_s: self.cleanup()
+
+    def count(self, session_id: str, component: str) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM messages WHERE session_id=? AND component=?", (session_id, component)).fetchone()[0]
+
+    def load(self, session_id: str, component: str, offset: int = 0, limit: int = -1) -> List[Dict[str, Any]]:
+        """Devuelve los mensajes en orden, desde la posición `offset` (como máximo `limit`; -1 = todos)."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT role, meta, blob FROM messages WHERE session_id=? AND component=? ORDER BY seq LIMIT ? OFFSET ?",
+                (session_id, component, limit, offset)
+            ).fetchall()
+        return [self._decode(*row) for row in rows]
+
+    def save_context(self, session_id: str, component: str, history: List[types.Content]):
+        payload = json.dumps([c.model_dump(mode="json", exclude_none=True) for c in history], ensure_ascii=False)
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO chat_contexts VALUES (?, ?, ?, ?)", (session_id, component, payload, time.time()))
+
+    def load_context(self, session_id: str, component: str) -> List[types.Content] | None:
+        with self._lock:
+            row = self._conn.execute("SELECT history FROM chat_contexts WHERE session_id=? AND component=?", (session_id, component)).fetchone()
+        return [types.Content.model_validate(c) for c in json.loads(row[0])] if row else None
+
+    def clear(self, session_id: str, component: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM messages WHERE session_id=? AND component=?", (session_id, component))
+            self._conn.execute("DELETE FROM chat_contexts WHERE session_id=? AND component=?", (session_id, component))
+
+    def cleanup(self):
+        """Elimina las conversaciones sin actividad durante más de `ttl_s` segundos."""
+        cutoff = time.time()
+        self._last_cleanup = cutoff
+        cutoff -= self.ttl_s
+        with self._lock:
+            self._conn.execute("""
+                DELETE FROM messages WHERE (session_id, component) IN (
+                    SELECT session_id, component FROM messages GROUP BY session_id, component HAVING MAX(created) < ?
+                )""", (cutoff,))
+            self._conn.execute("DELETE FROM chat_contexts WHERE updated < ?", (cutoff,))
+
+@st.cache_resource(show_spinner=False)
+def get_chat_store() -> ChatStore:
+    return ChatStore(
+        local_store_path("chats.sqlite3"),
+        ttl_s=float(get_setting("CHAT_STORE_TTL_H", 24)) * 3600,
+    )
+
+def _tail_size() -> int:
+    return int(get_setting("CHAT_TAIL_MESSAGES", 8))
+
+def init_chat_history(key: str, initial_messages: List[Dict[str, Any]]):
+    """Crea `messages_{key}` en la sesión (solo la cola reciente) y persiste los mensajes iniciales."""
+    display_history_key = f"messages_{key}"
+    if display_history_key in st.session_state: return
+    store = get_chat_store()
+    session_id = get_session_id()
+    if store.count(session_id, key) == 0:
+        store.append(session_id, key, initial_messages)
+    st.session_state[display_history_key] = store.load(session_id, key, offset=max(0, store.count(session_id, key) - _tail_size()))
+
+def append_chat_messages(key: str, messages: List[Dict[str, Any]]):
+    """Persiste los mensajes nuevos y recorta `messages_{key}` a los CHAT_TAIL_MESSAGES más recientes."""
+    if not messages: return
+    get_chat_store().append(get_session_id(), key, messages)
+    tail = st.session_state[f"messages_{key}"] + messages
+    st.session_state[f"messages_{key}"] = tail[-_tail_size():]
+
+def earlier_messages_count(key: str) -> int:
+    """Número de mensajes guardados que ya no están en la cola en memoria."""
+    return max(0, get_chat_store().count(get_session_id(), key) - len(st.session_state.get(f"messages_{key}", [])))
+
+def load_earlier_messages(key: str) -> List[Dict[str, Any]]:
+    """Carga desde el almacén los mensajes anteriores a la cola en memoria (no se guardan en la sesión)."""
+    return get_chat_store().load(get_session_id(), key, limit=earlier_messages_count(key))
+
+def reset_chat_history(key: str, initial_messages: List[Dict[str, Any]]):
+    """Borra la conversación (mensajes, historial del modelo y chat vivo) y la reinicia con `initial_messages`."""
+    store = get_chat_store()
+    store.clear(get_session_id(), key)
+    del st.session_state[f"messages_{key}"]
+    _drop_live_chat(key)
+    init_chat_history(key, initial_messages)
+
+def _drop_live_chat(key: str):
+    st.session_state[f"gemini_chat_{key}"] = None
+    order = st.session_state.get(LIVE_CHATS_ORDER_KEY, [])
+    if key in order: order.remove(key)
+
+def get_live_chat(key: str) -> Any:
+    """Devuelve el chat vivo de `key` (o None) y lo marca como el más reciente."""
+    chat = st.session_state.get(f"gemini_chat_{key}")
+    if chat is not None: register_live_chat(key, chat)
+    return chat
+
+def register_live_chat(key: str, chat: Any):
+    """
+    Guarda el chat vivo de `key` en la sesión. Solo se mantienen CHAT_MAX_LIVE_SESSIONS chats vivos por sesión:
+    los menos usados se descartan y se reconstruyen más tarde a partir de su historial guardado (`load_chat_context`).
+    """
+    st.session_state[f"gemini_chat_{key}"] = chat
+    order = st.session_state.setdefault(LIVE_CHATS_ORDER_KEY, [])
+    if key in order: order.remove(key)
+    order.append(key)
+    max_live = int(get_setting("CHAT_MAX_LIVE_SESSIONS", 2))
+    for old_key in [k for k in order[:-max_live] if not st.session_state.get(f"processing_{k}", False)]:
+        _drop_live_chat(old_key)
+
+def save_chat_context(key: str, chat: Any):
+    """Guarda el historial del modelo del chat `key` para poder reconstruirlo si se descarta de memoria."""
+    get_chat_store().save_context(get_session_id(), key, chat.get_history())
+
+def load_chat_context(key: str) -> List[types.Content] | None:
+    return get_chat_store().load_context(get_session_id(), key)
@@ -0,0 +1,120 @@
+import pandas as pd
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict
+from .game_engine import Minigame
+from .minigames import DataDuelMinigame, ClassifierMinigame, OracleMinigame, EstimatorMinigame, GeoGuesserMinigame, ImpostorMinigame
+from ..plot_functions import analisis_A1, analisis_A3, analisis_A3_cagr, analisis_A4, analisis_A5, analisis_A7, graficate_A2_correlacion
+
+@dataclass(frozen=True)
+class GameDefinition:
+    """
+    Un minijuego de las secciones: su clase, cómo se construyen sus datos a partir de los conjuntos de la app
+    (`build_data(df_main, df_ins, ts)`, None si no hay datos suficientes) y las opciones de ronda que recibe su clase.
+    Las secciones y `tools/build_question_bank.py` usan las mismas definiciones, así que el banco coincide con el juego en vivo.
+    """
+    game_id: str
+    game_class: type[Minigame]
+    build_data: Callable[[pd.DataFrame, pd.DataFrame, Any], pd.DataFrame | None]
+    options: Dict[str, Any] = field(default_factory=dict)
+
+def _a1_estimator(df_main, df_ins, ts):
+    df_historico, _, _, _ = analisis_A1(df_main)
+    if df_historico is None or df_historico.empty: return None
+    pico_data = df_historico.loc[df_historico['matricula_total'].idxmax()]
+    return pd.DataFrame([{
+        "name": ts.translate('A1_peak_enrollment_label', "Matrícula Nacional en el Año Pico ({curso})").format(curso=pico_data['curso_academico']),
+        "value": pico_data['matricula_total']
+    }])
+
+def _a2_classifier(df_main, df_ins, ts):
+    ano_reciente = df_main['ano_inicio_curso'].max()
+    df_ramas_reciente = df_main[df_main['ano_inicio_curso'] == ano_reciente]\
+        .groupby('rama_ciencias')['matricula_total'].sum().reset_index()
+    if df_ramas_reciente.empty: return None
+    return df_ramas_reciente.rename(columns={'rama_ciencias': 'name', 'matricula_total': 'value'})
+
+def _a2_duel(df_main, df_ins, ts, rama_pivote: str = "Ciencias Pedagógicas"):
+    _, df_corr, _ = graficate_A2_correlacion(df_main, ts)
+    if df_corr is None or df_corr.empty: return None
+    df_corr.index.name = "Rama_A"
+    df_corr.columns.name = "Rama_B"
+    df_corr_long = df_corr.stack().reset_index()
+    df_corr_long.columns = ['Rama_A', 'Rama_B', 'Correlacion']
+    df_corr_long = df_corr_long[(df_corr_long['Rama_A'] == rama_pivote) & (df_corr_long['Rama_B'] != rama_pivote)]
+    if len(df_corr_long) < 2: return None
+    return pd.DataFrame({"name": df_corr_long['Rama_B'], "value": df_corr_long['Correlacion']})
+
+def _a3_classifier(df_main, df_ins, ts, top_n: int = 10):
+    df_ranking, _, _, _ = analisis_A3(df_main, top_n=top_n)
+    if df_ranking is None or df_ranking.empty: return None
+    return df_ranking.rename(columns={'carrera': 'name', 'matricula_total': 'value'})
+
+def _a3_duel(df_main, df_ins, ts):
+    df_cagr, _, _ = analisis_A3_cagr(df_main)
+    if df_cagr is None or df_cagr.empty: return None
+    return df_cagr.rename(columns={'carrera': 'name', 'CAGR': 'value'})
+
+def _a4_duel(df_main, df_ins, ts):
+    df_ramas, _, _, _, _ = analisis_A4(df_main)
+    if df_ramas is None or df_ramas.empty: return None
+    return df_ramas.rename(columns={'rama_ciencias': 'name', 'Porcentaje_Mujeres': 'value'})
+
+def _a4_impostor(df_main, df_ins, ts):
+    _, df_fem, df_masc, _, _ = analisis_A4(df_main)
+    if df_fem is None or df_fem.empty or df_masc is None or df_masc.empty: return None
+    return pd.concat([
+        df_fem[['carrera']].assign(category='Feminized'),
+        df_masc[['carrera']].assign(category='Masculinized'),
+    ]).rename(columns={'carrera': 'item'})
+
+def _a5_estimator(df_main, df_ins, ts):
+    _, df_oferta, _, _ = analisis_A5(df_main)
+    if df_oferta is None or df_oferta.empty: return None
+    return df_oferta.rename(columns={'carrera': 'name', 'Num_Universidades_Ofertan': 'value'})
+
+def _a5_geoguesser(df_main, df_ins, ts):
+    if df_ins is None or df_ins.empty: return None
+    return df_ins.reindex(columns=['nombre_institucion', 'provincia', 'lat', 'lon']).dropna(subset=['nombre_institucion', 'provincia'])
+
+def _a6_oracle(df_main, df_ins, ts):
+    df_hist, _, _, _ = analisis_A1(df_main)
+    if df_hist is None or len(df_hist) < 2: return None
+    return pd.DataFrame([{
+        "name": ts.translate('A6_game_item_name', "Matrícula Nacional"),
+        "x": df_hist['ano_inicio_curso'].tolist(),
+        "y": df_hist['matricula_total'].tolist()
+    }])
+
+def _a7_impostor(df_main, df_ins, ts):
+    _, _, df_baja, _, status = analisis_A7(df_main)
+    if status != 'success' or df_baja is None or df_baja.empty: return None
+    df_reciente = df_main[df_main['ano_inicio_curso'] == int(df_main['ano_inicio_curso'].max())]
+    df_saludable = df_reciente[df_reciente['matricula_total'] >= 50]
+    return pd.concat([
+        pd.DataFrame({'item': df_baja['university'] + ' - ' + df_baja['career'], 'category': 'Baja Matrícula'}),
+        pd.DataFrame({'item': df_saludable['entidad'] + ' - ' + df_saludable['carrera'], 'category': 'Matrícula Saludable'}),
+    ])
+
+GAME_DEFINITIONS: Dict[str, GameDefinition] = {d.game_id: d for d in [
+    GameDefinition("A1_EstimatorPicoNacional", EstimatorMinigame, _a1_estimator),
+    GameDefinition("A2_ClassifierSaber", ClassifierMinigame, _a2_classifier, {'difficulty': 4}),
+    GameDefinition("A2_DuelCorrelacion", DataDuelMinigame, _a2_duel),
+    GameDefinition("A3_ClassifierPopularidad", ClassifierMinigame, _a3_classifier, {'difficulty': 4}),
+    GameDefinition("A3_DuelCrecimiento", DataDuelMinigame, _a3_duel),
+    GameDefinition("A4_DuelGeneroRama", DataDuelMinigame, _a4_duel),
+    GameDefinition("A4_ImpostorGeneroCarrera", ImpostorMinigame, _a4_impostor,
+                   {'item_col': 'item', 'category_col': 'category', 'exclude_if_contains': False, 'majority_category': 'Feminized'}),
+    GameDefinition("A5_EstimatorExclusividad", EstimatorMinigame, _a5_estimator),
+    GameDefinition("A5_GeoGuesserUbicacion", GeoGuesserMinigame, _a5_geoguesser, {'difficulty': 'mixed'}),
+    GameDefinition("A6_OracleNacional", OracleMinigame, _a6_oracle),
+    GameDefinition("A7_ImpostorMatriculaBaja", ImpostorMinigame, _a7_impostor,
+                   {'item_col': 'item', 'category_col': 'category', 'exclude_if_contains': False, 'majority_category': 'Matrícula Saludable'}),
+]}
+
+def build_game_data(game_id: str, df_main: pd.DataFrame, df_ins: pd.DataFrame | None, ts: Any) -> pd.DataFrame | None:
+    """Datos del minijuego `game_id` (ver GAME_DEFINITIONS), o None si no hay datos suficientes."""
+    return GAME_DEFINITIONS[game_id].build_data(df_main, df_ins, ts)
+
+def game_options(game_id: str) -> Dict[str, Any]:
+    """Opciones de ronda con las que se crea el minijuego `game_id`."""
+    return dict(GAME_DEFINITIONS[game_id].options)
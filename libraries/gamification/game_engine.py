@@ -4,10 +4,47 @@ from typing import Callable, Any, Dict
 import pandas as pd
 from datetime import datetime
 import random
+import sqlite3
+import json
+import time
+from .question_bank import ANY_LANGUAGE, get_question_bank, pick_rounds
+from .game_registry import get_game_data_registry
+from .telemetry import ROUND_STARTED, ANSWERED, GAME_FINISHED, SessionCounters, get_game_event_log
+from .rng import new_session_seed, game_seed
+from ..general_functions import get_session_id, get_setting
+
+def distinct_rounds(make_round: Callable[[], dict], size: int, max_attempts: int | None = None) -> list[dict]:
+    """Hasta `size` rondas distintas generadas con `make_round` (se abandona tras `max_attempts` intentos, 4 por ronda por defecto)."""
+    pool, seen = [], set()
+    for _ in range(max_attempts or size * 4):
+        round_data = make_round()
+        key = json.dumps(round_data, sort_keys=True, default=str)
+        if key not in seen:
+            seen.add(key)
+            pool.append(round_data)
+            if len(pool) >= size: break
+    return pool
+
+class RoundResult:
+    """
+    Resultado de una ronda jugada: su índice, la respuesta y la puntuación. La ronda en sí no se guarda en la sesión;
+    se vuelve a obtener con `Minigame.prepare_round_data(round_index)`, que es determinista para una partida.
+    """
+    __slots__ = ("round_index", "score", "was_correct", "user_answer")
+
+    def __init__(self, round_index: int, score: int, was_correct: bool, user_answer: Any):
+        self.round_index = round_index
+        self.score = score
+        self.was_correct = was_correct
+        self.user_answer = user_answer
 
 class GameController:
     """
     Gestiona el estado global de la gamificación.
+
+    Cada sesión tiene una semilla (`session_seed`) de la que se derivan las de sus partidas (`next_seed`), así que las
+    rondas de una sesión se pueden reproducir. Se puede fijar con `st.session_state["game_seed"]` antes de la primera
+    ejecución (pruebas de carga) o con GAME_SEED (todas las sesiones iguales, para depurar).
     """
     def __new__(cls, *args, **kwargs):
         if 'GameController' in st.session_state:
@@ -15,11 +52,16 @@ class GameController:
         instance = super().__new__(cls)
         return instance
 
-    def __init__(self, translation: Dict[str, str] | None = None):
+    def __init__(self, translation: Dict[str, str] | None = None, lang: str = ANY_LANGUAGE):
         self.t = translation or {}
+        self.lang = lang
         if hasattr(self, 'game_mode'): return
         
         self.registered_games: Dict[str, 'Minigame'] = {}
+        self.counters = SessionCounters()
+        forced_seed = st.session_state.get("game_seed", get_setting("GAME_SEED"))
+        self.session_seed: int = int(forced_seed) if forced_seed is not None else new_session_seed()
+        self.seed_generations: Dict[str, int] = {}
         st.session_state.GameController = self
         
         self.game_mode = True
@@ -33,6 +75,25 @@ class GameController:
         for game in self.registered_games.values():
             game.reset_game()
 
+    def next_seed(self, game_id: str) -> int:
+        """Semilla de la siguiente partida de `game_id`: depende solo de la semilla de la sesión y de cuántas van."""
+        generation = self.seed_generations.get(game_id, 0)
+        self.seed_generations[game_id] = generation + 1
+        return game_seed(self.session_seed, game_id, generation)
+
+    def record_event(self, game: 'Minigame', event: str, round_index: int | None = None, round_data: dict | None = None,
+                     score: int | None = None, was_correct: bool | None = None, elapsed_s: float | None = None):
+        """Actualiza los contadores de la sesión y añade el evento al registro compartido (ver GameEventLog)."""
+        if event == GAME_FINISHED:
+            self.counters.record_finish(game.game_id, type(game).__name__, game.game_title, score or 0, bool(was_correct))
+        log = get_game_event_log()
+        if log is None: return
+        try:
+            log.record(event, get_session_id(), game.game_id, type(game).__name__, self.lang, game.seed, game.num_rounds,
+                       round_index, round_data, score, was_correct, elapsed_s)
+        except sqlite3.Error:
+            pass
+
     def switch_off(self)-> None:
         self.game_mode = False
         st.session_state.game_mode_toggle_state = False
@@ -89,22 +150,17 @@ class GameController:
             self._full_reset()
             st.rerun()
         
-        total_score, completed_games = 0, [g for g in self.registered_games.values() if g.is_finished()]
-        for game in completed_games: total_score += game.get_result()[0]
-        
         c1, c2 = st.columns(2)
-        c1.metric(self.t.get('points_metric_label', "Puntos"), total_score)
-        c2.metric(self.t.get('games_metric_label', "Juegos"), len(completed_games))
+        c1.metric(self.t.get('points_metric_label', "Puntos"), self.counters.total_score)
+        c2.metric(self.t.get('games_metric_label', "Juegos"), self.counters.games_finished)
         
         with st.expander(self.t.get('history_expander_label', "Ver Historial de Partidas")):
-            sortable_games = [g for g in completed_games if g.completion_time]
-            if not sortable_games:
+            if not self.counters.finished:
                 st.caption(self.t.get('history_empty', "Aún no has jugado. ¡Anímate!"))
             else:
-                for game in sorted(sortable_games, key=lambda g: g.completion_time, reverse=True): # type: ignore
-                    points_earned, was_successful = game.get_result()
+                for _, game_title, points_earned, was_successful in reversed(list(self.counters.finished.values())):
                     icon = "✅" if was_successful else "❌"
-                    text = self.t.get('history_item_text', "{icon} **{game_title}**: *+{points_earned} pts*").format(icon=icon, game_title=game.game_title, points_earned=points_earned)
+                    text = self.t.get('history_item_text', "{icon} **{game_title}**: *+{points_earned} pts*").format(icon=icon, game_title=game_title, points_earned=points_earned)
                     st.markdown(text)
     
     def display_debug_panel(self):
@@ -122,7 +178,9 @@ class GameController:
                     "Finalizado": "✅" if game.is_finished() else "❌",
                     "Ronda": f"{game.current_round}/{game.num_rounds}",
                     "Puntos": game.total_score,
-                    "Datos Ronda": len(game.rounds_data),
+                    "Datos": game.data_key,
+                    "Semilla": game.seed,
+                    "Partida": game.generation,
                 })
             st.dataframe(pd.DataFrame(game_states), use_container_width=True)
 
@@ -142,38 +200,51 @@ class Minigame(ABC):
         self.game_title = game_title
         self.controller = st.session_state.GameController
         
-        self.data = data
+        self.data_key: str | None = get_game_data_registry().register(game_id, data) if data is not None else None
         self.content_callback: Callable|None = content_callback
         self.min_score_for_victory = min_score_for_victory
         
-        if self.data is not None:
-            self.num_rounds = min(num_rounds, len(self.data)) if num_rounds > 0 else len(self.data)
+        if data is not None:
+            self.num_rounds = min(num_rounds, len(data)) if num_rounds > 0 else len(data)
         else:
             self.num_rounds = num_rounds
 
         self.reset_game()
         self.controller.registered_games[self.game_id] = self
 
+    @property
+    def data(self) -> pd.DataFrame | None:
+        """Datos del juego, compartidos por todas las sesiones (ver GameDataRegistry)."""
+        return get_game_data_registry().data(self.data_key) if self.data_key else None
+
     def reset_game(self):
         self.current_round: int = 0
-        self.round_results: list[dict] = []
+        self.round_results: list[RoundResult] = []
         self.total_score: int = 0
         self.completion_time: datetime | None = None
-        self.rounds_data: list[Any] = []
+        self.generation: int = self.controller.seed_generations.get(self.game_id, 0)
+        self.seed: int = self.controller.next_seed(self.game_id)
+        self.round_started_at: tuple[int, float] | None = None
+        self.controller.counters.record_reset(self.game_id)
 
     def is_finished(self) -> bool: return self.completion_time is not None
     
     def get_result(self) -> tuple[int, bool]:
         if not self.is_finished(): return 0, False
-        was_successful = any(r.get('was_correct', False) for r in self.round_results)
+        was_successful = any(r.was_correct for r in self.round_results)
         return self.total_score, was_successful
 
     def _process_submission(self, user_answer, round_data):
         score, was_correct = self.calculate_score(user_answer, round_data)
-        self.round_results.append({"score": score, "was_correct": was_correct, "user_answer": user_answer, "round_data": round_data})
+        self.round_results.append(RoundResult(self.current_round, score, was_correct, user_answer))
         self.total_score += score
+        started = self.round_started_at
+        elapsed_s = round(time.time() - started[1], 2) if started and started[0] == self.current_round else None
+        self.controller.record_event(self, ANSWERED, self.current_round, self.shared_round(self.current_round), score, was_correct, elapsed_s)
         self.current_round += 1
-        if self.current_round >= self.num_rounds: self.completion_time = datetime.now()
+        if self.current_round >= self.num_rounds:
+            self.completion_time = datetime.now()
+            self.controller.record_event(self, GAME_FINISHED, score=self.total_score, was_correct=self.get_result()[1])
         st.rerun()
 
     def _display_post_game_content(self):
@@ -191,11 +262,12 @@ class Minigame(ABC):
         self._render_active_game(); return False
 
     def _render_active_game(self):
+        if self.round_started_at is None or self.round_started_at[0] != self.current_round:
+            self.round_started_at = (self.current_round, time.time())
+            self.controller.record_event(self, ROUND_STARTED, self.current_round, self.shared_round(self.current_round))
         self.display_instructions()
         if self.num_rounds > 1: st.info(f"{self.t.get('round', 'Ronda')} {self.current_round + 1} / {self.num_rounds}", icon="🚩")
-        if len(self.rounds_data) <= self.current_round:
-            self.rounds_data.append(self.prepare_round_data(self.current_round))
-        self._render_submission_ui(self.rounds_data[self.current_round])
+        self._render_submission_ui(self.prepare_round_data(self.current_round))
 
     def display_feedback(self):
         if self.min_score_for_victory is not None:
@@ -211,7 +283,7 @@ class Minigame(ABC):
 
         if self.num_rounds > 0 and self.round_results:
             with st.expander(self.t.get('see_round_summary', "Ver resumen detallado de rondas")):
-                for i, result in enumerate(self.round_results): self.display_round_feedback(result, i + 1)
+                for i, result in enumerate(self.round_results): self.display_round_feedback(self.round_result_view(result), i + 1)
 
     def _render_submission_ui(self, round_data: Any):
         with st.form(key=f"form_{self.game_id}_{self.current_round}"):
@@ -221,6 +293,51 @@ class Minigame(ABC):
                 if user_answer is not None: self._process_submission(user_answer, round_data)
                 else: st.warning(self.t.get('please_pick_an_action',"Por favor, realiza una acción antes de comprobar."))
 
+    def round_result_view(self, result: RoundResult) -> dict:
+        """El resultado de una ronda con la forma que esperan los `display_round_feedback`, incluida la ronda regenerada."""
+        return {"score": result.score, "was_correct": result.was_correct, "user_answer": result.user_answer,
+                "round_data": self.prepare_round_data(result.round_index)}
+
+    def round_options(self) -> Dict[str, Any]:
+        """Opciones de la instancia que necesita `round_pool` para generar sus rondas."""
+        return {}
+
+    def shared_rounds(self) -> list[dict]:
+        """
+        Rondas entre las que elige la partida: las del banco de preguntas si lo tiene para este juego y, si no,
+        las precalculadas una vez por proceso a partir de los datos del juego (ver GameDataRegistry.pool).
+        """
+        banked = get_question_bank().rounds(self.game_id, self.controller.lang)
+        if banked or self.data_key is None: return banked
+        return get_game_data_registry().pool(self.data_key, type(self), self.round_options())
+
+    def shared_round(self, round_index: int) -> dict:
+        """
+        Ronda `round_index` de la partida tal como está en `shared_rounds()`, elegida con la semilla de la partida:
+        la misma semilla repite siempre las mismas rondas. No debe modificarse (es compartida).
+        """
+        pool = self.shared_rounds()
+        if not pool: raise ValueError(f"{type(self).__name__} no tiene rondas: revisa los datos del juego '{self.game_id}'.")
+        return pool[pick_rounds(len(pool), self.seed, self.num_rounds)[round_index]]
+
+    def prepare_round_data(self, round_index: int) -> Any:
+        """Ronda `round_index` de la partida (ver `shared_round`), completada para esta instancia."""
+        return self.complete_round(dict(self.shared_round(round_index)), round_index)
+
+    def complete_round(self, round_data: dict, round_index: int) -> Any:
+        """Completa una ronda compartida con lo que depende de la instancia (textos traducidos, claves de widgets)."""
+        return round_data
+
+    @classmethod
+    def generate_round(cls, data: pd.DataFrame, rng: random.Random, **options) -> dict:
+        """Genera una ronda a partir de `data` usando `rng`, sin depender de la sesión (ver `round_pool`)."""
+        raise NotImplementedError(f"{cls.__name__} no sabe generar rondas fuera de una partida.")
+
+    @classmethod
+    def round_pool(cls, data: pd.DataFrame, size: int, rng: random.Random, **options) -> list[dict]:
+        """Hasta `size` rondas distintas, para el registro de datos compartidos y el banco de preguntas (tools/build_question_bank.py)."""
+        return distinct_rounds(lambda: cls.generate_round(data, rng, **options), size)
+
     @abstractmethod
     def display_instructions(self): pass
     @abstractmethod
@@ -229,23 +346,19 @@ class Minigame(ABC):
     def calculate_score(self, user_answer: Any, round_data: Any) -> tuple[int, bool]: pass
     @abstractmethod
     def display_round_feedback(self, round_result: dict, round_number: int): pass
-    @abstractmethod
-    def prepare_round_data(self, round_index: int) -> Any: pass
 
 class RowBasedMinigame(Minigame):
     """
     Una clase base para minijuegos que procesan un DataFrame fila por fila en orden aleatorio.
-    Maneja el barajado de datos automáticamente.
+    Cada fila da una ronda, así que una partida no repite fila mientras haya filas suficientes.
     """
-    def reset_game(self):
-        super().reset_game()
-        if self.data is not None:
-            self.shuffled_indices = random.sample(range(len(self.data)), len(self.data))
+    @classmethod
+    def row_round(cls, row: pd.Series, rng: random.Random, **options) -> dict:
+        """Ronda para una fila de datos."""
+        return row.to_dict()
 
-    def prepare_round_data(self, round_index: int) -> pd.Series:
-        """
-        Obtiene la fila de datos para la ronda actual usando el índice barajado.
-        """
-        if self.data is None or not hasattr(self, 'shuffled_indices'):
-            raise ValueError("RowBasedMinigame requiere un DataFrame, si ve este error por favor reportelo en el menú de atención al cliente.")
-        return self.data.iloc[self.shuffled_indices[round_index]]
\ No newline at end of file
+    @classmethod
+    def round_pool(cls, data: pd.DataFrame, size: int, rng: random.Random, **options) -> list[dict]:
+        """Una ronda por fila (hasta `size` filas al azar)."""
+        rows = rng.sample(range(len(data)), min(size, len(data)))
+        return [cls.row_round(data.iloc[i], rng, **options) for i in rows]
\ No newline at end of file
@@ -0,0 +1,75 @@
+import hashlib
+import random
+import threading
+import pandas as pd
+import streamlit as st
+from typing import Any, Callable, Dict, List, Tuple
+from ..general_functions import get_setting
+
+def data_fingerprint(data: pd.DataFrame) -> str:
+    """
+    Huella del contenido de un DataFrame: hash vectorizado de filas e índice (`pd.util.hash_pandas_object`) más
+    columnas y tipos. Las columnas de objetos no hashables (listas, como las del Oráculo) se hashean por su texto.
+    """
+    try:
+        rows = pd.util.hash_pandas_object(data, index=True)
+    except TypeError:
+        rows = pd.util.hash_pandas_object(data.apply(lambda col: col.astype(str) if col.dtype == object else col), index=True)
+    digest = hashlib.sha256(rows.to_numpy().tobytes())
+    digest.update(repr([(str(c), str(t)) for c, t in data.dtypes.items()]).encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+class GameDataRegistry:
+    """
+    Datos de solo lectura de los minijuegos, compartidos por todas las sesiones del proceso.
+
+    Cada conjunto de datos se guarda una vez bajo `"<game_id>:<huella>"`; las partidas (en `st.session_state`) solo
+    guardan esa clave, su semilla y sus `RoundResult`. Junto a los datos se guarda lo que se deriva de ellos
+    (`derived`) y las rondas precalculadas de cada juego (`pool`), de las que cada partida elige por índice.
+    Las entradas no caducan: hay una por juego y conjunto de datos distinto (p. ej. por idioma), así que son pocas.
+
+    No depende de Streamlit; ver `get_game_data_registry`.
+    """
+    def __init__(self, pool_size: int = 200):
+        self.pool_size = pool_size
+        self._data: Dict[str, pd.DataFrame] = {}
+        self._derived: Dict[Tuple[str, Any], Any] = {}
+        self._lock = threading.Lock()
+
+    def register(self, game_id: str, data: pd.DataFrame) -> str:
+        """Guarda `data` (si no estaba ya) y devuelve su clave."""
+        key = f"{game_id}:{data_fingerprint(data)}"
+        with self._lock: self._data.setdefault(key, data)
+        return key
+
+    def data(self, key: str) -> pd.DataFrame | None:
+        with self._lock:
+            return self._data.get(key)
+
+    def derived(self, key: str, name: Any, build: Callable[[pd.DataFrame], Any]) -> Any:
+        """`build(datos)` calculado una sola vez por conjunto de datos y `name`."""
+        with self._lock:
+            if (key, name) in self._derived: return self._derived[(key, name)]
+            data = self._data[key]
+        value = build(data)
+        with self._lock:
+            return self._derived.setdefault((key, name), value)
+
+    def pool(self, key: str, game_class: type, options: Dict[str, Any]) -> List[dict]:
+        """Hasta `pool_size` rondas de `game_class` con `options`, generadas con una semilla fija por conjunto de datos."""
+        name = ("pool", game_class.__name__, tuple(sorted(options.items())))
+        return self.derived(key, name, lambda data: game_class.round_pool(data, self.pool_size, random.Random(f"{key}:{game_class.__name__}"), **options))
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            pools = [v for (_, name), v in self._derived.items() if isinstance(name, tuple) and name[0] == "pool"]
+            return {
+                "datasets": len(self._data),
+                "bytes": int(sum(df.memory_usage(deep=True).sum() for df in self._data.values())),
+                "pools": len(pools),
+                "rounds": sum(len(p) for p in pools),
+            }
+
+@st.cache_resource(show_spinner=False)
+def get_game_data_registry() -> GameDataRegistry:
+    return GameDataRegistry(pool_size=int(get_setting("GAME_POOL_SIZE", 200)))
@@ -1,7 +1,9 @@
 import streamlit as st
+import numpy as np
 import pandas as pd
 import plotly.express as px
-from .game_engine import Minigame, RowBasedMinigame
+from .game_engine import Minigame, RowBasedMinigame, distinct_rounds
+from .game_registry import get_game_data_registry
 from streamlit_sortables import sort_items
 from typing import Callable, Any
 import random
@@ -26,7 +28,7 @@ class SimpleQuestionMinigame(RowBasedMinigame):
     def display_game_body(self, round_data: pd.Series) -> str:
         st.write(round_data['question'])
         return st.radio(self.t.get('choose_your_answer', "Elige tu respuesta:"),
-                        options=round_data['options'], key=f"radio_{self.game_id}_{round_data.name}",
+                        options=round_data['options'], key=f"radio_{self.game_id}_{self.current_round}",
                         label_visibility="collapsed")
 
     def calculate_score(self, user_answer, round_data: pd.Series) -> tuple[int, bool]:
@@ -50,13 +52,19 @@ class DataDuelMinigame(Minigame):
 
     def display_instructions(self): st.subheader(f"⚔️ {self.t.get('data_duel_title', 'Duelo de Datos')}")
     
-    def prepare_round_data(self, round_index: int) -> dict:
-        if self.data is None: raise ValueError("DataDuelMinigame requiere un DataFrame.")
-        sample = self.data.sample(2, replace=False)
-        item1, item2 = sample.iloc[0], sample.iloc[1]
-        winner_is_item1 = self.comparison_func(item1, item2) if self.comparison_func else item1['value'] > item2['value']
+    @classmethod
+    def generate_round(cls, data: pd.DataFrame, rng: random.Random, comparison_func: Callable[[Any, Any], bool] | None = None) -> dict:
+        i, j = rng.sample(range(len(data)), 2)
+        item1, item2 = data.iloc[i], data.iloc[j]
+        winner_is_item1 = comparison_func(item1, item2) if comparison_func else item1['value'] > item2['value']
         correct_option = item1['name'] if winner_is_item1 else item2['name']
-        return {"option1": item1['name'], "value1": item1['value'], "option2": item2['name'], "value2": item2['value'], "correct_option": correct_option, "question_text": self.t.get('duel_question', "¿Cuál tiene un valor mayor?")}
+        return {"option1": item1['name'], "value1": item1['value'], "option2": item2['name'], "value2": item2['value'], "correct_option": correct_option}
+
+    def round_options(self) -> dict:
+        return {"comparison_func": self.comparison_func}
+
+    def complete_round(self, round_data: dict, round_index: int) -> dict:
+        return {**round_data, "question_text": self.t.get('duel_question', "¿Cuál tiene un valor mayor?")}
 
     def display_game_body(self, round_data: dict) -> None:
         st.markdown(f"##### {round_data['question_text']}"); return None
@@ -90,19 +98,27 @@ class ClassifierMinigame(Minigame):
     
     def __init__(self, *, difficulty: int = 5, sorting_func: Callable[[pd.DataFrame], pd.DataFrame] | None = None, **kwargs):
         super().__init__(num_rounds=1, **kwargs)
+        if hasattr(self, 'difficulty'): return
         if self.data is None: raise ValueError("ClassifierMinigame requiere un DataFrame.")
         self.difficulty = min(difficulty, len(self.data))
-        self.sorter = sorting_func if sorting_func else lambda df: df.sort_values(by='value', ascending=False)
-        self.value_map = pd.Series(self.data.value.values, index=self.data.name).to_dict()
+        self.sorting_func = sorting_func
+
+    @property
+    def value_map(self) -> dict:
+        return get_game_data_registry().derived(self.data_key, "value_map", lambda df: pd.Series(df.value.values, index=df.name).to_dict())
 
     def display_instructions(self):
         st.subheader(f"📊 {self.t.get('classifier_title', 'El Clasificador')}")
         st.info(self.t.get('classifier_drag_info', "💡 Arrastra los elementos para ordenarlos de mayor a menor."), icon="ℹ️")
 
-    def prepare_round_data(self, round_index: int) -> dict:
-        if self.data is None: raise ValueError("ClassifierMinigame requiere un DataFrame.")
-        sample_df = self.data.sample(n=self.difficulty, replace=False)
-        return {'items_to_sort': sample_df['name'].tolist(), 'correct_order': self.sorter(sample_df)['name'].tolist()}
+    @classmethod
+    def generate_round(cls, data: pd.DataFrame, rng: random.Random, difficulty: int = 5, sorting_func: Callable[[pd.DataFrame], pd.DataFrame] | None = None) -> dict:
+        sample_df = data.iloc[rng.sample(range(len(data)), min(difficulty, len(data)))]
+        sorted_df = sorting_func(sample_df) if sorting_func else sample_df.sort_values(by='value', ascending=False)
+        return {'items_to_sort': sample_df['name'].tolist(), 'correct_order': sorted_df['name'].tolist()}
+
+    def round_options(self) -> dict:
+        return {'difficulty': self.difficulty, 'sorting_func': self.sorting_func}
 
     def display_game_body(self, round_data: dict) -> list:
         return sort_items(round_data['items_to_sort'], direction='vertical')
@@ -140,6 +156,10 @@ class OracleMinigame(RowBasedMinigame):
         self.comparison_func = comparison_func
 
     #def prepare_round_data(self, round_index: int) -> pd.Series: return self.data.iloc[round_index] #type:ignore
+
+    @classmethod
+    def row_round(cls, row: pd.Series, rng: random.Random, **options) -> dict:
+        return {'name': row['name'], 'x': list(row['x']), 'y': list(row['y'])}
     
     def display_instructions(self): st.subheader(f"🔮 {self.t.get('oracle_title', 'El Oráculo')}")
 
@@ -190,28 +210,26 @@ class EstimatorMinigame(RowBasedMinigame):
     MAX_POINTS = 100
     MINIMUM_SLIDER_TEXT = 20
 
-    def prepare_round_data(self, round_index: int) -> dict:
-        """
-        Prepara los datos para una ronda específica.
-        La herencia de RowBasedMinigame se encarga de barajar y seleccionar la fila.
-        """
-        correct_item = super().prepare_round_data(round_index)
-        actual_value = correct_item['value']
+    @classmethod
+    def row_round(cls, row: pd.Series, rng: random.Random, **options) -> dict:
+        actual_value = row['value']
         
         if actual_value == 0:
-            slider_max = self.MINIMUM_SLIDER_TEXT 
+            slider_max = cls.MINIMUM_SLIDER_TEXT 
         else:
-            proportional_max = actual_value * random.uniform(1.5, 3.0)
+            proportional_max = actual_value * rng.uniform(1.5, 3.0)
             
-            slider_max = int(max(proportional_max, actual_value + self.MINIMUM_SLIDER_TEXT))
+            slider_max = int(max(proportional_max, actual_value + cls.MINIMUM_SLIDER_TEXT))
 
         return {
-            'name': correct_item['name'],
+            'name': row['name'],
             'value': actual_value,
             'slider_max': slider_max,
-            'key_suffix': f"{self.game_id}_{round_index}"
         }
 
+    def complete_round(self, round_data: dict, round_index: int) -> dict:
+        return {**round_data, 'key_suffix': f"{self.game_id}_{round_index}"}
+
     def display_instructions(self):
         st.subheader(f"🎯 {self.t.get('estimator_title', 'El Estimador')}")
         st.info(self.t.get('estimator_instructions', "Usa el deslizador para estimar el valor. ¡Mientras más cerca, más puntos!"), icon="ℹ️")
@@ -268,33 +286,110 @@ class EstimatorMinigame(RowBasedMinigame):
             else:
                  st.info(self.t.get('estimator_good_try', "¡Buen intento! Obtuviste **{score}** puntos.").format(score=score), icon="👍")
 
+GEO_DIFFICULTIES = ('easy', 'mixed', 'hard')
+
+def _haversine_km(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Distancia de círculo máximo (km) entre puntos (latitud, longitud) en grados; NaN si falta alguna coordenada."""
+    lat1, lon1, lat2, lon2 = map(np.radians, (a[..., 0], a[..., 1], b[..., 0], b[..., 1]))
+    h = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371.0 * np.arcsin(np.sqrt(h))
+
+class ProvinceIndex:
+    """
+    Índice de distancias entre las provincias de un GeoGuesserMinigame, construido una vez por conjunto de datos.
+
+    La posición de cada provincia es el centroide de las coordenadas (`lat`, `lon`) de sus instituciones y
+    `distances` la matriz de distancias entre centroides, en km. `ranked[p]` tiene las demás provincias de la más
+    cercana a la más lejana, partidas en tres tramos por `tiers[p] = (fin de las cercanas, inicio de las lejanas)`,
+    así que elegir distractores de un tramo solo requiere elegir posiciones al azar.
+    Las provincias sin coordenadas cuentan como intermedias para las demás, y para ellas no hay tramos.
+    """
+    __slots__ = ("provinces", "codes", "centroids", "distances", "ranked", "tiers")
+
+    def __init__(self, data: pd.DataFrame, province_col: str = 'provincia', lat_col: str = 'lat', lon_col: str = 'lon'):
+        codes, uniques = pd.factorize(data[province_col])
+        self.provinces = uniques.tolist()
+        self.codes = {p: i for i, p in enumerate(self.provinces)}
+        n = len(self.provinces)
+        if {lat_col, lon_col} <= set(data.columns): coords = data[[lat_col, lon_col]].to_numpy(dtype=float)
+        else: coords = np.full((len(data), 2), np.nan)
+        located = ~np.isnan(coords).any(axis=1)
+        sums = np.zeros((n, 2))
+        np.add.at(sums, codes[located], coords[located])
+        counts = np.bincount(codes[located], minlength=n)
+        with np.errstate(invalid='ignore'):
+            self.centroids = sums / counts[:, None]
+        self.distances = _haversine_km(self.centroids[:, None, :], self.centroids[None, :, :])
+
+        self.ranked, self.tiers = [], []
+        for p in range(n):
+            others = [q for q in range(n) if q != p]
+            if not counts[p]:
+                self.ranked.append(others)
+                self.tiers.append((len(others), 0))
+                continue
+            known = sorted((q for q in others if counts[q]), key=lambda q: self.distances[p, q])
+            unknown = [q for q in others if not counts[q]]
+            self.ranked.append(known[:len(known) // 2] + unknown + known[len(known) // 2:])
+            third = -(-len(others) // 3)
+            self.tiers.append((third, len(others) - third))
+
+    def distractors(self, province: Any, k: int, rng: random.Random, difficulty: str = 'mixed') -> list:
+        """
+        Hasta `k` provincias distintas de `province`, elegidas con `rng` (un `random.Random`): con `difficulty="hard"`,
+        entre las más cercanas; con `"easy"`, entre las más lejanas; con `"mixed"`, una de cada tramo.
+        """
+        if difficulty not in GEO_DIFFICULTIES: raise ValueError(f"Dificultad desconocida para GeoGuesserMinigame: {difficulty}")
+        ranked, (near_end, far_start) = self.ranked[self.codes[province]], self.tiers[self.codes[province]]
+        m = len(ranked)
+        k = min(k, m)
+        if difficulty == 'hard':
+            positions = rng.sample(range(max(near_end, k)), k)
+        elif difficulty == 'easy':
+            start = min(far_start, m - k)
+            positions = [start + i for i in rng.sample(range(m - start), k)]
+        else:
+            positions = []
+            for lo, hi in ((0, near_end), (near_end, far_start), (far_start, m)):
+                free = [i for i in range(lo, hi) if i not in positions]
+                if free and len(positions) < k: positions.append(free[rng.randrange(len(free))])
+            positions += rng.sample([i for i in range(m) if i not in positions], k - len(positions))
+        return [self.provinces[ranked[i]] for i in positions]
+
 class GeoGuesserMinigame(RowBasedMinigame):
     """
-    Minijuego para adivinar la provincia de una universidad a partir de una lista de opciones
+    Minijuego para adivinar la provincia de una universidad a partir de una lista de opciones.
+    Las provincias incorrectas salen de un ProvinceIndex según `difficulty`: 'hard' (vecinas), 'mixed' o 'easy' (lejanas).
     """
     POINTS_FOR_CORRECT = 50
 
-    def __init__(self, **kwargs):
+    def __init__(self, *, difficulty: str = 'mixed', **kwargs):
         super().__init__(**kwargs)
-        if self.data is not None:
-            self.all_provinces = self.data['provincia'].unique().tolist()
+        if hasattr(self, 'difficulty'): return
+        self.difficulty = difficulty
 
-    def prepare_round_data(self, round_index: int) -> dict:
-        correct_item = super().prepare_round_data(round_index)
-        correct_province = correct_item['provincia']
+    @classmethod
+    def row_round(cls, row: pd.Series, rng: random.Random, index: ProvinceIndex | None = None, difficulty: str = 'mixed') -> dict:
+        correct_province = row['provincia']
         
-        other_provinces = [p for p in self.all_provinces if p != correct_province]
-        wrong_options = random.sample(other_provinces, min(3, len(other_provinces)))
+        wrong_options = index.distractors(correct_province, 3, rng, difficulty) if index is not None else []
         
         options = wrong_options + [correct_province]
-        random.shuffle(options)
+        rng.shuffle(options)
         
         return {
-            'university_name': correct_item['nombre_institucion'],
+            'university_name': row['nombre_institucion'],
             'options': options,
             'correct_province': correct_province
         }
 
+    def round_options(self) -> dict:
+        return {'difficulty': self.difficulty}
+
+    @classmethod
+    def round_pool(cls, data: pd.DataFrame, size: int, rng: random.Random, *, difficulty: str = 'mixed') -> list[dict]:
+        return super().round_pool(data, size, rng, index=ProvinceIndex(data), difficulty=difficulty)
+
     def display_instructions(self):
         st.subheader(f"🗺️ {self.t.get('geoguesser_title', 'GeoGuesser')}")
         st.info(self.t.get('geoguesser_instructions', "Selecciona la provincia correcta para la siguiente institución."), icon="📍")
@@ -324,6 +419,45 @@ class GeoGuesserMinigame(RowBasedMinigame):
                 user_answer = round_result['user_answer']
                 st.error(f"Elegiste **{user_answer}**, pero la respuesta correcta era **{correct_province}**.", icon="❌")
 
+class ImpostorIndex:
+    """
+    Índice de los pares (elemento, categoría) de un ImpostorMinigame, construido una vez por conjunto de datos.
+
+    Los elementos se ordenan por categoría (`order`), así que cada categoría ocupa un tramo contiguo
+    `[starts[c], starts[c] + counts[c])`. Las categorías con al menos 3 elementos y algún elemento fuera
+    de ellas están en `eligible`; generar una ronda solo requiere elegir posiciones al azar.
+    """
+    __slots__ = ("items", "categories", "order", "starts", "counts", "eligible")
+
+    def __init__(self, data: pd.DataFrame, item_col: str, category_col: str, exclude_if_contains: bool = True):
+        pairs = data[[item_col, category_col]].drop_duplicates().dropna()
+        items, categories = pairs[item_col].to_numpy(), pairs[category_col].to_numpy()
+        if exclude_if_contains and len(pairs):
+            keep = np.char.find(np.char.lower(items.astype(str)), np.char.lower(categories.astype(str))) == -1
+            items, categories = items[keep], categories[keep]
+        codes, uniques = pd.factorize(categories)
+        self.items, self.categories = items.tolist(), uniques.tolist()
+        self.order = np.argsort(codes, kind="stable")
+        self.counts = np.bincount(codes, minlength=len(self.categories))
+        self.starts = np.concatenate(([0], np.cumsum(self.counts)[:-1])).astype(np.int64)
+        self.eligible = np.flatnonzero((self.counts >= 3) & (len(items) - self.counts >= 1))
+
+    def sample_round(self, rng: random.Random, majority_category: Any = None) -> tuple[list, Any, Any]:
+        """
+        Devuelve (3 elementos de una categoría, un intruso de otra, la categoría) usando `rng` (un `random.Random`).
+        Con `majority_category`, los 3 elementos son siempre de esa categoría.
+        """
+        eligible = self.eligible
+        if majority_category is not None:
+            eligible = [c for c in eligible if self.categories[c] == majority_category]
+        if not len(eligible): raise ValueError("No se pudo generar una ronda para ImpostorMinigame. Revisa los datos y el filtro.")
+        category = eligible[rng.randrange(len(eligible))]
+        start, count = int(self.starts[category]), int(self.counts[category])
+        majority = [self.items[self.order[start + i]] for i in rng.sample(range(count), 3)]
+        other = rng.randrange(len(self.items) - count)
+        impostor = self.items[self.order[other if other < start else other + count]]
+        return majority, impostor, self.categories[category]
+
 class ImpostorMinigame(Minigame):
     """
     Encuentra el elemento que no pertenece a la categoría.
@@ -331,52 +465,36 @@ class ImpostorMinigame(Minigame):
     """
     POINTS_FOR_CORRECT = 30
 
-    def __init__(self, *, item_col: str, category_col: str, exclude_if_contains: bool = True, **kwargs):
+    def __init__(self, *, item_col: str, category_col: str, exclude_if_contains: bool = True, majority_category: Any = None, **kwargs):
         super().__init__(**kwargs)
+        if hasattr(self, 'item_col'): return
         if self.data is None: raise ValueError("ImpostorMinigame requiere un DataFrame.")
         
         self.item_col = item_col
         self.category_col = category_col
-        
-        unique_data = self.data[[self.item_col, self.category_col]].drop_duplicates().dropna()
-
-        if exclude_if_contains:
-            mask = unique_data.apply(
-                lambda row: str(row[self.category_col]).lower() not in str(row[self.item_col]).lower(),
-                axis=1
-            )
-            self.filtered_data = unique_data[mask]
-        else:
-            self.filtered_data = unique_data
-
-    def prepare_round_data(self, round_index: int) -> dict:
-        for _ in range(10):
-            category_counts = self.filtered_data[self.category_col].value_counts()
-            valid_categories = category_counts[category_counts >= 3].index
-            if valid_categories.empty: continue
-
-            majority_category = random.choice(valid_categories)
-            majority_items_df = self.filtered_data[self.filtered_data[self.category_col] == majority_category]
-            
-            if len(majority_items_df) < 3: continue
-
-            majority_items = majority_items_df.sample(3)
-            
-            impostor_pool = self.filtered_data[self.filtered_data[self.category_col] != majority_category]
-            if impostor_pool.empty: continue
+        self.exclude_if_contains = exclude_if_contains
+        self.majority_category = majority_category
+
+    @staticmethod
+    def round_from_index(index: ImpostorIndex, rng: random.Random, majority_category: Any = None) -> dict:
+        majority_items, impostor, category = index.sample_round(rng, majority_category)
+        options = majority_items + [impostor]
+        rng.shuffle(options)
+        return {
+            'options': options,
+            'impostor': impostor,
+            'correct_category': category
+        }
 
-            impostor_item = impostor_pool.sample(1)
+    def round_options(self) -> dict:
+        return {'item_col': self.item_col, 'category_col': self.category_col,
+                'exclude_if_contains': self.exclude_if_contains, 'majority_category': self.majority_category}
 
-            options = majority_items[self.item_col].tolist() + impostor_item[self.item_col].tolist()
-            random.shuffle(options)
-            
-            return {
-                'options': options,
-                'impostor': impostor_item[self.item_col].iloc[0],
-                'correct_category': majority_category
-            }
-        
-        raise ValueError("No se pudo generar una ronda para ImpostorMinigame. Revisa los datos y el filtro.")
+    @classmethod
+    def round_pool(cls, data: pd.DataFrame, size: int, rng: random.Random, *, item_col: str, category_col: str,
+                   exclude_if_contains: bool = True, majority_category: Any = None) -> list[dict]:
+        index = ImpostorIndex(data, item_col, category_col, exclude_if_contains)
+        return distinct_rounds(lambda: cls.round_from_index(index, rng, majority_category), size)
 
     def display_instructions(self):
         st.subheader(f"🕵️ {self.t.get('impostor_title', 'Encuentra al Intruso')}")
@@ -0,0 +1,102 @@
+import os
+import gzip
+import json
+import random
+import hashlib
+import logging
+import streamlit as st
+from typing import Any, Dict, List
+from ..general_functions import get_setting
+
+BANK_VERSION = 1
+ANY_LANGUAGE = "*"
+DEFAULT_BANK_PATH = "data/question_bank.json.gz"
+
+logger = logging.getLogger(__name__)
+
+def file_digest(path: str) -> str:
+    """Huella del contenido de un archivo de datos (la que guarda el banco en `sources`)."""
+    with open(path, "rb") as f: return hashlib.sha256(f.read()).hexdigest()[:16]
+
+def pick_rounds(pool_size: int, seed: int, num_rounds: int) -> List[int]:
+    """
+    Índices de las `num_rounds` rondas de una partida con semilla `seed` en un conjunto de `pool_size` rondas:
+    sin repetición mientras alcancen y, si no, repitiendo el mismo orden.
+    """
+    if pool_size <= 0: return []
+    picks = random.Random(seed).sample(range(pool_size), min(num_rounds, pool_size))
+    return [picks[i % len(picks)] for i in range(num_rounds)]
+
+class QuestionBank:
+    """
+    Rondas precompiladas de los minijuegos, por juego y por idioma (`"*"` para las que no dependen del idioma).
+
+    El archivo lo genera `tools/build_question_bank.py` a partir de los mismos datos que usan las secciones; es un JSON
+    comprimido con gzip con la forma `{"version", "built_at", "seed", "sources", "games": {game_id: {idioma: [ronda, ...]}}}`.
+    Una partida elige sus rondas con `draw`, que solo depende de (juego, idioma, semilla, ronda): la misma semilla
+    repite exactamente la misma partida. Un archivo de otra versión o ilegible se ignora y los juegos generan sus rondas al momento;
+    lo mismo si los datos de `sources` cambiaron desde que se compiló (ver `stale_sources` y `get_question_bank`).
+
+    No depende de Streamlit; ver `get_question_bank`.
+    """
+    def __init__(self, games: Dict[str, Dict[str, List[dict]]] | None = None, meta: Dict[str, Any] | None = None):
+        self.games = games or {}
+        self.meta = meta or {}
+
+    @classmethod
+    def load(cls, path: str) -> 'QuestionBank':
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f: payload = json.load(f)
+        except (OSError, ValueError):
+            return cls()
+        if payload.get("version") != BANK_VERSION: return cls()
+        games = payload.pop("games", {})
+        return cls(games, payload)
+
+    def save(self, path: str):
+        payload = {"version": BANK_VERSION, **self.meta, "games": self.games}
+        with gzip.open(path, "wt", encoding="utf-8", compresslevel=9) as f:
+            json.dump(payload, f, ensure_ascii=False, separators=(",", ":"), default=_json_default)
+
+    def stale_sources(self) -> List[str]:
+        """Archivos de datos de `sources` que ya no existen o cuyo contenido no es el que se usó para compilar el banco."""
+        return [path for path, digest in self.meta.get("sources", {}).items() if not os.path.exists(path) or file_digest(path) != digest]
+
+    def rounds(self, game_id: str, lang: str = ANY_LANGUAGE) -> List[dict]:
+        """Rondas del juego en `lang`, o las independientes del idioma si no hay una versión traducida."""
+        pools = self.games.get(game_id, {})
+        return pools.get(lang) or pools.get(ANY_LANGUAGE) or []
+
+    def draw(self, game_id: str, lang: str, seed: int, round_index: int, num_rounds: int) -> dict | None:
+        """Ronda `round_index` de una partida de `num_rounds` rondas con semilla `seed` (ver `pick_rounds`), o None si el banco no tiene el juego."""
+        pool = self.rounds(game_id, lang)
+        if not pool: return None
+        return dict(pool[pick_rounds(len(pool), seed, num_rounds)[round_index]])
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "version": self.meta.get("version"),
+            "built_at": self.meta.get("built_at"),
+            "games": len(self.games),
+            "rounds": sum(len(pool) for pools in self.games.values() for pool in pools.values()),
+        }
+
+def _json_default(value: Any) -> Any:
+    """Convierte los escalares y arreglos de numpy/pandas que quedan en las rondas."""
+    if hasattr(value, "tolist"): return value.tolist()
+    if hasattr(value, "item"): return value.item()
+    return str(value)
+
+@st.cache_resource(show_spinner=False)
+def get_question_bank() -> QuestionBank:
+    """
+    Banco de preguntas compartido por todas las sesiones (ruta configurable con QUESTION_BANK_PATH). Si los datos
+    cambiaron desde que se compiló, se ignora: sus respuestas ya no coincidirían con los datos de la página.
+    """
+    path = get_setting("QUESTION_BANK_PATH", DEFAULT_BANK_PATH)
+    bank = QuestionBank.load(path)
+    stale = bank.stale_sources()
+    if stale:
+        logger.warning("Se ignora el banco de preguntas %s: los datos (%s) cambiaron desde que se compiló. Recompílalo con tools/build_question_bank.py.", path, ", ".join(stale))
+        return QuestionBank()
+    return bank
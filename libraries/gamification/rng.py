@@ -0,0 +1,18 @@
+import random
+import hashlib
+from typing import Any
+
+_system_random = random.SystemRandom()
+
+def derive_seed(*parts: Any) -> int:
+    """Semilla de 32 bits estable (igual en todos los procesos, a diferencia de `hash`) a partir de `parts`."""
+    digest = hashlib.sha256(":".join(str(p) for p in parts).encode("utf-8")).digest()
+    return int.from_bytes(digest[:4], "big")
+
+def new_session_seed() -> int:
+    """Semilla aleatoria para una sesión nueva (no usa el `random` global, que otros módulos pueden sembrar)."""
+    return _system_random.getrandbits(32)
+
+def game_seed(session_seed: int, game_id: str, generation: int) -> int:
+    """Semilla de la partida número `generation` (0, 1, ... con cada reinicio) del juego `game_id` en una sesión."""
+    return derive_seed(session_seed, game_id, generation)
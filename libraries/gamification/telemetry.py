@@ -0,0 +1,160 @@
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import pandas as pd
+import streamlit as st
+from typing import Any, Dict, List
+from ..general_functions import get_setting, local_store_path
+
+ROUND_STARTED = "round_started"
+ANSWERED = "answered"
+GAME_FINISHED = "game_finished"
+EVENTS = (ROUND_STARTED, ANSWERED, GAME_FINISHED)
+
+def question_fingerprint(round_data: dict) -> str:
+    """Identificador estable de una ronda compartida (del banco o del registro): la huella de su contenido."""
+    return hashlib.sha256(json.dumps(round_data, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()[:16]
+
+class SessionCounters:
+    """
+    Totales de la sesión, actualizados con cada partida terminada o reiniciada en lugar de recorrer los juegos
+    registrados en cada ejecución. `finished` guarda, por juego y en orden de finalización, lo que muestran el panel
+    de progreso y las conclusiones.
+    """
+    __slots__ = ("total_score", "score_by_type", "finished")
+
+    def __init__(self):
+        self.total_score = 0
+        self.score_by_type: Dict[str, int] = {}
+        self.finished: Dict[str, tuple] = {}
+
+    def record_finish(self, game_id: str, game_type: str, title: str, score: int, was_successful: bool):
+        if game_id in self.finished: self.record_reset(game_id)
+        self.finished[game_id] = (game_type, title, score, was_successful)
+        self.total_score += score
+        self.score_by_type[game_type] = self.score_by_type.get(game_type, 0) + score
+
+    def record_reset(self, game_id: str):
+        entry = self.finished.pop(game_id, None)
+        if entry is None: return
+        game_type, _, score, _ = entry
+        self.total_score -= score
+        self.score_by_type[game_type] -= score
+        if not any(e[0] == game_type for e in self.finished.values()): del self.score_by_type[game_type]
+
+    @property
+    def games_finished(self) -> int:
+        return len(self.finished)
+
+    def best_game_type(self) -> str | None:
+        return max(self.score_by_type, key=self.score_by_type.get) if self.score_by_type else None # type: ignore
+
+class GameEventLog:
+    """
+    Registro local (SQLite) de los eventos de los minijuegos de todas las sesiones: ronda mostrada, respuesta y
+    partida terminada. Cada ronda se identifica por la huella de su contenido (`question_fingerprint`), que se
+    guarda una vez en la tabla `questions`, así que las mismas rondas del banco o del registro se agregan juntas
+    entre sesiones, idiomas y reinicios. Los eventos llevan además la semilla y el número de rondas de la partida,
+    con los que cada ronda se puede regenerar (ver tools/replay_rounds.py).
+
+    Las agregaciones (`question_rollup`, `game_rollup`) son consultas SQL sobre el registro; se usan desde
+    tools/game_rollups.py y la página de administración, no durante el juego.
+    No depende de Streamlit; ver `get_game_event_log`.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS game_events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, ts REAL NOT NULL, event TEXT NOT NULL, session_id TEXT NOT NULL,
+                game_id TEXT NOT NULL, game_type TEXT NOT NULL, lang TEXT, seed INTEGER, num_rounds INTEGER, round_index INTEGER,
+                question_id TEXT, score INTEGER, was_correct INTEGER, elapsed_s REAL
+            );
+            CREATE INDEX IF NOT EXISTS game_events_question ON game_events (event, question_id);
+            CREATE INDEX IF NOT EXISTS game_events_game ON game_events (event, game_type, game_id);
+            CREATE TABLE IF NOT EXISTS questions (question_id TEXT PRIMARY KEY, game_id TEXT NOT NULL, round_json TEXT NOT NULL);
+        """)
+
+    def record(self, event: str, session_id: str, game_id: str, game_type: str, lang: str | None = None, seed: int | None = None,
+               num_rounds: int | None = None, round_index: int | None = None, round_data: dict | None = None, score: int | None = None,
+               was_correct: bool | None = None, elapsed_s: float | None = None):
+        """Añade un evento; con `round_data` (la ronda compartida, sin completar) guarda también la ronda si es nueva."""
+        if event not in EVENTS: raise ValueError(f"Evento desconocido: {event}")
+        question_id = question_fingerprint(round_data) if round_data is not None else None
+        with self._lock:
+            if round_data is not None:
+                self._conn.execute("INSERT OR IGNORE INTO questions (question_id, game_id, round_json) VALUES (?, ?, ?)",
+                                   (question_id, game_id, json.dumps(round_data, ensure_ascii=False, default=str)))
+            self._conn.execute(
+                "INSERT INTO game_events (ts, event, session_id, game_id, game_type, lang, seed, num_rounds, round_index, question_id, score, was_correct, elapsed_s) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (time.time(), event, session_id, game_id, game_type, lang, seed, num_rounds, round_index, question_id, score,
+                 None if was_correct is None else int(was_correct), elapsed_s))
+
+    def _query(self, sql: str, params: tuple = ()) -> pd.DataFrame:
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            rows = cursor.fetchall()
+        return pd.DataFrame(rows, columns=[c[0] for c in cursor.description])
+
+    def question_rollup(self, min_answers: int = 1, game_id: str | None = None) -> pd.DataFrame:
+        """
+        Dificultad de cada ronda: veces mostrada y respondida, abandonos, acierto y puntuación media y tiempo medio
+        de respuesta. Ordenada de menor a mayor acierto: arriba, las rondas candidatas a revisar o quitar.
+        """
+        return self._query(f"""
+            SELECT e.game_id, e.question_id,
+                   SUM(e.event = '{ROUND_STARTED}') AS shown,
+                   SUM(e.event = '{ANSWERED}') AS answers,
+                   MAX(SUM(e.event = '{ROUND_STARTED}') - SUM(e.event = '{ANSWERED}'), 0) AS abandoned,
+                   ROUND(AVG(CASE WHEN e.event = '{ANSWERED}' THEN e.was_correct END), 3) AS accuracy,
+                   ROUND(AVG(CASE WHEN e.event = '{ANSWERED}' THEN e.score END), 1) AS avg_score,
+                   ROUND(AVG(CASE WHEN e.event = '{ANSWERED}' THEN e.elapsed_s END), 1) AS avg_seconds,
+                   q.round_json
+            FROM game_events e LEFT JOIN questions q ON q.question_id = e.question_id
+            WHERE e.event IN ('{ROUND_STARTED}', '{ANSWERED}') AND e.question_id IS NOT NULL {"AND e.game_id = ?" if game_id else ""}
+            GROUP BY e.game_id, e.question_id
+            HAVING answers >= ?
+            ORDER BY accuracy, answers DESC
+        """, ((game_id,) if game_id else ()) + (min_answers,))
+
+    def game_rollup(self, by: str = "game_type") -> pd.DataFrame:
+        """Por tipo de minijuego (`by="game_type"`) o por juego (`"game_id"`): partidas empezadas y terminadas, puntuación media y tasa de éxito."""
+        if by not in ("game_type", "game_id"): raise ValueError(f"Agrupación desconocida: {by}")
+        return self._query(f"""
+            SELECT {by},
+                   SUM(event = '{ROUND_STARTED}' AND round_index = 0) AS started,
+                   SUM(event = '{GAME_FINISHED}') AS finished,
+                   ROUND(AVG(CASE WHEN event = '{GAME_FINISHED}' THEN score END), 1) AS avg_score,
+                   ROUND(AVG(CASE WHEN event = '{GAME_FINISHED}' THEN was_correct END), 3) AS success_rate,
+                   ROUND(AVG(CASE WHEN event = '{ANSWERED}' THEN was_correct END), 3) AS round_accuracy,
+                   COUNT(DISTINCT session_id) AS sessions
+            FROM game_events
+            GROUP BY {by}
+            ORDER BY {by}
+        """)
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT event, COUNT(*) FROM game_events GROUP BY event").fetchall())
+            questions = self._conn.execute("SELECT COUNT(*) FROM questions").fetchone()[0]
+        return {"events": sum(counts.values()), **{e: counts.get(e, 0) for e in EVENTS}, "questions": questions}
+
+    def round_events(self, session_id: str | None = None) -> pd.DataFrame:
+        """Rondas mostradas (de una sesión o de todas), con lo necesario para regenerarlas: juego, idioma, semilla, rondas e índice."""
+        return self._query(f"""
+            SELECT session_id, game_id, lang, seed, num_rounds, round_index, question_id FROM game_events
+            WHERE event = '{ROUND_STARTED}' AND question_id IS NOT NULL {"AND session_id = ?" if session_id else ""}
+            ORDER BY id
+        """, (session_id,) if session_id else ())
+
+@st.cache_resource(show_spinner=False)
+def get_game_event_log() -> GameEventLog | None:
+    """Registro de eventos compartido por todas las sesiones (desactivable con GAME_TELEMETRY=0)."""
+    if str(get_setting("GAME_TELEMETRY", "1")).lower() in ("0", "false", "no"): return None
+    return GameEventLog(local_store_path("game_events.sqlite3"))
@@ -1,13 +1,46 @@
 import io
+import os
 import re
 import json
-import gspread
 import pandas as pd
 import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 from typing import Any, Callable, Dict, List, Optional
 from language_detection  import detect_browser_language
 from .streamlit_float_upd import float_init, float_parent
-from datetime import datetime
+
+def get_setting(name: str, default: Any = None) -> Any:
+    """
+    Lee un valor de configuración, primero desde las variables de entorno y luego desde '.streamlit/secrets.toml'.
+
+    Args:
+        name (str): Nombre de la variable de configuración.
+        default (Any): Valor devuelto si la variable no está definida en ningún sitio.
+
+    Returns:
+        Any: El valor configurado o `default`.
+    """
+    value = os.environ.get(name)
+    if value is not None:
+        return value
+    try:
+        if name in st.secrets:
+            return st.secrets[name]
+    except Exception:
+        pass
+    return default
+
+def local_store_path(*parts: str) -> str:
+    """Devuelve una ruta dentro del directorio de almacenamiento local (LOCAL_STORE_DIR) y crea las carpetas necesarias."""
+    base_dir = get_setting("LOCAL_STORE_DIR", ".local_store")
+    path = os.path.join(base_dir, *parts)
+    os.makedirs(os.path.dirname(path) if parts else path, exist_ok=True)
+    return path
+
+def get_session_id() -> str:
+    """Devuelve el identificador de la sesión de Streamlit actual ('local' si se ejecuta fuera de una sesión)."""
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else "local"
 
 def to_csv_string(list_of_dicts):
     if not list_of_dicts:
@@ -315,60 +348,3 @@ class FloatingPanel:
                     func()
 
             panel_container.float(self.css_panel)
-
-@st.cache_resource(ttl=3600)
-def connect_to_gsheet():
-    scopes=[
-        "https://www.googleapis.com/auth/spreadsheets",
-        "https://www.googleapis.com/auth/drive",
-    ]
-    try:
-        creds = st.secrets["gcp_service_account"]
-        client = gspread.service_account_from_dict(creds, scopes=scopes)
-        return client
-    except Exception as e:
-        st.error(f"Error al conectar con Google Sheets: {e}")
-        return None
-
-@st.cache_data(ttl=60)
-def get_leaderboard(sheet_name: str = "LeaderboardUniversity") -> pd.DataFrame:
-    client = connect_to_gsheet()
-    if not client:
-        return pd.DataFrame()
-    try:
-        sheet = client.open(sheet_name).sheet1
-        records = sheet.get_all_records() 
-        df = pd.DataFrame(records)
-        
-        if df.empty:
-            return df
-        
-        df['Score'] = pd.to_numeric(df['Score'], errors='coerce') 
-        df.dropna(subset=['Score'], inplace=True)
-        df['Score'] = df['Score'].astype(int)
-
-        leaderboard_df = df.sort_values(by="Score", ascending=False).head(10)
-        leaderboard_df.reset_index(drop=True, inplace=True)
-        return leaderboard_df
-
-    except gspread.exceptions.SpreadsheetNotFound:
-        st.error(f"Error: No se encontró la hoja de cálculo llamada '{sheet_name}'. Avisar a administración del error!")
-        return pd.DataFrame()
-    except Exception as e:
-        st.error(f"Ocurrió un error al obtener el leaderboard: {e}, Avisar a Administración!")
-        return pd.DataFrame()
-
-def submit_score(player_name: str, score: int, sheet_name: str = "LeaderboardUniversity"):
-    client = connect_to_gsheet()
-    if not client:
-        st.error("No se pudo enviar la puntuación debido a un problema de conexión.")
-        return False
-    try:
-        sheet = client.open(sheet_name).sheet1
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        sheet.append_row([timestamp, player_name, score])
-        get_leaderboard.clear() 
-        return True
-    except Exception as e:
-        st.error(f"Ocurrió un error al enviar tu puntuación: {e}, avisa a administracion para intentar solucionarlo rápidamente.")
-        return False
\ No newline at end of file
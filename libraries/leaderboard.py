@@ -0,0 +1,231 @@
+import time
+import bisect
+import sqlite3
+import threading
+import pandas as pd
+import streamlit as st
+from datetime import datetime
+from typing import Any, Dict, List, Tuple
+from .general_functions import get_setting, local_store_path
+from .sheets import SheetHandles, get_sheet_handles
+
+DEFAULT_SHEET = "LeaderboardUniversity"
+LEADERBOARD_COLUMNS = ["Timestamp", "PlayerName", "Score"]
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+PERIODS = ("week", "all")
+
+def week_of(timestamp: str) -> str | None:
+    """Semana ISO ("2025-W07") de un Timestamp del ranking, o None si no se puede interpretar."""
+    try:
+        year, week, _ = datetime.strptime(str(timestamp)[:19], TIMESTAMP_FORMAT).isocalendar()
+    except ValueError:
+        return None
+    return f"{year}-W{week:02d}"
+
+class LeaderboardStore:
+    """
+    Ranking local (SQLite) con Google Sheets como réplica asíncrona.
+
+    Las puntuaciones se guardan en la tabla `scores`, con índices por (hoja, puntuación) y (hoja, semana, puntuación):
+    el top-K de un periodo ("all" o "week", la semana ISO actual) es un recorrido de K filas del índice, y además se
+    mantiene en memoria, actualizándose con cada `submit` sin volver a consultar. Leer el ranking cuesta lo mismo con
+    cien puntuaciones que con un millón.
+
+    La hoja de cálculo ya no se lee en cada consulta: la primera vez que se usa una hoja se importa su contenido una
+    sola vez (para conservar el histórico), y después un hilo en segundo plano le envía las puntuaciones nuevas cada
+    `flush_interval_s` segundos, en un único `append_rows` por hoja y lote, con espera exponencial ante errores (hasta
+    `max_backoff_s`). La entrega es "al menos una vez". Cada proceso tiene su propio almacén: con varias réplicas de la
+    app, cada una muestra las puntuaciones que recibió más las importadas al arrancar.
+
+    Las hojas se usan a través de `sheets` (ver SheetHandles; en pruebas, con un cliente falso: tests/test_leaderboard.py).
+    No depende de Streamlit; ver `get_leaderboard_store`.
+    """
+    def __init__(self, path: str, sheets: SheetHandles, top_k: int = 10,
+                 flush_interval_s: float = 5.0, batch_size: int = 200, max_backoff_s: float = 300.0, autostart: bool = True):
+        self.path = path
+        self.sheets = sheets
+        self.top_k = top_k
+        self.flush_interval_s = flush_interval_s
+        self.batch_size = batch_size
+        self.max_backoff_s = max_backoff_s
+        self.backoff_s = 0.0
+        self.stats: Dict[str, Any] = {"submitted": 0, "sent": 0, "batches": 0, "imported": 0, "failures": 0,
+                                      "last_error": None, "last_flush": None}
+        self._top: Dict[Tuple[str, str, str | None], List[tuple]] = {}
+        self._to_import: set[str] = set()
+        self._imported: set[str] = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS scores (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, sheet TEXT NOT NULL, timestamp TEXT NOT NULL,
+                player_name TEXT NOT NULL, score INTEGER NOT NULL, week TEXT, created REAL NOT NULL, sent REAL
+            );
+            CREATE INDEX IF NOT EXISTS scores_all_time ON scores (sheet, score DESC, id);
+            CREATE INDEX IF NOT EXISTS scores_weekly ON scores (sheet, week, score DESC, id);
+            CREATE INDEX IF NOT EXISTS scores_pending ON scores (sent, id);
+            CREATE TABLE IF NOT EXISTS sheet_imports (sheet TEXT PRIMARY KEY, imported REAL NOT NULL, rows INTEGER NOT NULL);
+        """)
+        self._imported = {r[0] for r in self._conn.execute("SELECT sheet FROM sheet_imports")}
+        if autostart: self.start()
+
+    # --- Ranking ---
+
+    def _period_key(self, sheet: str, period: str) -> Tuple[str, str, str | None]:
+        if period not in PERIODS: raise ValueError(f"Periodo desconocido: {period}")
+        return (sheet, period, week_of(datetime.now().strftime(TIMESTAMP_FORMAT)) if period == "week" else None)
+
+    def submit(self, player_name: str, score: int, sheet: str = DEFAULT_SHEET) -> List[Any]:
+        """Guarda una puntuación (se enviará a la hoja en segundo plano) y devuelve su fila (Timestamp, PlayerName, Score)."""
+        row = [datetime.now().strftime(TIMESTAMP_FORMAT), player_name, int(score)]
+        week = week_of(row[0])
+        with self._lock:
+            row_id = self._conn.execute("INSERT INTO scores (sheet, timestamp, player_name, score, week, created) VALUES (?, ?, ?, ?, ?, ?)",
+                                        (sheet, *row, week, time.time())).lastrowid
+            entry = (-row[2], row_id, *row)
+            for key in ((sheet, "all", None), (sheet, "week", week)):
+                top = self._top.get(key)
+                if top is None: continue
+                bisect.insort(top, entry)
+                del top[self.top_k:]
+            self.stats["submitted"] += 1
+        self._request_import(sheet)
+        return row
+
+    def top(self, sheet: str = DEFAULT_SHEET, period: str = "all") -> pd.DataFrame:
+        """Las `top_k` mejores puntuaciones del periodo ("all" o "week"), de mayor a menor (a igualdad, la más antigua primero)."""
+        self._request_import(sheet)
+        key = self._period_key(sheet, period)
+        with self._lock:
+            top = self._top.get(key)
+            if top is None:
+                query = ("SELECT -score, id, timestamp, player_name, score FROM scores WHERE sheet=? "
+                         + ("AND week=? " if period == "week" else "") + "ORDER BY score DESC, id LIMIT ?")
+                params = (sheet, key[2], self.top_k) if period == "week" else (sheet, self.top_k)
+                top = self._top[key] = [tuple(r) for r in self._conn.execute(query, params)]
+                for stale in [k for k in self._top if k[:2] == key[:2] and k != key]: del self._top[stale]
+            rows = [list(entry[2:]) for entry in top]
+        return pd.DataFrame(rows, columns=LEADERBOARD_COLUMNS)
+
+    # --- Réplica en Google Sheets ---
+
+    def _request_import(self, sheet: str):
+        if sheet in self._imported or sheet in self._to_import: return
+        with self._lock: self._to_import.add(sheet)
+        self._wake.set()
+
+    def import_sheet(self, sheet: str) -> int:
+        """
+        Importa una sola vez el contenido de la hoja `sheet` (omitiendo las filas que ya estén en el almacén) y
+        devuelve cuántas filas se añadieron. Propaga los errores de la hoja.
+        """
+        if sheet in self._imported: return 0
+        records = self.sheets.call(sheet, "get_all_records")
+        rows = []
+        for r in records:
+            score = pd.to_numeric(r.get("Score"), errors="coerce")
+            if pd.isna(score): continue
+            rows.append((str(r.get("Timestamp", "")), str(r.get("PlayerName", "")), int(score)))
+        now = time.time()
+        with self._lock:
+            known = {tuple(r) for r in self._conn.execute("SELECT timestamp, player_name, score FROM scores WHERE sheet=?", (sheet,))}
+            new_rows = [r for r in rows if r not in known]
+            self._conn.execute("BEGIN")
+            self._conn.executemany("INSERT INTO scores (sheet, timestamp, player_name, score, week, created, sent) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                   [(sheet, ts, name, score, week_of(ts), now, now) for ts, name, score in new_rows])
+            self._conn.execute("INSERT OR REPLACE INTO sheet_imports (sheet, imported, rows) VALUES (?, ?, ?)", (sheet, now, len(new_rows)))
+            self._conn.execute("COMMIT")
+            for key in [k for k in self._top if k[0] == sheet]: del self._top[key]
+            self._imported.add(sheet)
+            self._to_import.discard(sheet)
+            self.stats["imported"] += len(new_rows)
+        return len(new_rows)
+
+    def pending(self, sheet: str | None = None) -> List[List[Any]]:
+        """Filas aún no enviadas a la hoja (de `sheet`, o de todas)."""
+        query = "SELECT timestamp, player_name, score FROM scores WHERE sent IS NULL" + (" AND sheet=?" if sheet else "") + " ORDER BY id"
+        with self._lock:
+            return [list(r) for r in self._conn.execute(query, (sheet,) if sheet else ())]
+
+    def flush(self) -> int:
+        """Envía un lote de pendientes (un `append_rows` por hoja) y devuelve cuántas filas se enviaron. Propaga los errores."""
+        with self._lock:
+            batch = self._conn.execute("SELECT id, sheet, timestamp, player_name, score FROM scores WHERE sent IS NULL ORDER BY id LIMIT ?",
+                                       (self.batch_size,)).fetchall()
+        by_sheet: Dict[str, list] = {}
+        for row_id, sheet, *values in batch: by_sheet.setdefault(sheet, []).append((row_id, values))
+        sent = 0
+        for sheet, rows in by_sheet.items():
+            self.sheets.call(sheet, "append_rows", [values for _, values in rows], value_input_option="USER_ENTERED")
+            now = time.time()
+            with self._lock:
+                self._conn.executemany("UPDATE scores SET sent=? WHERE id=?", [(now, row_id) for row_id, _ in rows])
+                self.stats["sent"] += len(rows)
+                self.stats["batches"] += 1
+            sent += len(rows)
+        with self._lock: self.stats["last_flush"] = time.time()
+        return sent
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval_s + self.backoff_s)
+            self._wake.clear()
+            try:
+                with self._lock: to_import = list(self._to_import)
+                for sheet in to_import: self.import_sheet(sheet)
+                while self.flush() >= self.batch_size: pass
+                self.backoff_s = 0.0
+            except Exception as e:
+                with self._lock:
+                    self.stats["failures"] += 1
+                    self.stats["last_error"] = str(e)
+                self.backoff_s = min(self.max_backoff_s, max(self.flush_interval_s, self.backoff_s * 2))
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive(): return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="leaderboard-mirror", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float | None = None):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None: self._thread.join(timeout)
+
+    def wake(self):
+        """Adelanta el siguiente envío (p. ej. al apagar o en pruebas)."""
+        self._wake.set()
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            pending = self._conn.execute("SELECT COUNT(*) FROM scores WHERE sent IS NULL").fetchone()[0]
+            stored = self._conn.execute("SELECT COALESCE(MAX(id), 0) FROM scores").fetchone()[0]
+            return {**self.stats, "pending": pending, "stored": stored, "backoff_s": self.backoff_s,
+                    "imported_sheets": sorted(self._imported), "cached_boards": len(self._top)}
+
+@st.cache_resource(show_spinner=False)
+def get_leaderboard_store() -> LeaderboardStore:
+    return LeaderboardStore(
+        local_store_path("leaderboard.sqlite3"),
+        get_sheet_handles(),
+        top_k=int(get_setting("LEADERBOARD_TOP_N", 10)),
+        flush_interval_s=float(get_setting("LEADERBOARD_FLUSH_S", 5)),
+        batch_size=int(get_setting("LEADERBOARD_BATCH_SIZE", 200)),
+    )
+
+def submit_score(player_name: str, score: int, sheet_name: str = DEFAULT_SHEET) -> bool:
+    """Guarda la puntuación en el ranking local; se copiará a Google Sheets en segundo plano (ver LeaderboardStore)."""
+    try:
+        get_leaderboard_store().submit(player_name, score, sheet_name)
+        return True
+    except sqlite3.Error as e:
+        st.error(f"Ocurrió un error al guardar tu puntuación: {e}, avisa a administracion para intentar solucionarlo rápidamente.")
+        return False
+
+def get_leaderboard(period: str = "all", sheet_name: str = DEFAULT_SHEET) -> pd.DataFrame:
+    """Las mejores puntuaciones del periodo ("all" o "week") según el ranking local."""
+    return get_leaderboard_store().top(sheet_name, period)
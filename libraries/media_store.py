@@ -0,0 +1,112 @@
+import io
+import os
+import time
+import hashlib
+import threading
+import streamlit as st
+from typing import Any, Dict
+from .general_functions import get_setting, local_store_path
+
+MIME_EXTENSIONS = {"image/png": ".png", "image/jpeg": ".jpg", "image/gif": ".gif", "image/webp": ".webp"}
+
+class MediaStore:
+    """
+    Almacén local de imágenes direccionado por contenido (SHA-256), compartido por todas las sesiones del proceso.
+
+    Cada imagen se escribe una sola vez en `root/<2 primeros caracteres>/<sha256><ext>`; los historiales de chat solo guardan
+    la referencia y una miniatura (ver `image_message_content`), y la imagen completa se lee del disco cuando se pide.
+    Los archivos que nadie ha leído ni escrito en `ttl_s` segundos se eliminan con `cleanup`.
+    """
+    def __init__(self, root: str, thumbnail_px: int = 480, ttl_s: float = 24 * 3600, cleanup_every_s: float = 3600):
+        self.root = root
+        self.thumbnail_px = thumbnail_px
+        self.ttl_s = ttl_s
+        self.cleanup_every_s = cleanup_every_s
+        self._last_cleanup = time.time()
+        self._lock = threading.Lock()
+        self.stats = {"stored": 0, "deduplicated": 0, "reads": 0, "missing": 0, "bytes_stored": 0}
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, digest: str, mime_type: str | None) -> str:
+        return os.path.join(self.root, digest[:2], digest + MIME_EXTENSIONS.get(mime_type or "", ".bin"))
+
+    def put(self, data: bytes, mime_type: str | None = "image/png") -> str:
+        """Guarda `data` (si no estaba ya) y devuelve su SHA-256."""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(digest, mime_type)
+        if os.path.exists(path):
+            os.utime(path)
+            with self._lock: self.stats["deduplicated"] += 1
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f: f.write(data)
+            os.replace(tmp_path, path)
+            with self._lock:
+                self.stats["stored"] += 1
+                self.stats["bytes_stored"] += len(data)
+        if time.time() - self._last_cleanup > self.cleanup_every_s: self.cleanup()
+        return digest
+
+    def get(self, digest: str, mime_type: str | None = "image/png") -> bytes | None:
+        """Contenido de la imagen `digest`, o None si ya no está en el disco."""
+        path = self._path(digest, mime_type)
+        try:
+            with open(path, "rb") as f: data = f.read()
+            os.utime(path)
+        except OSError:
+            with self._lock: self.stats["missing"] += 1
+            return None
+        with self._lock: self.stats["reads"] += 1
+        return data
+
+    def thumbnail(self, data: bytes) -> tuple[bytes, int, int]:
+        """Miniatura PNG de como mucho `thumbnail_px` de lado y el tamaño original (ancho, alto)."""
+        from PIL import Image
+        with Image.open(io.BytesIO(data)) as image:
+            size = image.size
+            if max(size) <= self.thumbnail_px: return data, *size
+            image.thumbnail((self.thumbnail_px, self.thumbnail_px))
+            buffer = io.BytesIO()
+            image.save(buffer, format="PNG", optimize=True)
+        return buffer.getvalue(), *size
+
+    def cleanup(self):
+        self._last_cleanup = time.time()
+        cutoff = self._last_cleanup - self.ttl_s
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                try:
+                    if os.path.getmtime(path) < cutoff: os.remove(path)
+                except OSError:
+                    pass
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.stats)
+
+@st.cache_resource(show_spinner=False)
+def get_media_store() -> MediaStore:
+    return MediaStore(
+        local_store_path("media"),
+        thumbnail_px=int(get_setting("MEDIA_THUMBNAIL_PX", 480)),
+        ttl_s=float(get_setting("MEDIA_STORE_TTL_H", 24)) * 3600,
+    )
+
+def image_message_content(data: bytes, mime_type: str | None) -> Dict[str, Any]:
+    """
+    Contenido de un mensaje de imagen para el historial del chat: referencia a la imagen guardada en el almacén
+    y una miniatura, en lugar de los bytes completos. Si la imagen no se puede leer, se guarda tal cual.
+    """
+    store = get_media_store()
+    try:
+        thumbnail, width, height = store.thumbnail(data)
+    except Exception:
+        return {"type": "image", "data": data, "mime_type": mime_type}
+    return {"type": "image", "ref": store.put(data, mime_type), "mime_type": mime_type, "thumbnail": thumbnail, "width": width, "height": height}
+
+def load_image(content: Dict[str, Any]) -> bytes | None:
+    """Imagen a tamaño completo de un mensaje de imagen (de la sesión o del almacén)."""
+    if content.get("data") is not None: return content["data"]
+    return get_media_store().get(content["ref"], content.get("mime_type")) if content.get("ref") else None
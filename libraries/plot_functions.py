@@ -1,3 +1,4 @@
+import os
 import numpy as np
 import pandas as pd
 import plotly.express as px
@@ -5,6 +6,7 @@ import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 from sklearn.linear_model import LinearRegression
 import streamlit as st
+from pyproj import Transformer
 from .general_functions import Translator
 
 import pandas as pd
@@ -48,13 +50,57 @@ def cargar_datos_matricula(rute:str):
     except FileNotFoundError:
         return pd.DataFrame()
 
+UTM_CRS = "EPSG:32617"
+# Latitud y longitud mínimas y máximas de Cuba (con la Isla de la Juventud).
+CUBA_BOUNDS = (19.5, 23.5, -85.2, -74.0)
+
+@st.cache_resource
+def _utm_transformer() -> Transformer:
+    return Transformer.from_crs(UTM_CRS, "EPSG:4326", always_xy=True)
+
+def proyectar_coordenadas(utm_x: pd.Series, utm_y: pd.Series) -> Tuple[pd.Series, pd.Series]:
+    """
+    Convierte las coordenadas de las instituciones a latitud y longitud WGS84 en una sola pasada vectorizada.
+
+    Las filas con valores en metros se proyectan desde UTM zona 17N (`UTM_CRS`). Las que ya están en grados
+    (`utm_x` como latitud y `utm_y` como longitud, como trae la mayoría de filas de db_uni.parquet) se copian.
+    Los puntos que quedan fuera de Cuba (`CUBA_BOUNDS`) se dejan en NaN.
+
+    Args:
+        utm_x (pd.Series): Columna `utm_x` (este en metros o latitud en grados).
+        utm_y (pd.Series): Columna `utm_y` (norte en metros o longitud en grados).
+
+    Returns:
+        Tuple[pd.Series, pd.Series]: Latitud y longitud, con el índice de `utm_x`.
+    """
+    x = pd.to_numeric(utm_x, errors='coerce').to_numpy(dtype=float)
+    y = pd.to_numeric(utm_y, errors='coerce').to_numpy(dtype=float)
+    in_degrees = (np.abs(x) <= 90) & (np.abs(y) <= 180)
+    lat, lon = np.where(in_degrees, x, np.nan), np.where(in_degrees, y, np.nan)
+    in_metres = ~in_degrees & ~np.isnan(x) & ~np.isnan(y)
+    if in_metres.any():
+        lon[in_metres], lat[in_metres] = _utm_transformer().transform(x[in_metres], y[in_metres])
+    lat_min, lat_max, lon_min, lon_max = CUBA_BOUNDS
+    inside = (lat >= lat_min) & (lat <= lat_max) & (lon >= lon_min) & (lon <= lon_max)
+    return pd.Series(np.where(inside, lat, np.nan), index=utm_x.index), pd.Series(np.where(inside, lon, np.nan), index=utm_x.index)
+
 @st.cache_data
+def _cargar_datos_instituciones(rute: str, huella: tuple) -> pd.DataFrame:
+    df_uni = pd.read_parquet(rute)
+    if {'utm_x', 'utm_y'} <= set(df_uni.columns):
+        df_uni['lat'], df_uni['lon'] = proyectar_coordenadas(df_uni['utm_x'], df_uni['utm_y'])
+    return df_uni
+
 def cargar_datos_instituciones(rute:str):
+    """
+    Carga los datos de instituciones con las columnas `lat`/`lon` (WGS84, ver `proyectar_coordenadas`) ya calculadas.
+    La caché se indexa por la huella del archivo (tamaño y fecha de modificación), así que se recalcula si cambia.
+    """
     try:
-        df_uni = pd.read_parquet(rute)
-        return df_uni
+        stat = os.stat(rute)
     except FileNotFoundError:
         return pd.DataFrame()
+    return _cargar_datos_instituciones(rute, (stat.st_size, stat.st_mtime_ns))
 #-----------------------------------------------------
 
 def calcular_cagr(df_evolucion_total_carrera: pd.DataFrame, ano_inicio_cagr: int, ano_fin_cagr: int) -> dict:
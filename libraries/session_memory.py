@@ -0,0 +1,163 @@
+import sys
+import time
+import threading
+import numpy as np
+import pandas as pd
+import streamlit as st
+from types import ModuleType, FunctionType, MethodType, BuiltinFunctionType
+from typing import Any, Dict, List
+from .general_functions import get_setting, get_session_id
+
+IMAGE_EVICTED_TEXT = "🖼️ *(Imagen retirada para liberar memoria)*"
+
+_SKIP_TYPES = (ModuleType, FunctionType, MethodType, BuiltinFunctionType, type, threading.Thread)
+_registry: Dict[str, Dict[str, Any]] = {}
+_registry_lock = threading.Lock()
+
+def deep_sizeof(obj: Any, seen: set | None = None) -> int:
+    """
+    Estima los bytes que ocupa un objeto y todo lo que cuelga de él.
+    Los DataFrames/Series se miden con `memory_usage(deep=True)` y los arrays de numpy con `nbytes`;
+    cada objeto se cuenta una sola vez (por `id`) y se ignoran módulos, funciones y clases.
+    """
+    if seen is None: seen = set()
+    if id(obj) in seen or isinstance(obj, _SKIP_TYPES): return 0
+    seen.add(id(obj))
+
+    if isinstance(obj, pd.DataFrame): return int(obj.memory_usage(deep=True, index=True).sum())
+    if isinstance(obj, pd.Series): return int(obj.memory_usage(deep=True, index=True))
+    if isinstance(obj, np.ndarray): return int(obj.nbytes)
+
+    size = sys.getsizeof(obj, 0)
+    if isinstance(obj, (str, bytes, bytearray, int, float, bool)) or obj is None:
+        return size
+    if isinstance(obj, dict):
+        return size + sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        return size + sum(deep_sizeof(i, seen) for i in obj)
+    if hasattr(obj, '__dict__'):
+        size += deep_sizeof(vars(obj), seen)
+    for slot in getattr(type(obj), '__slots__', ()):
+        if hasattr(obj, slot): size += deep_sizeof(getattr(obj, slot), seen)
+    return size
+
+def _category(key: str) -> str:
+    if key == 'Translator': return 'translator'
+    if key == 'GameController': return 'games'
+    if key.startswith('messages_'): return 'chat_history'
+    if key.startswith('gemini_chat_'): return 'chat_sessions'
+    return 'other'
+
+def measure_session_state(state: Any = None, top_n: int = 10) -> Dict[str, Any]:
+    """
+    Mide el estado de una sesión por categorías: 'translator', 'games', 'chat_history', 'chat_sessions' y 'other'.
+
+    Args:
+        state (Any): Un objeto tipo `st.session_state` (por defecto, el de la sesión actual).
+        top_n (int): Número de claves más pesadas a devolver.
+
+    Returns:
+        Dict[str, Any]: {'total': bytes, 'categories': {categoría: bytes}, 'largest': [(clave, bytes), ...]}.
+    """
+    if state is None: state = st.session_state
+    seen = _shared_object_ids()
+    categories = {'translator': 0, 'games': 0, 'chat_history': 0, 'chat_sessions': 0, 'other': 0}
+    per_key = []
+    for key in list(state.keys()):
+        try: value = state[key]
+        except KeyError: continue
+        size = deep_sizeof(value, seen)
+        categories[_category(str(key))] += size
+        per_key.append((str(key), size))
+    per_key.sort(key=lambda kv: kv[1], reverse=True)
+    return {'total': sum(categories.values()), 'categories': categories, 'largest': per_key[:top_n]}
+
+def _shared_object_ids() -> set:
+    """Objetos compartidos entre sesiones (el backend de la IA y sus clientes) que no deben contarse en ninguna sesión."""
+    ids = set()
+    backends_module = sys.modules.get('libraries.ai_backends')
+    pending = [backends_module.get_ai_backend()] if backends_module is not None else []
+    for _ in range(3):
+        next_level = []
+        for obj in pending:
+            if obj is None or id(obj) in ids or isinstance(obj, (str, int, float, bool)): continue
+            ids.add(id(obj))
+            next_level += list(vars(obj).values()) if hasattr(obj, '__dict__') else []
+        pending = next_level
+    return ids
+
+def evict_chat_images(state: Any, keep_recent: int, bytes_to_free: int) -> int:
+    """
+    Sustituye las imágenes más antiguas de los historiales de chat por un texto breve,
+    conservando las `keep_recent` más recientes de cada conversación. Se detiene al liberar `bytes_to_free`.
+
+    Returns:
+        int: Bytes liberados (aproximados).
+    """
+    translator = state.get('Translator')
+    evicted_text = translator.translate('ask_ai_component', {}).get('image_evicted', IMAGE_EVICTED_TEXT) if translator else IMAGE_EVICTED_TEXT
+    candidates = []
+    for key in list(state.keys()):
+        key = str(key)
+        if not key.startswith('messages_') or state.get(f"processing_{key[len('messages_'):]}", False): continue
+        images = [m for m in state[key] if isinstance(m.get('content'), dict) and m['content'].get('type') == 'image']
+        candidates += images[:max(0, len(images) - keep_recent)]
+
+    def image_bytes(message): return len(message['content'].get('data') or message['content'].get('thumbnail') or b'')
+    freed = 0
+    for message in sorted(candidates, key=image_bytes, reverse=True):
+        if freed >= bytes_to_free: break
+        freed += image_bytes(message)
+        message['content'] = evicted_text
+    return freed
+
+def enforce_session_caps(state: Any = None) -> Dict[str, Any]:
+    """
+    Aplica los límites de memoria de la sesión actual: si la sesión supera SESSION_MEMORY_CAP_MB,
+    se retiran las imágenes antiguas de los chats (se conservan las CHAT_KEEP_RECENT_IMAGES últimas de cada uno).
+    Los minijuegos no necesitan compactarse: sus datos y rondas están en GameDataRegistry, fuera de la sesión.
+
+    Returns:
+        Dict[str, Any]: La medición de la sesión tras aplicar los límites, más 'freed_bytes'.
+    """
+    if state is None: state = st.session_state
+    report = measure_session_state(state)
+    cap = float(get_setting("SESSION_MEMORY_CAP_MB", 25)) * 1024 * 1024
+    freed = 0
+    if report['total'] > cap:
+        freed = evict_chat_images(state, int(get_setting("CHAT_KEEP_RECENT_IMAGES", 2)), int(report['total'] - cap))
+        if freed: report = measure_session_state(state)
+    report.update(freed_bytes=freed)
+    return report
+
+def track_session_memory():
+    """
+    Mide y limita la memoria de la sesión actual como máximo una vez cada SESSION_MEMORY_SAMPLE_S segundos,
+    y guarda el resultado en un registro compartido por todo el proceso (consultable desde la página de administración).
+    """
+    session_id = get_session_id()
+    now = time.time()
+    with _registry_lock:
+        last = _registry.get(session_id)
+        if last and now - last['timestamp'] < float(get_setting("SESSION_MEMORY_SAMPLE_S", 30)):
+            return
+        _registry[session_id] = {**(last or {}), 'timestamp': now}
+
+    report = enforce_session_caps()
+    translator = st.session_state.get('Translator')
+    with _registry_lock:
+        _registry[session_id] = {
+            'timestamp': now,
+            'section': st.session_state.get('h_nav_main_section'),
+            'language': getattr(translator, 'actual_lang', None),
+            **report,
+        }
+        stale = now - float(get_setting("SESSION_MEMORY_STALE_S", 3600))
+        for sid in [sid for sid, entry in _registry.items() if entry['timestamp'] < stale]:
+            del _registry[sid]
+
+def session_memory_reports() -> List[Dict[str, Any]]:
+    """Devuelve la última medición de cada sesión activa, de la más pesada a la más ligera."""
+    with _registry_lock:
+        reports = [{'session_id': sid, **entry} for sid, entry in _registry.items() if 'total' in entry]
+    return sorted(reports, key=lambda r: r['total'], reverse=True)
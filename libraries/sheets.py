@@ -0,0 +1,155 @@
+import time
+import random
+import threading
+import gspread
+import requests
+import streamlit as st
+from typing import Any, Callable, Dict
+from .general_functions import get_setting
+
+SCOPES = [
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive",
+]
+TRANSIENT_STATUS = {408, 429, 500, 502, 503, 504}
+AUTH_STATUS = {401}
+NOT_FOUND_STATUS = {404}
+
+class SheetsNotConfigured(Exception):
+    """No hay cuenta de servicio de Google Sheets configurada."""
+
+def create_gsheet_client() -> Any:
+    """Cliente de gspread con la cuenta de servicio de '.streamlit/secrets.toml' (`gcp_service_account`)."""
+    try:
+        creds = st.secrets["gcp_service_account"]
+    except Exception as e:
+        raise SheetsNotConfigured(f"Falta la cuenta de servicio de Google Sheets: {e}") from e
+    return gspread.service_account_from_dict(dict(creds), scopes=SCOPES)
+
+def error_status(error: Exception) -> int | None:
+    """Código HTTP de un error de gspread (`APIError.code`) o de requests, si lo tiene."""
+    for attr in ("code", "status_code"):
+        status = getattr(error, attr, None)
+        if isinstance(status, int): return status
+    response = getattr(error, "response", None)
+    return getattr(response, "status_code", None)
+
+def classify_error(error: Exception) -> str:
+    """"transient" (reintentar), "auth" (crear otro cliente), "not_found" (volver a abrir la hoja) o "fatal"."""
+    status = error_status(error)
+    if status in TRANSIENT_STATUS: return "transient"
+    if status in AUTH_STATUS or type(error).__name__ == "RefreshError": return "auth"
+    if status in NOT_FOUND_STATUS or isinstance(error, (gspread.exceptions.SpreadsheetNotFound, gspread.exceptions.WorksheetNotFound)):
+        return "not_found"
+    if isinstance(error, (ConnectionError, TimeoutError, requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return "transient"
+    return "fatal"
+
+def parse_sheet_keys(value: Any) -> Dict[str, str]:
+    """Claves de las hojas de cálculo por nombre: un diccionario (secrets.toml) o "nombre=clave,nombre2=clave2" (entorno)."""
+    if not value: return {}
+    if isinstance(value, str):
+        return dict(item.split("=", 1) for item in value.split(",") if "=" in item)
+    return {str(k): str(v) for k, v in dict(value).items()}
+
+class SheetHandles:
+    """
+    Acceso compartido a las hojas de Google Sheets.
+
+    `client.open(nombre)` busca la hoja de cálculo en Drive por nombre en cada llamada; aquí la hoja (su primera
+    pestaña) se abre una vez por nombre y se reutiliza, con el mismo cliente (y su sesión HTTP) para todas las
+    operaciones. Si `sheet_keys` tiene la clave de la hoja de cálculo se abre con `open_by_key`, sin pasar por Drive;
+    si no, se abre por nombre una vez y se recuerda su clave para las siguientes aperturas.
+
+    `call` centraliza los errores: los transitorios (429, 5xx, red) se reintentan con espera exponencial, los de
+    autenticación crean un cliente nuevo y los de hoja no encontrada vuelven a abrirla, una vez cada uno.
+    `connect()` crea un cliente (en pruebas, uno falso; ver tests/test_sheets.py).
+    No depende de la sesión de Streamlit; ver `get_sheet_handles`.
+    """
+    def __init__(self, connect: Callable[[], Any] = create_gsheet_client, sheet_keys: Dict[str, str] | None = None,
+                 max_retries: int = 4, base_delay: float = 0.5, max_delay: float = 8.0, sleep: Callable[[float], None] = time.sleep):
+        self.connect = connect
+        self.sheet_keys = dict(sheet_keys or {})
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.sleep = sleep
+        self._client: Any = None
+        self._handles: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "opens": 0, "opens_by_name": 0, "connects": 0, "retries": 0, "reconnects": 0, "reopens": 0, "errors": 0}
+
+    def client(self) -> Any:
+        with self._lock:
+            if self._client is None:
+                self._client = self.connect()
+                self.stats["connects"] += 1
+            return self._client
+
+    def worksheet(self, sheet: str) -> Any:
+        """Primera pestaña de la hoja de cálculo `sheet` (nombre), abierta una sola vez."""
+        with self._lock:
+            handle = self._handles.get(sheet)
+        if handle is not None: return handle
+        client = self.client()
+        key = self.sheet_keys.get(sheet)
+        if key:
+            spreadsheet = client.open_by_key(key)
+        else:
+            spreadsheet = client.open(sheet)
+            self._count("opens_by_name")
+        handle = spreadsheet.sheet1
+        with self._lock:
+            if getattr(spreadsheet, "id", None): self.sheet_keys.setdefault(sheet, spreadsheet.id)
+            self.stats["opens"] += 1
+            return self._handles.setdefault(sheet, handle)
+
+    def invalidate(self, sheet: str | None = None, client: bool = False):
+        """Olvida la hoja `sheet` (o todas) y, con `client`, el cliente y todas las hojas abiertas con él."""
+        with self._lock:
+            if sheet is None or client: self._handles.clear()
+            else: self._handles.pop(sheet, None)
+            if client: self._client = None
+
+    def _count(self, stat: str):
+        with self._lock: self.stats[stat] += 1
+
+    def _backoff(self, attempt: int) -> float:
+        return min(self.max_delay, self.base_delay * 2 ** attempt) * random.uniform(0.75, 1.25)
+
+    def call(self, sheet: str, method: str, *args, **kwargs) -> Any:
+        """`worksheet(sheet).<method>(*args, **kwargs)` con reintentos; propaga el error si no se puede recuperar."""
+        self._count("calls")
+        attempt, reconnected, reopened = 0, False, False
+        while True:
+            try:
+                return getattr(self.worksheet(sheet), method)(*args, **kwargs)
+            except Exception as e:
+                kind = classify_error(e)
+                if kind == "auth" and not reconnected:
+                    self.invalidate(client=True)
+                    reconnected = True
+                    self._count("reconnects")
+                elif kind == "not_found" and not reopened:
+                    self.invalidate(sheet)
+                    reopened = True
+                    self._count("reopens")
+                elif kind == "transient" and attempt < self.max_retries:
+                    self._count("retries")
+                    self.sleep(self._backoff(attempt))
+                    attempt += 1
+                else:
+                    self._count("errors")
+                    raise
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.stats, "connected": self._client is not None, "sheets": sorted(self._handles)}
+
+@st.cache_resource(show_spinner=False)
+def get_sheet_handles() -> SheetHandles:
+    return SheetHandles(
+        connect=lambda: create_gsheet_client(),
+        sheet_keys=parse_sheet_keys(get_setting("GSHEET_KEYS")),
+        max_retries=int(get_setting("GSHEET_MAX_RETRIES", 4)),
+    )
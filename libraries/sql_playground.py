@@ -0,0 +1,171 @@
+import re
+import time
+import sqlite3
+import threading
+import pandas as pd
+import streamlit as st
+from typing import Dict, List, Tuple
+from .general_functions import get_setting, get_session_id
+from .ai_backends import get_ai_backend
+from .ai_functions import get_request_scheduler
+from .ai_response_cache import normalize_prompt
+from .plot_functions import cargar_datos_matricula, cargar_datos_instituciones
+
+DATABASE_URI = "file:sql_playground?mode=memory&cache=shared"
+PLAYGROUND_TABLES = {"matricula": (cargar_datos_matricula, 'data/db.parquet'), "instituciones": (cargar_datos_instituciones, 'data/db_uni.parquet')}
+PATTERN_SQL_BLOCK = re.compile(r"```(?:sql|sqlite)?\s*\n(?P<sql>.*?)```", re.DOTALL | re.IGNORECASE)
+PATTERN_SQL_LITERALS = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\")")
+ALLOWED_ACTIONS = {sqlite3.SQLITE_SELECT, sqlite3.SQLITE_READ, sqlite3.SQLITE_FUNCTION, getattr(sqlite3, 'SQLITE_RECURSIVE', 33)}
+
+class QueryError(Exception):
+    """Consulta rechazada (no es un único SELECT) o fallida (error de SQLite, tiempo agotado)."""
+
+class PlaygroundDatabase:
+    """
+    Base de datos SQLite en memoria con las tablas del playground, compartida por todo el proceso.
+
+    La conexión `_owner` crea las tablas y mantiene viva la base compartida (`cache=shared`); cada consulta usa
+    su propia conexión de solo lectura (`PRAGMA query_only` y un autorizador que solo permite leer),
+    un límite de filas y un tiempo máximo controlado con `set_progress_handler`.
+    """
+    def __init__(self, tables: Dict[str, pd.DataFrame], uri: str = DATABASE_URI):
+        self.uri = uri
+        self._owner = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        for name, df in tables.items():
+            df.to_sql(name, self._owner, index=False, if_exists="replace")
+        self.schema = {name: [(row[1], row[2]) for row in self._owner.execute(f'PRAGMA table_info("{name}")')] for name in tables}
+        self.row_counts = {name: len(df) for name, df in tables.items()}
+        self._lock = threading.Lock()
+        self.stats = {"queries": 0, "rejected": 0, "timeouts": 0}
+
+    @staticmethod
+    def _authorizer(action, *args):
+        return sqlite3.SQLITE_OK if action in ALLOWED_ACTIONS else sqlite3.SQLITE_DENY
+
+    def _count(self, stat: str):
+        with self._lock: self.stats[stat] += 1
+
+    def query(self, sql: str, max_rows: int = 1000, timeout_s: float = 3.0) -> Tuple[pd.DataFrame, bool]:
+        """
+        Ejecuta una consulta de solo lectura.
+
+        Returns:
+            tuple: (resultado con como mucho `max_rows` filas, True si se ha truncado).
+        """
+        try:
+            sql = validate_select(sql)
+        except QueryError:
+            self._count("rejected")
+            raise
+        conn = sqlite3.connect(self.uri, uri=True, check_same_thread=False)
+        try:
+            conn.execute("PRAGMA query_only = ON")
+            conn.set_authorizer(self._authorizer)
+            deadline = time.perf_counter() + timeout_s
+            conn.set_progress_handler(lambda: int(time.perf_counter() > deadline), 10000)
+            cursor = conn.execute(f"SELECT * FROM ({sql}) LIMIT ?", (max_rows + 1,))
+            rows = cursor.fetchall()
+            columns = [d[0] for d in cursor.description]
+        except sqlite3.Error as e:
+            if "interrupted" in str(e):
+                self._count("timeouts")
+                raise QueryError(f"tiempo máximo de {timeout_s:g} s superado") from e
+            self._count("rejected")
+            raise QueryError(str(e)) from e
+        finally:
+            conn.close()
+        self._count("queries")
+        return pd.DataFrame(rows[:max_rows], columns=columns), len(rows) > max_rows
+
+    def describe(self, sample_rows: int = 3) -> str:
+        """Esquema de las tablas (columnas, tipos y unas pocas filas de ejemplo) para el modelo de lenguaje."""
+        parts = []
+        for name, columns in self.schema.items():
+            sample = pd.read_sql_query(f'SELECT * FROM "{name}" LIMIT {int(sample_rows)}', self._owner)
+            parts.append(
+                f"Tabla `{name}` ({self.row_counts[name]} filas): " + ", ".join(f"{c} {t}" for c, t in columns)
+                + f"\nEjemplo:\n```csv\n{sample.to_csv(index=False)}```"
+            )
+        return "\n\n".join(parts)
+
+def validate_select(sql: str) -> str:
+    """Devuelve la consulta sin el ';' final si es una única sentencia SELECT/WITH; si no, lanza QueryError."""
+    sql = sql.strip().rstrip(";").strip()
+    if not sql: raise QueryError("consulta vacía")
+    if not re.match(r"(?is)^(select|with)\b", sql): raise QueryError("solo se permiten consultas SELECT")
+    if ";" in PATTERN_SQL_LITERALS.sub("''", sql): raise QueryError("solo se permite una sentencia")
+    return sql
+
+def normalize_sql(sql: str) -> str:
+    """Forma canónica para la caché: sin comentarios ni ';' final, espacios colapsados y minúsculas fuera de los literales."""
+    sql = re.sub(r"--[^\n]*|/\*.*?\*/", " ", sql, flags=re.DOTALL).strip().rstrip(";")
+    parts = PATTERN_SQL_LITERALS.split(sql)
+    return "".join(p if i % 2 else re.sub(r"\s+", " ", p.lower()) for i, p in enumerate(parts)).strip()
+
+@st.cache_resource(show_spinner=False)
+def get_playground_database() -> PlaygroundDatabase:
+    return PlaygroundDatabase({name: loader(path) for name, (loader, path) in PLAYGROUND_TABLES.items()})
+
+@st.cache_data(show_spinner=False, max_entries=256, ttl=3600)
+def run_playground_query(normalized_sql: str) -> Tuple[pd.DataFrame, bool, float]:
+    """Ejecuta una consulta ya normalizada (ver `normalize_sql`); el resultado se cachea por el texto normalizado."""
+    start = time.perf_counter()
+    df, truncated = get_playground_database().query(
+        normalized_sql,
+        max_rows=int(get_setting("SQL_PLAYGROUND_MAX_ROWS", 1000)),
+        timeout_s=float(get_setting("SQL_PLAYGROUND_TIMEOUT_S", 3)),
+    )
+    return df, truncated, time.perf_counter() - start
+
+SQL_INSTRUCTION = """
+You translate questions about Cuban higher education enrollment into ONE SQLite query.
+Answer ONLY with a single ```sql block containing one SELECT statement (CTEs allowed). No explanations.
+Use only the tables and columns below. Prefer aggregated results with readable column aliases and an ORDER BY.
+The academic year `ano_inicio_curso` is the year the course starts (2015 = course 2015-2016). There is no data for 2018.
+
+Tables:
+{schema}
+"""
+
+EXPLAIN_INSTRUCTION = """
+You are a data analysis assistant for Cuban higher education enrollment data.
+You receive a user's question, the SQL query that was run and a small sample of its result.
+Answer the question in 2-4 sentences in the language '{lang}', based ONLY on the result sample. Do not repeat the SQL.
+"""
+
+def _ask_backend(system_instruction: str, prompt: str, response_format: str = "text") -> str:
+    backend = get_ai_backend()
+    if backend is None: raise QueryError("el asistente de IA no está configurado")
+    chat = backend.create_chat(system_instruction=system_instruction, code_execution=False, response_format=response_format)
+    stream = get_request_scheduler().stream(get_session_id(), lambda: chat.send_message_stream(prompt))
+    return "".join(content for kind, content, _ in stream if kind == "text")
+
+def extract_sql(text: str) -> str | None:
+    match = PATTERN_SQL_BLOCK.search(text)
+    candidate = (match.group("sql") if match else text).strip()
+    try:
+        return validate_select(candidate)
+    except QueryError:
+        return None
+
+@st.cache_data(show_spinner=False, max_entries=256, ttl=3600)
+def _question_to_sql_cached(normalized_question: str, _question: str) -> str | None:
+    schema = get_playground_database().describe()
+    return extract_sql(_ask_backend(SQL_INSTRUCTION.format(schema=schema), _question, response_format="sql"))
+
+def question_to_sql(question: str) -> str | None:
+    """Traduce una pregunta a SQL (cacheado por la pregunta normalizada). El modelo solo recibe el esquema y unas filas de ejemplo."""
+    return _question_to_sql_cached(normalize_prompt(question), question)
+
+@st.cache_data(show_spinner=False, max_entries=256, ttl=3600)
+def explain_result(question: str, normalized_sql: str, lang: str, sample_rows: int = 20) -> str:
+    """Respuesta breve a la pregunta a partir de una muestra del resultado (como mucho `sample_rows` filas)."""
+    df, truncated, _ = run_playground_query(normalized_sql)
+    sample = df.head(sample_rows).to_csv(index=False)
+    prompt = (f"Question: {question}\nSQL: {normalized_sql}\n"
+              f"Result ({len(df)}{'+' if truncated else ''} rows, first {min(sample_rows, len(df))}):\n```csv\n{sample}```")
+    return _ask_backend(EXPLAIN_INSTRUCTION.format(lang=lang), prompt)
+
+def table_schema() -> List[Tuple[str, int, List[Tuple[str, str]]]]:
+    db = get_playground_database()
+    return [(name, db.row_counts[name], columns) for name, columns in db.schema.items()]
@@ -1,7 +1,8 @@
 from .ai_functions import ask_ai_component
 from .plot_functions import *
 from .Gamification import *
-from .general_functions import connect_to_gsheet, get_leaderboard, submit_score
+from .leaderboard import submit_score, get_leaderboard
+from .sql_playground import QueryError, table_schema, question_to_sql, normalize_sql, run_playground_query, explain_result
 
 def show_info(msg):
     if msg: st.caption(f"ℹ️ {msg}")
@@ -128,13 +129,9 @@ def A1(df_main, game_controller: GameController, ts:Translator, **kwargs):
         
         if df_historico_juego is not None and not df_historico_juego.empty:
             pico_data = df_historico_juego.loc[df_historico_juego['matricula_total'].idxmax()]
-            pico_matricula = pico_data['matricula_total']
             pico_curso = pico_data['curso_academico']
 
-            game_data_A1_estimator = pd.DataFrame([{
-                "name": ts.translate('A1_peak_enrollment_label', "Matrícula Nacional en el Año Pico ({curso})").format(curso=pico_curso),
-                "value": pico_matricula
-            }])
+            game_data_A1_estimator = build_game_data("A1_EstimatorPicoNacional", df_main, None, ts)
 
             st.markdown("---")
             st.subheader(ts.translate('A1_game_subheader', "A Prueba: La Magnitud del Pico"))
@@ -244,20 +241,16 @@ def A2(df_main, game_controller: GameController, ts:Translator, **kwargs):
         Antes de sumergirnos en los gráficos, pongamos a prueba tu percepción. A lo largo de Cuba, miles de estudiantes eligen su camino profesional cada año. ¿Cuáles crees que son las ramas del conocimiento que atraen a la mayor cantidad de universitarios? ¿Podrías ordenar las principales áreas según su popularidad?
         """))
         
-        ano_reciente = df_main['ano_inicio_curso'].max()
-        df_ramas_reciente = df_main[df_main['ano_inicio_curso'] == ano_reciente]\
-            .groupby('rama_ciencias')['matricula_total'].sum().reset_index()
+        game_data_A2_classifier = build_game_data("A2_ClassifierSaber", df_main, None, ts)
 
-        if not df_ramas_reciente.empty:
-            game_data_A2_classifier = df_ramas_reciente.rename(columns={'rama_ciencias': 'name', 'matricula_total': 'value'})
-            
+        if game_data_A2_classifier is not None:
             classifier_game_A2 = ClassifierMinigame(
                 game_id="A2_ClassifierSaber",
                 game_title=ts.translate('A2_game_title', "El Clasificador del Saber"),
                 data=game_data_A2_classifier,
                 content_callback=render_analysis_content_A2_part1,
-                difficulty=4,
-                min_score_for_victory=30
+                min_score_for_victory=30,
+                **game_options("A2_ClassifierSaber")
             )
             classifier_game_A2.render()
         else:
@@ -325,44 +318,24 @@ def A2(df_main, game_controller: GameController, ts:Translator, **kwargs):
         Las ramas del saber no son islas. Sus tendencias de crecimiento a menudo están conectadas. Algunas se mueven en perfecta sincronía, mientras que otras bailan a su propio ritmo. Cuando el interés en las Ciencias Pedagógicas crece, ¿qué otra área crees que se beneficia de un impulso similar? ¡Acepta el duelo y descúbrelo!
         """))
 
-        _, df_corr_juego, _ = graficate_A2_correlacion(df_main, ts)
-        
-        if df_corr_juego is not None and not df_corr_juego.empty:
-            df_corr_juego.index.name = "Rama_A"
-            df_corr_juego.columns.name = "Rama_B"
-            df_corr_long = df_corr_juego.stack().reset_index()
-            df_corr_long.columns = ['Rama_A', 'Rama_B', 'Correlacion']
-            df_corr_long = df_corr_long[df_corr_long['Rama_A'] != df_corr_long['Rama_B']]
-
-            rama_pivote = "Ciencias Pedagógicas"
-            if rama_pivote in df_corr_long['Rama_A'].values:
-                df_juego_duelo = df_corr_long[df_corr_long['Rama_A'] == rama_pivote].copy()
-                
-                game_data_A2_duel = pd.DataFrame({
-                    "name": df_juego_duelo['Rama_B'],
-                    "value": df_juego_duelo['Correlacion']
-                })
+        game_data_A2_duel = build_game_data("A2_DuelCorrelacion", df_main, None, ts)
 
-                if len(game_data_A2_duel) >= 2:
-                    duel_game_A2 = DataDuelMinigame(
-                        game_id="A2_DuelCorrelacion",
-                        game_title=ts.translate('A2_game_title_corr', "Duelo de Sinergias"),
-                        data=game_data_A2_duel,
-                        content_callback=render_analysis_content_A2_part2,
-                        num_rounds=3,
-                        min_score_for_victory=20,
-                        translation={
-                            'duel_question': ts.translate(
-                                'A2_duel_question_corr', 
-                                "Crecimiento de las **Ciencias Pedagógicas** es MÁS similar al de:"
-                            )
-                        }
+        if game_data_A2_duel is not None:
+            duel_game_A2 = DataDuelMinigame(
+                game_id="A2_DuelCorrelacion",
+                game_title=ts.translate('A2_game_title_corr', "Duelo de Sinergias"),
+                data=game_data_A2_duel,
+                content_callback=render_analysis_content_A2_part2,
+                num_rounds=3,
+                min_score_for_victory=20,
+                translation={
+                    'duel_question': ts.translate(
+                        'A2_duel_question_corr', 
+                        "Crecimiento de las **Ciencias Pedagógicas** es MÁS similar al de:"
                     )
-                    duel_game_A2.render()
-                else:
-                    render_analysis_content_A2_part2()
-            else:
-                render_analysis_content_A2_part2()
+                }
+            )
+            duel_game_A2.render()
         else:
             render_analysis_content_A2_part2()
     else:
@@ -436,17 +409,15 @@ def A3(df_main, game_controller: GameController, ts:Translator, **kwargs):
         Antes de ver el ranking completo, ¿qué tan buena es tu intuición sobre la demanda estudiantil? Te presentamos una selección de carreras. ¡Ordénalas de la más popular a la menos popular según la matrícula del último año!
         """))
         
-        df_ranking_game, _, _, _ = analisis_A3(df_main, top_n=top_n)
-        if df_ranking_game is not None and not df_ranking_game.empty:
-            game_data_classifier = df_ranking_game.rename(columns={'carrera': 'name', 'matricula_total': 'value'})
-            
+        game_data_classifier = build_game_data("A3_ClassifierPopularidad", df_main, None, ts)
+        if game_data_classifier is not None:
             classifier_game_A3 = ClassifierMinigame(
                 game_id="A3_ClassifierPopularidad",
                 game_title=ts.translate('A3_game1_title', "El Clasificador de Carreras"),
                 data=game_data_classifier,
                 content_callback=render_analysis_content_part1,
-                difficulty=4,
-                min_score_for_victory=30
+                min_score_for_victory=30,
+                **game_options("A3_ClassifierPopularidad")
             )
             classifier_game_A3.render()
         else:
@@ -514,10 +485,8 @@ def A3(df_main, game_controller: GameController, ts:Translator, **kwargs):
         Algunas carreras crecen a un ritmo vertiginoso mientras otras se contraen. ¿Podrás identificar cuál de las dos opciones ha tenido una mayor tasa de crecimiento promedio anual? ¡Acepta el duelo!
         """))
         
-        df_cagr_game, _, _ = analisis_A3_cagr(df_main)
-        if df_cagr_game is not None and not df_cagr_game.empty:
-            game_data_duel = df_cagr_game.rename(columns={'carrera': 'name', 'CAGR': 'value'})
-
+        game_data_duel = build_game_data("A3_DuelCrecimiento", df_main, None, ts)
+        if game_data_duel is not None:
             duel_game_A3 = DataDuelMinigame(
                 game_id="A3_DuelCrecimiento",
                 game_title=ts.translate('A3_game2_title', "Duelo de Crecimiento"),
@@ -617,9 +586,8 @@ def A4(df_main, game_controller: GameController, ts:Translator, **kwargs):
         st.subheader(ts.translate('A4_game1_subheader', "Duelo de Género por Rama"))
         st.markdown(ts.translate('A4_game1_intro', "Algunas áreas del conocimiento atraen a más mujeres que otras. ¿Sabrías decir en cuál de las siguientes ramas hay un mayor porcentaje de matrícula femenina?"))
         
-        if df_ramas is not None and not df_ramas.empty:
-            game_data_duel = df_ramas.rename(columns={'rama_ciencias': 'name', 'Porcentaje_Mujeres': 'value'})
-            
+        game_data_duel = build_game_data("A4_DuelGeneroRama", df_main, None, ts)
+        if game_data_duel is not None:
             duel_game_A4 = DataDuelMinigame(
                 game_id="A4_DuelGeneroRama",
                 game_title=ts.translate('A4_game1_title', "Duelo de Ramas"),
@@ -640,24 +608,15 @@ def A4(df_main, game_controller: GameController, ts:Translator, **kwargs):
             st.subheader(ts.translate('A4_game2_subheader', "Espera! Hay un intruso entre las carreras!"))
             st.markdown(ts.translate('A4_game2_intro', "Tres de las siguientes carreras tienen una abrumadora mayoría de mujeres en sus aulas. Una de ellas, sin embargo, es un campo predominantemente masculino. ¡Identifica al intruso!"))
             
-            if df_fem is not None and not df_fem.empty and df_masc is not None and not df_masc.empty:
-                items_fem = df_fem.sample(3)[['carrera']].copy()
-                items_fem['category'] = 'Feminized'
-                
-                item_masc = df_masc.sample(1)[['carrera']].copy()
-                item_masc['category'] = 'Masculinized'
-                
-                game_data_impostor = pd.concat([items_fem, item_masc]).rename(columns={'carrera': 'item'})
-                
+            game_data_impostor = build_game_data("A4_ImpostorGeneroCarrera", df_main, None, ts)
+            if game_data_impostor is not None:
                 impostor_game_A4 = ImpostorMinigame(
                     game_id="A4_ImpostorGeneroCarrera",
                     game_title=ts.translate('A4_game2_title', "El Intruso de Género"),
                     data=game_data_impostor,
-                    item_col='item',
-                    category_col='category',
-                    exclude_if_contains=False,
                     content_callback=render_part2,
-                    min_score_for_victory=25
+                    min_score_for_victory=25,
+                    **game_options("A4_ImpostorGeneroCarrera")
                 )
                 impostor_game_A4.render()
             else:
@@ -709,9 +668,8 @@ def A5(df_main, df_ins, game_controller: GameController, ts:Translator, **kwargs
             st.subheader(ts.translate('A5_game2_subheader', "Adivina la Exclusividad"))
             st.markdown(ts.translate('A5_game2_intro', "Algunas carreras se imparten en todo el país, mientras que otras son verdaderas rarezas. ¿Qué tan exclusiva crees que es la siguiente carrera?"))
             
-            if df_oferta is not None and not df_oferta.empty:
-                game_data_estimator = df_oferta.rename(columns={'carrera': 'name', 'Num_Universidades_Ofertan': 'value'})
-                
+            game_data_estimator = build_game_data("A5_EstimatorExclusividad", df_main, df_ins, ts)
+            if game_data_estimator is not None:
                 estimator_game_A5 = EstimatorMinigame(
                     game_id="A5_EstimatorExclusividad",
                     game_title=ts.translate('A5_game2_title', "El Estimador de Exclusividad"),
@@ -816,16 +774,16 @@ def A5(df_main, df_ins, game_controller: GameController, ts:Translator, **kwargs
         st.subheader(ts.translate('A5_game1_subheader', "GeoGuesser Universitario"))
         st.markdown(ts.translate('A5_game1_intro', "Antes de analizar las universidades en detalle, ¿conoces su ubicación? ¡Demuéstralo!"))
         
-        if df_ins is not None and not df_ins.empty:
-            game_data_geo = df_ins[['nombre_institucion', 'provincia']].dropna()
-            
+        game_data_geo = build_game_data("A5_GeoGuesserUbicacion", df_main, df_ins, ts)
+        if game_data_geo is not None:
             GeoGuesserMinigame(
                 game_id="A5_GeoGuesserUbicacion",
                 game_title=ts.translate('A5_game1_title', "Adivina la Provincia"),
                 data=game_data_geo,
                 content_callback=render_part1,
                 num_rounds=2,
-                min_score_for_victory=40
+                min_score_for_victory=40,
+                **game_options("A5_GeoGuesserUbicacion")
             ).render()
         else:
             render_part1()
@@ -966,14 +924,8 @@ def A6(df_main, game_controller: GameController, ts:Translator, **kwargs):
         ¿qué crees que ocurrió en el último año registrado? ¿Continuó la tendencia, se estabilizó o se revirtió?
         """))
         
-        df_hist_juego, _, _, _ = analisis_A1(df_main)
-        if df_hist_juego is not None and len(df_hist_juego) >= 2:
-            game_data_oracle = pd.DataFrame([{
-                "name": ts.translate('A6_game_item_name', "Matrícula Nacional"),
-                "x": df_hist_juego['ano_inicio_curso'].tolist(),
-                "y": df_hist_juego['matricula_total'].tolist()
-            }])
-
+        game_data_oracle = build_game_data("A6_OracleNacional", df_main, None, ts)
+        if game_data_oracle is not None:
             OracleMinigame(
                 game_id="A6_OracleNacional",
                 game_title=ts.translate('A6_game_title', "Predice la Tendencia Nacional"),
@@ -1120,34 +1072,15 @@ def A7(df_main, game_controller: GameController, ts:Translator, **kwargs):
         Entre las múltiples ofertas académicas de las universidades, algunas prosperan con cientos de estudiantes, mientras que otras luchan por mantenerse a flote. A continuación, te presentamos cuatro ofertas universitarias. Tres de ellas tienen una matrícula saludable, pero una es un "foco de atención" con una matrícula críticamente baja. ¿Puedes identificar al intruso?
         """))
 
-        _, _, df_baja_game, umbral_game, status_game = analisis_A7(df_main)
-        
-        if status_game == 'success' and df_baja_game is not None and not df_baja_game.empty:
-            ano_reciente = int(df_main['ano_inicio_curso'].max())
-            df_reciente_game = df_main[df_main['ano_inicio_curso'] == ano_reciente]
-            
-            impostor = df_baja_game.sample(1).copy()
-            impostor['category'] = 'Baja Matrícula'
-            impostor['item'] = impostor['university'] + ' - ' + impostor['career']
-            
-            df_saludable = df_reciente_game[df_reciente_game['matricula_total'] >= 50].sample(3)
-            df_saludable['category'] = 'Matrícula Saludable'
-            df_saludable['item'] = df_saludable['entidad'] + ' - ' + df_saludable['carrera']
-            
-            game_data = pd.concat([
-                impostor[['item', 'category']],
-                df_saludable[['item', 'category']]
-            ])
-            
+        game_data = build_game_data("A7_ImpostorMatriculaBaja", df_main, None, ts)
+        if game_data is not None:
             impostor_game_A7 = ImpostorMinigame(
                 game_id="A7_ImpostorMatriculaBaja",
                 game_title=ts.translate('A7_game_title', "El Intruso de Matrícula Baja"),
                 data=game_data,
-                item_col='item',
-                category_col='category',
-                exclude_if_contains=False,
                 content_callback=render_content,
-                min_score_for_victory=25
+                min_score_for_victory=25,
+                **game_options("A7_ImpostorMatriculaBaja")
             )
             impostor_game_A7.render()
         else:
@@ -1324,6 +1257,12 @@ def B2(df_main, df_ins, game_controller: GameController, ts:Translator, **kwargs
         "Mostrando {shown} de {total} institución(es) ({last_year})."
     ).format(shown=n_mostradas, total=n_totales, last_year=curso_reciente_str_basic))
 
+    if {'lat', 'lon'} <= set(df_ins.columns):
+        df_mapa = df_ins.loc[df_ins['nombre_institucion'].isin(df_guia_filtrado_nombre['nombre_institucion']), ['lat', 'lon']].dropna()
+        if not df_mapa.empty:
+            st.map(df_mapa, latitude='lat', longitude='lon', size=3000)
+            st.caption(ts.translate('b2_map_caption', "Ubicación de las instituciones mostradas ({located} de {shown} con coordenadas).").format(located=len(df_mapa), shown=n_mostradas))
+
     anos_disponibles_matricula = sorted(df_main['ano_inicio_curso'].unique().tolist())
     if not anos_disponibles_matricula:
         st.warning(ts.translate('b2_warning_no_years_for_detail', "No hay años de matrícula disponibles para ver detalles."))
@@ -1392,6 +1331,70 @@ def B2(df_main, df_ins, game_controller: GameController, ts:Translator, **kwargs
         translation=ts.translate('ask_ai_component', {})
     )
 
+### B3: Consulta la Base de Datos
+@st.fragment
+def B3(game_controller: GameController, ts:Translator, **kwargs):
+    st.header(ts.translate('b3_header', "🗄️ Playground: Consulta la Base de Datos"))
+    st.markdown(ts.translate('b3_intro', """
+    Pregunta lo que quieras sobre los datos de matrícula e instituciones. El asistente traduce tu pregunta a una
+    consulta SQL que se ejecuta directamente sobre la base de datos; también puedes escribir o editar el SQL tú mismo.
+    """))
+
+    with st.expander(ts.translate('b3_schema_expander', "📋 Tablas y columnas disponibles")):
+        for table_name, n_rows, columns in table_schema():
+            st.markdown(f"**`{table_name}`** ({ts.translate('b3_rows', '{rows} filas').format(rows=n_rows)})")
+            st.caption(", ".join(f"`{column}` {column_type}" for column, column_type in columns))
+
+    with st.form("b3_question_form"):
+        question = st.text_area(
+            ts.translate('b3_question_label', "Tu pregunta:"),
+            placeholder=ts.translate('b3_question_placeholder', "Ej.: ¿Cuáles son las 10 carreras con más matrícula en 2024?"),
+            key="b3_question"
+        )
+        ask = st.form_submit_button(ts.translate('b3_generate_button', "🪄 Generar consulta"), type="primary")
+    if ask and question.strip():
+        with st.spinner(ts.translate('b3_spinner_sql', "Traduciendo tu pregunta a SQL...")):
+            try:
+                sql = question_to_sql(question.strip())
+            except QueryError as e:
+                sql = None
+                st.warning(ts.translate('b3_error_ai', "El asistente no está disponible: {error}").format(error=e))
+        if sql:
+            st.session_state["b3_sql_editor"] = sql
+            st.session_state["b3_run_sql"] = sql
+            st.session_state["b3_run_question"] = question.strip()
+        else:
+            st.warning(ts.translate('b3_error_no_sql', "No se pudo obtener una consulta SQL válida para esa pregunta. Prueba a reformularla o escribe el SQL directamente."))
+
+    sql_text = st.text_area(ts.translate('b3_sql_label', "Consulta SQL (solo SELECT):"), key="b3_sql_editor", height=140)
+    if st.button(ts.translate('b3_run_button', "▶️ Ejecutar SQL"), key="b3_run_button"):
+        st.session_state["b3_run_sql"] = sql_text
+        st.session_state["b3_run_question"] = None
+
+    sql_to_run = st.session_state.get("b3_run_sql")
+    if not sql_to_run: return
+    st.markdown("---")
+    normalized = normalize_sql(sql_to_run)
+    try:
+        with st.spinner(ts.translate('b3_spinner_query', "Ejecutando consulta...")):
+            df_result, truncated, elapsed = run_playground_query(normalized)
+    except QueryError as e:
+        st.error(ts.translate('b3_error_query', "No se pudo ejecutar la consulta: {error}").format(error=e))
+        return
+
+    st.dataframe(df_result, use_container_width=True, hide_index=True)
+    st.caption(ts.translate('b3_result_caption', "{rows} filas · {ms} ms").format(rows=len(df_result), ms=round(elapsed * 1000, 1)))
+    if truncated:
+        st.info(ts.translate('b3_truncated', "Se muestran solo las primeras {limit} filas.").format(limit=len(df_result)))
+
+    asked = st.session_state.get("b3_run_question")
+    if asked and not df_result.empty:
+        with st.spinner(ts.translate('b3_spinner_explain', "Interpretando el resultado...")):
+            try:
+                st.markdown(explain_result(asked, normalized, ts.actual_lang))
+            except QueryError as e:
+                st.warning(ts.translate('b3_error_ai', "El asistente no está disponible: {error}").format(error=e))
+
 ### Conclusiones
 @st.fragment
 def conclusion(game_controller: GameController, ts:Translator, **kwargs):
@@ -1432,20 +1435,14 @@ def conclusion(game_controller: GameController, ts:Translator, **kwargs):
     st.markdown(hallazgos_text)
     
     if game_controller.game_mode:
-        played_games = [g for g in game_controller.registered_games.values() if g.is_finished()]
+        counters = game_controller.counters
         
-        if played_games:
+        if counters.games_finished:
             st.markdown("---")
             st.header(ts.translate('conclusion_player_summary_header', "🏆 Resumen de tu Aventura como Explorador"))
             
-            total_score = sum(g.get_result()[0] for g in played_games)
-            
-            game_types_scores = {}
-            for game in played_games:
-                type_name = game.__class__.__name__
-                game_types_scores[type_name] = game_types_scores.get(type_name, 0) + game.get_result()[0]
-            
-            best_game_type = max(game_types_scores, key=game_types_scores.get) if game_types_scores else "N/A" #type:ignore
+            total_score = counters.total_score
+            best_game_type = counters.best_game_type() or "N/A"
             
             profiles = {
                 'ClassifierMinigame': ("profile_strategist", "🥇", "profile_strategist_desc"),
@@ -1463,7 +1460,7 @@ def conclusion(game_controller: GameController, ts:Translator, **kwargs):
 
             col1, col2, col3 = st.columns(3)
             col1.metric(label=ts.translate('metric_total_score', "Puntuación Final"), value=f"{total_score} pts")
-            col2.metric(label=ts.translate('metric_games_played', "Juegos Completados"), value=len(played_games))
+            col2.metric(label=ts.translate('metric_games_played', "Juegos Completados"), value=counters.games_finished)
             col3.metric(label=ts.translate('metric_analyst_profile', "Perfil de Analista"), value=profile_name, help=profile_desc)
 
             st.success(f"**¡Felicidades, {profile_name}!** {profile_desc} Tu puntuación total refleja tu excelente desempeño.", icon=profile_icon)
@@ -1471,32 +1468,31 @@ def conclusion(game_controller: GameController, ts:Translator, **kwargs):
             st.subheader(ts.translate('leaderboard_header', "Ranking Global de Exploradores"))
             st.markdown(ts.translate('leaderboard_intro', "Compite con otros analistas y deja tu marca en el ranking. ¿Estarás entre los mejores?"))
             
-            gsheet_client = connect_to_gsheet()
+            session_key_submitted = f"score_submitted_{game_controller.game_mode}"
+            if session_key_submitted not in st.session_state:
+                st.session_state[session_key_submitted] = False
+
+            if not st.session_state[session_key_submitted]:
+                with st.form("leaderboard_form", border=True):
+                    player_name = st.text_input(ts.translate('player_name_label', "Tu nombre para el ranking:"), max_chars=20)
+                    submitted = st.form_submit_button(ts.translate('submit_score_button', "🚀 ¡Enviar mi puntuación!"), type="primary", use_container_width=True)
+                    
+                    if submitted:
+                        if player_name.strip():
+                            success = submit_score(player_name.strip(), total_score)
+                            if success:
+                                st.session_state[session_key_submitted] = True
+                                st.balloons()
+                                st.rerun()
+                        else:
+                            st.warning(ts.translate('enter_name_warning', "Por favor, introduce un nombre."))
+            else:
+                st.info(ts.translate('score_submitted_info', "¡Tu puntuación ya ha sido enviada! Gracias por participar."))
             
-            if gsheet_client:
-                session_key_submitted = f"score_submitted_{game_controller.game_mode}"
-                if session_key_submitted not in st.session_state:
-                    st.session_state[session_key_submitted] = False
-
-                if not st.session_state[session_key_submitted]:
-                    with st.form("leaderboard_form", border=True):
-                        player_name = st.text_input(ts.translate('player_name_label', "Tu nombre para el ranking:"), max_chars=20)
-                        submitted = st.form_submit_button(ts.translate('submit_score_button', "🚀 ¡Enviar mi puntuación!"), type="primary", use_container_width=True)
-                        
-                        if submitted:
-                            if player_name.strip():
-                                success = submit_score(player_name.strip(), total_score)
-                                if success:
-                                    st.session_state[session_key_submitted] = True
-                                    st.balloons()
-                                    st.rerun()
-                            else:
-                                st.warning(ts.translate('enter_name_warning', "Por favor, introduce un nombre."))
-                else:
-                    st.info(ts.translate('score_submitted_info', "¡Tu puntuación ya ha sido enviada! Gracias por participar."))
-                
-                with st.spinner(ts.translate('loading_leaderboard_spinner', "Cargando el ranking...")):
-                    leaderboard_df = get_leaderboard()
+            tab_week, tab_all = st.tabs([ts.translate('leaderboard_tab_week', "Esta semana"), ts.translate('leaderboard_tab_all_time', "Histórico")])
+            for tab, period in ((tab_week, "week"), (tab_all, "all")):
+                with tab:
+                    leaderboard_df = get_leaderboard(period)
                     if not leaderboard_df.empty:
                         leaderboard_df.index = leaderboard_df.index + 1
                         st.dataframe(leaderboard_df.rename(columns={
@@ -1506,8 +1502,6 @@ def conclusion(game_controller: GameController, ts:Translator, **kwargs):
                         }), use_container_width=True)
                     else:
                         st.caption(ts.translate('leaderboard_empty_caption', "El ranking está vacío. ¡Sé el primero en aparecer!"))
-            else:
-                st.warning(ts.translate('leaderboard_connection_warning', "No se pudo conectar al servicio de ranking. La funcionalidad no está disponible en este momento."))
     
     st.markdown("---")
     st.subheader(ts.translate(
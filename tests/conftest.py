@@ -0,0 +1,13 @@
+"""
+Configuración común de las pruebas: la raíz del repositorio en `sys.path` (como hacen los scripts de tools/)
+y los almacenes locales (SQLite, imágenes) en un directorio temporal para no tocar los de la app.
+
+Uso:
+    python -m pytest -q
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("LOCAL_STORE_DIR", tempfile.mkdtemp(prefix="pytest-store-"))
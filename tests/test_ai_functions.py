@@ -0,0 +1,44 @@
+import io
+import base64
+import pandas as pd
+import pyarrow as pa
+import pytest
+from libraries.ai_functions import _try_parse_string_to_df, decode_table_block
+
+FRAME = pd.DataFrame({"provincia": ["La Habana", "Matanzas", "Holguín"], "matricula": [1200, 340, 785], "tasa": [0.5, 0.25, 0.125]})
+
+def to_arrow_b64(df: pd.DataFrame, stream: bool) -> str:
+    table, sink = pa.Table.from_pandas(df, preserve_index=False), pa.BufferOutputStream()
+    with (pa.ipc.new_stream if stream else pa.ipc.new_file)(sink, table.schema) as writer: writer.write_table(table)
+    return base64.b64encode(sink.getvalue().to_pybytes()).decode()
+
+def to_parquet_b64(df: pd.DataFrame) -> str:
+    buffer = io.BytesIO()
+    df.to_parquet(buffer, index=False)
+    return base64.b64encode(buffer.getvalue()).decode()
+
+@pytest.mark.parametrize("block_type, payload", [
+    ("table-json", FRAME.to_json(orient="split", index=False, date_format="iso", force_ascii=False)),
+    ("parquet-b64", to_parquet_b64(FRAME)),
+    ("arrow-b64", to_arrow_b64(FRAME, stream=False)),
+    ("arrow-b64", to_arrow_b64(FRAME, stream=True)),
+])
+def test_table_blocks_round_trip(block_type, payload):
+    pd.testing.assert_frame_equal(decode_table_block(block_type, f"\n{payload}\n"), FRAME)
+
+def test_malformed_blocks_fall_back_to_the_legacy_parser():
+    # Un modelo que imprime la tabla como texto dentro de ```table-json``` sigue viendo su tabla.
+    printed = FRAME.to_string(index=False)
+    pd.testing.assert_frame_equal(decode_table_block("table-json", printed), _try_parse_string_to_df(printed))
+    assert decode_table_block("table-json", printed).shape == FRAME.shape
+    assert decode_table_block("dataframe", printed).shape == FRAME.shape
+
+@pytest.mark.parametrize("block_type, payload", [
+    ("table-json", '{"columns": ["a"], "data": [[1]'),
+    ("parquet-b64", "no es base64 ¡!"),
+    ("parquet-b64", base64.b64encode(b"PAR1 truncado").decode()),
+    ("arrow-b64", base64.b64encode(b"ARROW1 truncado").decode()),
+    ("table", ""),
+])
+def test_unreadable_blocks_return_none_instead_of_raising(block_type, payload):
+    assert decode_table_block(block_type, payload) is None
@@ -0,0 +1,65 @@
+from google.genai import types
+from libraries.ai_backends import EXECUTION_FEEDBACK_PREFIX, StubBackend
+from libraries.ai_history import SUMMARY_ACK, SUMMARY_PREFIX, CompactingChat, HistoryCompactor, estimate_tokens, split_turns
+
+def message(role: str, text: str) -> types.Content:
+    return types.Content(role=role, parts=[types.Part(text=text)])
+
+def conversation(turns: int, words: int = 100) -> list[types.Content]:
+    """`turns` preguntas con su respuesta; la segunda incluye la realimentación de una ejecución local."""
+    history = []
+    for i in range(turns):
+        history += [message("user", f"Pregunta {i}: " + "matrícula " * words), message("model", f"Respuesta {i}: " + "dato " * words)]
+        if i == 1: history += [message("user", f"{EXECUTION_FEEDBACK_PREFIX}\nfilas: 10"), message("model", "Interpretación.")]
+    return history
+
+def test_split_turns_keeps_execution_feedback_in_its_turn():
+    turns = split_turns(conversation(4))
+    assert [len(turn) for turn in turns] == [2, 4, 2, 2]
+    assert all(turn[0].parts[0].text.startswith(f"Pregunta {i}") for i, turn in enumerate(turns))
+
+def test_history_under_budget_is_left_unchanged():
+    history = conversation(4)
+    assert HistoryCompactor(budget_tokens=estimate_tokens(history)).compact(history) is None
+    # Por encima del presupuesto, pero sin turnos anteriores a los que se conservan: tampoco hay nada que resumir.
+    assert HistoryCompactor(budget_tokens=10, keep_turns=4).compact(history) is None
+
+def test_history_over_budget_becomes_summary_plus_tail():
+    history = conversation(6)
+    compacted = HistoryCompactor(budget_tokens=500, keep_turns=2).compact(history)
+    assert compacted[0].role == "user" and compacted[0].parts[0].text.startswith(SUMMARY_PREFIX)
+    assert "Respuesta 3" in compacted[0].parts[0].text and "Pregunta 4" not in compacted[0].parts[0].text
+    assert compacted[1].parts[0].text == SUMMARY_ACK
+    assert compacted[2:] == history[-4:]
+    assert estimate_tokens(compacted) < estimate_tokens(history)
+
+def test_rolling_summary_reuses_the_previous_one_and_the_summarizer():
+    transcripts = []
+    def summarize(text: str) -> str:
+        transcripts.append(text)
+        return f"resumen {len(transcripts)}"
+    compactor = HistoryCompactor(budget_tokens=300, keep_turns=1, summarize=summarize)
+    first = compactor.compact(conversation(3))
+    second = compactor.compact(first + conversation(2)[:2])
+    assert first[0].parts[0].text == f"{SUMMARY_PREFIX}\nresumen 1"
+    assert second[0].parts[0].text == f"{SUMMARY_PREFIX}\nresumen 2"
+    assert transcripts[1].startswith("resumen 1")
+    # Si el resumidor falla, se usa el resumen extractivo, recortado por el principio para que quepa en el presupuesto.
+    fallback = HistoryCompactor(budget_tokens=300, keep_turns=1, summarize=lambda text: 1 / 0).compact(conversation(3))
+    assert "Respuesta 1" in fallback[0].parts[0].text and len(fallback[0].parts[0].text) < 400
+
+def test_compacting_chat_recreates_the_chat_with_the_compacted_history():
+    backend = StubBackend(text_chunks=50)
+    created = []
+    def create_chat(history):
+        created.append(history)
+        return backend.create_chat(system_instruction="", history=history)
+    chat = CompactingChat(create_chat, conversation(3), HistoryCompactor(budget_tokens=500, keep_turns=1))
+    for prompt in ("¿Cuántos estudiantes?", "¿Y por provincia?"):
+        list(chat.send_message_stream(prompt))
+        full = chat.history_tokens()
+        assert chat.compact()
+        assert chat.history_tokens() < full
+    assert len(created) == 3 and chat.compactions == 2
+    assert chat.get_history()[-1].role == "model" and chat.get_history()[-2].parts[0].text == "¿Y por provincia?"
+    assert chat.saved_tokens > 0
@@ -0,0 +1,57 @@
+import pandas as pd
+import plotly.graph_objects as go
+from google.genai import types
+from libraries.ai_response_cache import ResponseCache, normalize_prompt
+
+HISTORY = [types.Content(role="user", parts=[types.Part(text="¿Cuál fue el pico?")]), types.Content(role="model", parts=[types.Part(text="2020")])]
+
+def test_normalize_prompt():
+    assert normalize_prompt("  ¿Explica  este GRÁFICO, por favor? ") == "explica este grafico por favor"
+
+def test_exact_hit_ignores_case_accents_and_punctuation():
+    cache = ResponseCache()
+    cache.put("a1", "ctx", "es", "Explica este gráfico", [("text", "Respuesta", None)], HISTORY)
+    entry = cache.get("a1", "ctx", "es", "¡explica este grafico!")
+    assert entry is not None and entry.chunks == [("text", "Respuesta", None)]
+    assert entry.history_contents() == HISTORY
+    assert cache.get("a1", "otro-contexto", "es", "Explica este gráfico") is None
+    assert cache.get("a1", "ctx", "en", "Explica este gráfico") is None
+    assert cache.summary()["hits"] == 1 and cache.summary()["misses"] == 2
+
+def test_similar_hit_only_above_threshold():
+    cache = ResponseCache(similarity_threshold=0.6)
+    cache.put("a1", "ctx", "es", "Explica este gráfico", [("text", "Respuesta", None)], HISTORY)
+    assert cache.get("a1", "ctx", "es", "Explica este gráfico por favor") is not None
+    assert cache.get("a1", "ctx", "es", "¿Qué provincia tiene más estudiantes?") is None
+    assert cache.summary()["similar_hits"] == 1
+
+def test_entry_lookup_by_key_does_not_count_a_hit():
+    cache = ResponseCache()
+    cache.put("a1", "ctx", "es", "pregunta", [("text", "Respuesta", None)], HISTORY)
+    key = cache.make_key("a1", "ctx", "es", "pregunta")
+    assert cache.entry(key).key == key
+    assert cache.entry("desconocida") is None
+    assert cache.summary()["hits"] == 0
+
+def test_size_includes_tables_and_figures():
+    cache = ResponseCache()
+    df = pd.DataFrame({"a": range(10_000)})
+    figure = go.Figure(go.Bar(y=list(range(1000))))
+    cache.put("a1", "ctx", "es", "tabla", [("dataframe", df, None)], [])
+    cache.put("a1", "ctx", "es", "figura", [("figure", figure, None)], [])
+    assert cache.entry(cache.make_key("a1", "ctx", "es", "tabla")).size >= df.memory_usage(deep=True).sum()
+    assert cache.entry(cache.make_key("a1", "ctx", "es", "figura")).size >= len(figure.to_json())
+
+def test_evicts_least_recently_used_by_count_and_bytes():
+    cache = ResponseCache(max_entries=2)
+    for prompt in ("uno", "dos"): cache.put("a1", "ctx", "es", prompt, [("text", prompt, None)], [])
+    cache.get("a1", "ctx", "es", "uno")
+    cache.put("a1", "ctx", "es", "tres", [("text", "tres", None)], [])
+    assert cache.get("a1", "ctx", "es", "dos") is None
+    assert cache.get("a1", "ctx", "es", "uno") is not None
+    small = ResponseCache(max_bytes=1000)
+    small.put("a1", "ctx", "es", "imagen", [("image", b"x" * 600, "image/png")], [])
+    small.put("a1", "ctx", "es", "otra", [("image", b"x" * 600, "image/png")], [])
+    small.put("a1", "ctx", "es", "enorme", [("image", b"x" * 2000, "image/png")], [])
+    assert small.summary()["entries"] == 1 and small.summary()["bytes"] <= 1000
+    assert small.get("a1", "ctx", "es", "otra") is not None
@@ -0,0 +1,68 @@
+import sys
+import pandas as pd
+import pytest
+from libraries.ai_sandbox import SandboxPool, write_arrow_dataset
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="SandboxPool solo funciona en POSIX")
+
+@pytest.fixture(scope="module")
+def datasets(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("sandbox") / "df_main.arrow")
+    write_arrow_dataset(pd.DataFrame({"provincia": ["La Habana", "La Habana", "Holguín"], "matricula": [10, 20, 5]}), path)
+    return {"df_main": path}
+
+@pytest.fixture(scope="module")
+def pool(datasets):
+    # user=None: las pruebas no dependen de que el usuario sin privilegios pueda leer el intérprete.
+    pool = SandboxPool(datasets, workers=1, timeout_s=20, user=None)
+    yield pool
+    pool.close()
+
+def test_show_returns_tables_and_prints(pool):
+    result = pool.run("show(df_main.groupby('provincia')['matricula'].sum(), 'Matrícula')\nprint(len(df_main))")
+    assert result.error is None
+    assert result.stdout == "3\n"
+    title, table = result.tables[0]
+    assert title == "Matrícula"
+    assert table.values.tolist() == [["Holguín", 5], ["La Habana", 30]]
+
+def test_the_data_cannot_be_modified_between_runs(pool):
+    assert pool.run("df_main['matricula'] = 0").error is None
+    assert pool.run("print(df_main['matricula'].sum())").stdout == "35\n"
+
+def test_imports_outside_the_allow_list_and_open_are_blocked(pool):
+    assert "Módulo no permitido" in pool.run("import os").error
+    assert pool.run("import subprocess").error.startswith("ImportError")
+    assert pool.run("open('/etc/passwd')").error.startswith("NameError")
+    assert pool.run("import numpy as np\nprint(np.arange(3).sum())").stdout == "3\n"
+
+def test_the_worker_gets_a_scrubbed_environment(pool):
+    result = pool.run("print(sorted(pd.io.common.os.environ))")
+    assert result.stdout.strip() == str(sorted(["HOME", "LC_ALL", "MPLCONFIGDIR", "PATH", "TMPDIR"]))
+
+def test_timeout_replaces_the_worker(datasets):
+    pool = SandboxPool(datasets, workers=1, timeout_s=1, cpu_s=30, user=None, startup_timeout_s=60)
+    try:
+        assert pool.run("print('listo')").stdout == "listo\n"
+        result = pool.run("while True: pass")
+        assert result.error.startswith("Tiempo de ejecución agotado")
+        assert pool.summary()["timeouts"] == 1 and pool.summary()["respawns"] == 1
+        assert pool.run("print('de nuevo')").stdout == "de nuevo\n"
+        assert pool.summary()["workers"] == 1
+    finally:
+        pool.close()
+
+def test_a_failed_replacement_does_not_requeue_the_dead_worker(datasets, monkeypatch):
+    pool = SandboxPool(datasets, workers=1, timeout_s=1, cpu_s=30, user=None, startup_timeout_s=60)
+    try:
+        pool.run("pass")
+        dead = pool._workers[0]
+        def fail():
+            raise OSError("sin procesos")
+        monkeypatch.setattr(pool, "_spawn", fail)
+        with pytest.raises(OSError):
+            pool.run("while True: pass")
+        assert dead.process.poll() is not None
+        assert pool.summary()["idle"] == 0 and pool.summary()["workers"] == 0
+    finally:
+        pool.close()
@@ -0,0 +1,136 @@
+"""
+Planificador de peticiones a la IA (libraries/ai_scheduler.py) contra un backend falso: una clase entera preguntando
+a la vez, con latencia por fragmento y errores de cuota (429) antes del primer fragmento.
+"""
+import time
+import random
+import threading
+import pytest
+from libraries.ai_scheduler import RateLimitError, RequestCancelled, RequestScheduler, is_rate_limit_error
+
+class FakeBackend:
+    """Devuelve `chunks` fragmentos con `chunk_delay` segundos entre ellos; falla con 429 con probabilidad `rate_limit`."""
+    def __init__(self, chunks: int = 5, chunk_delay: float = 0.01, rate_limit: float = 0.0, seed: int = 0):
+        self.chunks = chunks
+        self.chunk_delay = chunk_delay
+        self.rate_limit = rate_limit
+        self.rng = random.Random(seed)
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.start_order: list[str] = []
+        self._lock = threading.Lock()
+
+    def stream(self, prompt: str, chunk_delay: float | None = None):
+        with self._lock:
+            if prompt not in self.start_order: self.start_order.append(prompt)
+            fail = self.rng.random() < self.rate_limit
+        if fail: raise RateLimitError("429 RESOURCE_EXHAUSTED (simulado)")
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            for i in range(self.chunks):
+                time.sleep(self.chunk_delay if chunk_delay is None else chunk_delay)
+                yield f"{prompt}:{i}"
+        finally:
+            with self._lock: self.in_flight -= 1
+
+def scheduler(max_concurrent: int = 4) -> RequestScheduler:
+    return RequestScheduler(max_concurrent=max_concurrent, max_retries=10, base_delay=0.01, max_delay=0.05, poll_interval=0.05)
+
+def test_rate_limit_errors_are_recognised():
+    assert is_rate_limit_error(RateLimitError())
+    assert is_rate_limit_error(Exception("429 RESOURCE_EXHAUSTED"))
+    assert not is_rate_limit_error(ValueError("otro error"))
+
+def test_a_class_asking_at_once_respects_the_limit_and_takes_turns():
+    max_concurrent, sessions, greedy_requests = 4, 40, 5
+    backend = FakeBackend(rate_limit=0.2)
+    planner = scheduler(max_concurrent)
+    completed, failures, positions = [], [], {}
+    lock = threading.Lock()
+
+    def ask(session_id: str, prompt: str, chunk_delay: float | None = None):
+        try:
+            received = list(planner.stream(session_id, lambda: backend.stream(prompt, chunk_delay), on_wait=lambda p: positions.setdefault(prompt, []).append(p)))
+            if len(received) != backend.chunks: failures.append(f"{prompt}: {len(received)} fragmentos")
+            with lock: completed.append(session_id)
+        except Exception as e:
+            failures.append(f"{prompt}: {e!r}")
+
+    # Los huecos empiezan ocupados, luego encola la sesión insistente (s0) y después el resto de la clase.
+    blockers = [threading.Thread(target=ask, args=(f"b{i}", f"b{i}-q0", 0.05)) for i in range(max_concurrent)]
+    greedy = [threading.Thread(target=ask, args=("s0", f"s0-q{i}")) for i in range(greedy_requests)]
+    others = [threading.Thread(target=ask, args=(f"s{i}", f"s{i}-q0")) for i in range(1, sessions)]
+    for group in (blockers, greedy, others):
+        for t in group: t.start()
+        time.sleep(0.02)
+    for t in blockers + greedy + others: t.join()
+
+    summary = planner.summary()
+    order = [p for p in backend.start_order if not p.startswith("b")]
+    greedy_starts = [i for i, p in enumerate(order) if p.startswith("s0-")]
+    assert not failures
+    assert len(completed) == len(blockers + greedy + others)
+    assert backend.max_in_flight <= max_concurrent and summary["max_active"] <= max_concurrent
+    assert summary["retries"] > 0
+    assert summary["active"] == 0 and summary["queued_now"] == 0
+    assert greedy_starts[1] > 1
+    assert any(positions.values())
+
+def test_rate_limit_is_raised_after_max_retries():
+    planner = RequestScheduler(max_concurrent=1, max_retries=2, sleep=lambda s: None)
+    def failing():
+        raise RateLimitError("429")
+        yield
+    with pytest.raises(RateLimitError):
+        list(planner.stream("s1", failing))
+    assert planner.summary()["retries"] == 2 and planner.active() == 0
+
+def test_cancelled_request_leaves_the_queue():
+    planner = scheduler(max_concurrent=1)
+    ticket = planner.acquire("s1")
+    cancel = threading.Event()
+    cancel.set()
+    with pytest.raises(RequestCancelled):
+        list(planner.stream("s2", lambda: ["x"], cancel_event=cancel))
+    assert planner.queue_length() == 0
+    planner.release(ticket)
+    assert planner.active() == 0
+
+def test_closing_the_stream_releases_the_slot():
+    planner = scheduler(max_concurrent=1)
+    stream = planner.stream("s1", lambda: FakeBackend(chunks=3, chunk_delay=0).stream("q"))
+    assert next(stream) == "q:0"
+    assert planner.active() == 1
+    stream.close()
+    assert planner.active() == 0
+
+def test_the_slot_is_free_during_the_backoff():
+    planner = RequestScheduler(max_concurrent=1, max_retries=1, base_delay=0.5, max_delay=0.5, poll_interval=0.01)
+    attempts = []
+    def limited():
+        attempts.append(time.perf_counter())
+        if len(attempts) == 1: raise RateLimitError("429")
+        yield "ok"
+    slow = threading.Thread(target=lambda: list(planner.stream("s1", limited)))
+    slow.start()
+    time.sleep(0.1)
+    start = time.perf_counter()
+    assert list(planner.stream("s2", lambda: ["rápida"])) == ["rápida"]
+    assert time.perf_counter() - start < 0.3
+    slow.join()
+    assert len(attempts) == 2 and planner.active() == 0
+
+def test_cancelling_during_the_backoff_stops_at_once():
+    planner = RequestScheduler(max_concurrent=1, max_retries=3, base_delay=5, max_delay=5)
+    cancel = threading.Event()
+    def limited():
+        raise RateLimitError("429")
+        yield
+    threading.Timer(0.1, cancel.set).start()
+    start = time.perf_counter()
+    with pytest.raises(RequestCancelled):
+        list(planner.stream("s1", limited, cancel_event=cancel))
+    assert time.perf_counter() - start < 1
+    assert planner.active() == 0 and planner.queue_length() == 0
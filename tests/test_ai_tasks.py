@@ -0,0 +1,32 @@
+import threading
+from libraries.ai_tasks import AITaskRegistry
+
+def stub_produce(release: threading.Event):
+    """Respuesta simulada: un fragmento de texto cada 10 ms hasta que `release` se activa o la tarea se cancela."""
+    def produce(task):
+        while not release.is_set():
+            yield ("text", "respuesta ", None)
+            task.cancel_event.wait(0.01)
+        yield ("text", "fin", None)
+    return produce
+
+def test_cancel_stale_stops_only_the_tasks_of_other_sections():
+    registry, release = AITaskRegistry(), threading.Event()
+    left = registry.start("s1", "chat_inicio", "Inicio", "¿Cuántos estudiantes?", stub_produce(release))
+    current = registry.start("s1", "chat_geo", "Geografía", "¿Y por provincia?", stub_produce(release))
+    other_session = registry.start("s2", "chat_inicio", "Inicio", "¿Cuántos estudiantes?", stub_produce(release))
+
+    assert registry.cancel_stale("s1", "Geografía") == [left]
+    assert left.wait(5) and left.status == "cancelled"
+    assert registry.get("s1", "chat_inicio") is None and registry.get("s1", "chat_geo") is current
+    assert not current.done and not other_session.done
+    assert registry.cancel_stale("s1", "Geografía") == []
+
+    # Los callbacks de la tarea se llaman después de anotar sus estadísticas en el registro.
+    recorded = [threading.Event() for _ in range(2)]
+    for task, event in zip((current, other_session), recorded): task.add_done_callback(lambda _, event=event: event.set())
+    release.set()
+    assert all(event.wait(5) for event in recorded)
+    assert current.status == other_session.status == "completed" and current.text().endswith("fin")
+    summary = registry.summary()
+    assert (summary["started"], summary["completed"], summary["cancelled"], summary["running"]) == (3, 2, 1, 0)
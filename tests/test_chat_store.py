@@ -0,0 +1,40 @@
+import time
+import pandas as pd
+from google.genai import types
+from libraries.chat_store import ChatStore
+
+def test_messages_round_trip_in_order(tmp_path):
+    store = ChatStore(str(tmp_path / "chats.sqlite3"))
+    df = pd.DataFrame({"Año": [2020, 2024], "Matrícula": [285000, 205000]})
+    store.append("s1", "a1", [{"role": "user", "content": "hola"}, {"role": "assistant", "content": {"type": "dataframe", "data": df}}])
+    store.append("s1", "a1", [{"role": "assistant", "content": {"type": "image", "data": b"png", "mime_type": "image/png"}}])
+    messages = store.load("s1", "a1")
+    assert store.count("s1", "a1") == 3
+    assert messages[0] == {"role": "user", "content": "hola"}
+    pd.testing.assert_frame_equal(messages[1]["content"]["data"], df)
+    assert messages[2]["content"] == {"type": "image", "data": b"png", "mime_type": "image/png"}
+    assert store.load("s1", "a1", offset=1, limit=1)[0]["content"]["type"] == "dataframe"
+    assert store.count("s2", "a1") == 0
+
+def test_image_references_keep_only_the_thumbnail(tmp_path):
+    store = ChatStore(str(tmp_path / "chats.sqlite3"))
+    content = {"type": "image", "ref": "abc", "mime_type": "image/png", "width": 800, "height": 600, "thumbnail": b"mini"}
+    store.append("s1", "a1", [{"role": "assistant", "content": content}])
+    assert store.load("s1", "a1")[0]["content"] == content
+
+def test_model_history_round_trip_and_clear(tmp_path):
+    store = ChatStore(str(tmp_path / "chats.sqlite3"))
+    history = [types.Content(role="user", parts=[types.Part(text="¿Pico?")]), types.Content(role="model", parts=[types.Part(text="2020")])]
+    store.save_context("s1", "a1", history)
+    assert store.load_context("s1", "a1") == history
+    store.clear("s1", "a1")
+    assert store.load_context("s1", "a1") is None
+
+def test_cleanup_drops_inactive_conversations(tmp_path):
+    store = ChatStore(str(tmp_path / "chats.sqlite3"), ttl_s=0.05)
+    store.append("s1", "a1", [{"role": "user", "content": "vieja"}])
+    time.sleep(0.1)
+    store.append("s2", "a1", [{"role": "user", "content": "nueva"}])
+    store.cleanup()
+    assert store.count("s1", "a1") == 0
+    assert store.count("s2", "a1") == 1
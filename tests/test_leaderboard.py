@@ -0,0 +1,153 @@
+"""
+Ranking local (libraries/leaderboard.py) contra una hoja de cálculo falsa: cola de envío en segundo plano a la hoja
+y top-K semanal e histórico mantenido de forma incremental.
+"""
+import time
+import random
+import sqlite3
+import threading
+import pytest
+from collections import Counter
+from datetime import datetime, timedelta
+from libraries.leaderboard import DEFAULT_SHEET, LeaderboardStore, TIMESTAMP_FORMAT, week_of
+from libraries.sheets import SheetHandles
+from tools.offline_stubs import FakeGSheetClient, FakeWorksheet
+
+class FlakyWorksheet(FakeWorksheet):
+    """Hoja falsa cuyo `append_rows` falla (sin escribir nada) con probabilidad `failure_rate`."""
+    def __init__(self, failure_rate: float = 0.0, seed: int = 0, **kwargs):
+        super().__init__(**kwargs)
+        self.failure_rate = failure_rate
+        self.rng = random.Random(seed)
+        self.failures = 0
+
+    def append_rows(self, values, **kwargs):
+        if self.rng.random() < self.failure_rate:
+            self.failures += 1
+            raise ConnectionError("503 Service Unavailable (simulado)")
+        super().append_rows(values, **kwargs)
+
+def history_rows(n: int, rng: random.Random) -> list[list]:
+    """`n` puntuaciones pares y distintas, con fechas de las últimas ocho semanas."""
+    now = datetime.now()
+    scores = rng.sample(range(0, 4 * n + 2, 2), n)
+    return [[(now - timedelta(seconds=rng.randrange(8 * 7 * 86400))).strftime(TIMESTAMP_FORMAT), f"Histórico {i}", s] for i, s in enumerate(scores)]
+
+def expected_top(rows: list[list], period: str, k: int) -> list[list]:
+    week = week_of(datetime.now().strftime(TIMESTAMP_FORMAT))
+    rows = [r for r in rows if period == "all" or week_of(r[0]) == week]
+    return sorted(rows, key=lambda r: -r[2])[:k]
+
+@pytest.fixture
+def open_store(tmp_path):
+    """Abre almacenes sobre `tmp_path/leaderboard.sqlite3` con la hoja dada; los cierra al terminar la prueba."""
+    stores = []
+    def open_store(sheet: FakeWorksheet, autostart: bool = False, **kwargs) -> LeaderboardStore:
+        client = FakeGSheetClient()
+        client.add(DEFAULT_SHEET, sheet)
+        sheets = SheetHandles(connect=lambda: client, max_retries=0, sleep=lambda s: None)
+        options = {"top_k": 5, "flush_interval_s": 0.02, "batch_size": 10, "max_backoff_s": 0.05, **kwargs}
+        store = LeaderboardStore(str(tmp_path / "leaderboard.sqlite3"), sheets, autostart=autostart, **options)
+        stores.append(store)
+        return store
+    yield open_store
+    for store in stores: store.stop(timeout=1)
+
+def drain(store: LeaderboardStore, attempts: int = 200):
+    """Importa y envía todo lo pendiente a mano, como el hilo en segundo plano, ignorando los fallos de la hoja."""
+    for _ in range(attempts):
+        try:
+            store.import_sheet(DEFAULT_SHEET)
+            while store.flush(): pass
+            return
+        except ConnectionError:
+            continue
+    raise AssertionError("la hoja no aceptó las puntuaciones")
+
+def test_submissions_reach_the_sheet_once_in_batches_despite_failures(open_store):
+    sheet = FlakyWorksheet(failure_rate=0.3)
+    store = open_store(sheet)
+    submitted = [store.submit(f"Jugador {i}", i) for i in range(45)]
+    assert sheet.calls["append_rows"] == 0
+    drain(store)
+    assert Counter(tuple(r) for r in sheet.rows) == Counter(tuple(r) for r in submitted)
+    assert sheet.calls["append_rows"] == 5 and sheet.failures > 0
+    assert store.pending() == [] and store.summary()["sent"] == 45
+
+def test_pending_scores_survive_a_restart(open_store):
+    sheet = FlakyWorksheet(failure_rate=1.0)
+    store = open_store(sheet)
+    rows = [store.submit("Ana", 10), store.submit("Luis", 20)]
+    with pytest.raises(ConnectionError): store.flush()
+    store.stop()
+    sheet.failure_rate = 0.0
+    reopened = open_store(sheet)
+    assert reopened.pending() == rows
+    drain(reopened)
+    assert sheet.rows == rows
+
+def test_background_thread_retries_until_delivered(open_store):
+    sheet = FlakyWorksheet(failure_rate=0.5, seed=1)
+    store = open_store(sheet, autostart=True)
+    rows = [store.submit(f"Jugador {i}", i) for i in range(25)]
+    deadline = time.time() + 10
+    while store.summary()["pending"] and time.time() < deadline:
+        store.wake(); time.sleep(0.02)
+    assert Counter(tuple(r) for r in sheet.rows) == Counter(tuple(r) for r in rows)
+    assert store.summary()["failures"] == sheet.failures
+
+def test_top_k_matches_a_full_sort_across_imports_submissions_and_restarts(open_store):
+    rng = random.Random(0)
+    sheet = FlakyWorksheet(failure_rate=0.3)
+    sheet.rows = history_rows(5000, rng)
+    history = [list(r) for r in sheet.rows]
+    store = open_store(sheet)
+    drain(store)
+    assert store.summary()["imported"] == 5000
+    first = store.submit("Primera", 4 * 5000 + 1)
+    assert store.top().values.tolist()[0] == first and store.top(period="week").values.tolist()[0] == first
+
+    submitted, lock = [first], threading.Lock()
+    odd_scores = iter(rng.sample(range(1, 4 * 5000 + 1, 2), 200))
+    def play(session: int, store: LeaderboardStore):
+        for _ in range(10):
+            with lock: score = next(odd_scores)
+            row = store.submit(f"Jugador {session}", score)
+            with lock: submitted.append(row)
+    for group in (range(10), range(10, 20)):
+        threads = [threading.Thread(target=play, args=(session, store)) for session in group]
+        for t in threads: t.start()
+        for t in threads: t.join()
+        if group.start == 0:
+            store.stop()
+            store = open_store(sheet)
+    drain(store)
+
+    everything = history + submitted
+    for period in ("all", "week"):
+        assert store.top(period=period).values.tolist() == expected_top(everything, period, 5)
+    assert sheet.calls["get_all_records"] == 1
+    assert Counter(tuple(r) for r in sheet.rows[5000:]) == Counter(tuple(r) for r in submitted)
+
+def test_import_skips_rows_already_in_the_store(open_store):
+    sheet = FlakyWorksheet()
+    sheet.rows = [["2026-01-05 10:00:00", "Histórico", 10]]
+    store = open_store(sheet)
+    row = store.submit("Ana", 50)
+    assert store.flush() == 1
+    assert store.import_sheet(DEFAULT_SHEET) == 1
+    assert store.import_sheet(DEFAULT_SHEET) == 0
+    assert store.top().values.tolist() == [row, ["2026-01-05 10:00:00", "Histórico", 10]]
+
+def test_ties_keep_the_oldest_first_and_unknown_periods_fail(open_store):
+    store = open_store(FlakyWorksheet())
+    first, second = store.submit("Ana", 30), store.submit("Luis", 30)
+    assert store.top().values.tolist()[:2] == [first, second]
+    with pytest.raises(ValueError): store.top(period="month")
+
+def test_top_k_reads_the_index_not_every_score(open_store):
+    store = open_store(FlakyWorksheet())
+    plans = [" ".join(str(r[-1]) for r in store._conn.execute(f"EXPLAIN QUERY PLAN SELECT -score, id FROM scores WHERE sheet=? {extra}ORDER BY score DESC, id LIMIT 5", params))
+             for extra, params in (("", ("s",)), ("AND week=? ", ("s", "2026-W01")))]
+    assert "scores_all_time" in plans[0] and "scores_weekly" in plans[1]
+    assert not any("TEMP B-TREE" in plan for plan in plans)
@@ -0,0 +1,48 @@
+import io
+import os
+from PIL import Image
+from libraries.general_functions import local_store_path
+from libraries.media_store import MediaStore, get_media_store, image_message_content, load_image
+
+def png(width: int, height: int, color: str = "red") -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+def stored_files(root: str) -> list[str]:
+    return [name for _, _, filenames in os.walk(root) for name in filenames]
+
+def test_the_store_lives_in_the_temporary_local_store():
+    assert get_media_store().root == local_store_path("media")
+    assert local_store_path("media").startswith(os.environ["LOCAL_STORE_DIR"])
+
+def test_images_are_deduplicated_by_hash():
+    store, data = get_media_store(), png(40, 30, "blue")
+    before = store.summary()
+    first, second = image_message_content(data, "image/png"), image_message_content(data, "image/png")
+    other = image_message_content(png(40, 30, "green"), "image/png")
+    after = store.summary()
+    assert first["ref"] == second["ref"] != other["ref"]
+    assert (after["stored"] - before["stored"], after["deduplicated"] - before["deduplicated"]) == (2, 1)
+    assert stored_files(store.root).count(f"{first['ref']}.png") == 1
+    assert "data" not in first and load_image(first) == data
+
+def test_thumbnails_respect_the_size_limit(tmp_path):
+    store = MediaStore(str(tmp_path), thumbnail_px=100)
+    thumbnail, width, height = store.thumbnail(png(400, 200))
+    with Image.open(io.BytesIO(thumbnail)) as image: assert image.size == (100, 50)
+    assert (width, height) == (400, 200)
+    small = png(80, 60)
+    assert store.thumbnail(small) == (small, 80, 60)
+
+def test_missing_files_load_as_none():
+    store, data = get_media_store(), png(20, 20, "yellow")
+    content = image_message_content(data, "image/png")
+    os.remove(store._path(content["ref"], "image/png"))
+    missing = store.summary()["missing"]
+    assert load_image(content) is None and store.summary()["missing"] == missing + 1
+    assert load_image({"type": "image", "data": data}) == data
+    assert load_image({"type": "image", "mime_type": "image/png"}) is None
+
+def test_unreadable_images_are_kept_inline():
+    assert image_message_content(b"no es una imagen", "image/png") == {"type": "image", "data": b"no es una imagen", "mime_type": "image/png"}
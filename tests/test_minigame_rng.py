@@ -0,0 +1,55 @@
+import os
+import random
+import pytest
+from libraries.gamification.game_data import GAME_DEFINITIONS
+from libraries.gamification.question_bank import DEFAULT_BANK_PATH, QuestionBank
+from libraries.gamification.rng import derive_seed, game_seed, new_session_seed
+from libraries.gamification.telemetry import ROUND_STARTED, GameEventLog
+from tools import replay_rounds
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+@pytest.fixture
+def source(monkeypatch):
+    """Rondas generadas a partir de los datos (sin banco de preguntas), como cuando el banco falta o está desactualizado."""
+    monkeypatch.chdir(ROOT)
+    return replay_rounds.RoundSource(QuestionBank(), "data/db.parquet", "data/db_uni.parquet", "lang", pool_size=50)
+
+def test_seeds_are_stable_across_processes():
+    assert derive_seed(1, "A1", 0) == derive_seed("1", "A1", "0") == 3214308434
+    assert 0 <= derive_seed("x") < 2 ** 32
+    seeds = {game_seed(12345, game_id, generation) for game_id in GAME_DEFINITIONS for generation in range(3)}
+    assert len(seeds) == 3 * len(GAME_DEFINITIONS)
+    assert new_session_seed() != new_session_seed()
+
+@pytest.mark.parametrize("game_id", list(GAME_DEFINITIONS))
+def test_round_pools_are_reproducible_from_the_seed(game_id, source):
+    definition = GAME_DEFINITIONS[game_id]
+    frames = replay_rounds.cargar_datos_matricula("data/db.parquet"), replay_rounds.cargar_datos_instituciones("data/db_uni.parquet")
+    data = definition.build_data(*frames, replay_rounds.LanguageFile("es", "lang"))
+    pools = [definition.game_class.round_pool(data, 20, random.Random(f"0:{game_id}"), **definition.options) for _ in range(2)]
+    assert pools[0] and pools[0] == pools[1]
+
+def test_same_seed_replays_the_same_game(source):
+    game_id = "A2_ClassifierSaber"
+    rounds = [[source.round(game_id, "es", seed, i, 3) for i in range(3)] for seed in (7, 7, 8)]
+    assert rounds[0] == rounds[1]
+    assert rounds[0] != rounds[2]
+
+def test_bank_rounds_are_drawn_like_the_app(monkeypatch):
+    monkeypatch.chdir(ROOT)
+    bank = QuestionBank.load(DEFAULT_BANK_PATH)
+    game_id = next(iter(bank.games))
+    source = replay_rounds.RoundSource(bank, "data/db.parquet", "data/db_uni.parquet", "lang", pool_size=50)
+    assert [source.round(game_id, "es", 99, i, 5) for i in range(5)] == [bank.draw(game_id, "es", 99, i, 5) for i in range(5)]
+
+def test_replay_matches_the_recorded_rounds(tmp_path, source, monkeypatch):
+    monkeypatch.setenv("QUESTION_BANK_PATH", str(tmp_path / "sin-banco.json.gz"))
+    path = str(tmp_path / "events.sqlite3")
+    log = GameEventLog(path)
+    for game_id, seed in (("A1_EstimatorPicoNacional", 1), ("A3_DuelCrecimiento", 2)):
+        for i in range(3):
+            log.record(ROUND_STARTED, "sesion", game_id, "Juego", "es", seed, 3, i, source.round(game_id, "es", seed, i, 3))
+    assert replay_rounds.main(["--events", path, "--pool-size", "50"]) == 0
+    log.record(ROUND_STARTED, "sesion", "A1_EstimatorPicoNacional", "Juego", "es", 1, 3, 0, {"otra": "ronda"})
+    assert replay_rounds.main(["--events", path, "--pool-size", "50"]) == 1
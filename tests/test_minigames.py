@@ -0,0 +1,88 @@
+import random
+import pandas as pd
+import pytest
+import numpy as np
+from libraries.gamification.minigames import GEO_DIFFICULTIES, GeoGuesserMinigame, ImpostorIndex, ImpostorMinigame, ProvinceIndex, _haversine_km
+
+CAREERS = pd.DataFrame({
+    "carrera": ["Medicina", "Estomatología", "Enfermería", "Física", "Química", "Matemática", "Biología",
+                "Derecho", "Historia", "Ingeniería Química", "Medicina", None],
+    "rama": ["Ciencias Médicas"] * 3 + ["Ciencias Naturales"] * 4 + ["Ciencias Sociales"] * 2 + ["Química", "Ciencias Médicas", "Ciencias Sociales"],
+})
+
+def legacy_filter(data: pd.DataFrame, item_col: str, category_col: str, exclude_if_contains: bool = True) -> pd.DataFrame:
+    """El filtro fila a fila que usaba ImpostorMinigame antes del índice."""
+    unique_data = data[[item_col, category_col]].drop_duplicates().dropna()
+    if not exclude_if_contains: return unique_data
+    mask = unique_data.apply(lambda row: str(row[category_col]).lower() not in str(row[item_col]).lower(), axis=1)
+    return unique_data[mask]
+
+@pytest.mark.parametrize("exclude_if_contains", [True, False])
+def test_impostor_index_matches_the_legacy_filter(exclude_if_contains):
+    index = ImpostorIndex(CAREERS, "carrera", "rama", exclude_if_contains)
+    legacy = legacy_filter(CAREERS, "carrera", "rama", exclude_if_contains)
+    pairs = {(index.items[i], index.categories[c]) for c in range(len(index.categories))
+             for i in index.order[index.starts[c]:index.starts[c] + index.counts[c]]}
+    assert pairs == set(map(tuple, legacy.values.tolist()))
+    counts = legacy["rama"].value_counts()
+    assert {index.categories[c] for c in index.eligible} == set(counts[(counts >= 3) & (len(legacy) - counts >= 1)].index)
+
+def test_each_round_has_three_of_a_category_and_one_impostor():
+    pairs = set(map(tuple, legacy_filter(CAREERS, "carrera", "rama").values.tolist()))
+    rounds = ImpostorMinigame.round_pool(CAREERS, 30, random.Random(7), item_col="carrera", category_col="rama")
+    assert len(rounds) > 1
+    for round_data in rounds:
+        options, impostor, category = round_data["options"], round_data["impostor"], round_data["correct_category"]
+        assert len(options) == 4 and options.count(impostor) == 1
+        assert all((item, category) in pairs for item in options if item != impostor)
+        assert (impostor, category) not in pairs
+    assert rounds == ImpostorMinigame.round_pool(CAREERS, 30, random.Random(7), item_col="carrera", category_col="rama")
+
+def test_majority_category_is_respected_and_impossible_rounds_fail():
+    index = ImpostorIndex(CAREERS, "carrera", "rama")
+    rng = random.Random(1)
+    assert all(ImpostorMinigame.round_from_index(index, rng, "Ciencias Naturales")["correct_category"] == "Ciencias Naturales" for _ in range(20))
+    with pytest.raises(ValueError):
+        index.sample_round(rng, "Ciencias Sociales")
+
+# Nueve provincias sobre un mismo paralelo, separadas ~100 km, con dos instituciones cada una; "Isla" no tiene coordenadas.
+PROVINCES = [f"P{i}" for i in range(9)]
+UNIVERSITIES = pd.DataFrame({
+    "nombre_institucion": [f"U{i}{j}" for i in range(9) for j in range(2)] + ["U_isla"],
+    "provincia": [p for p in PROVINCES for _ in range(2)] + ["Isla"],
+    "lat": [22.0 + 0.01 * j for _ in range(9) for j in range(2)] + [np.nan],
+    "lon": [-84.0 + i for i in range(9) for _ in range(2)] + [np.nan],
+})
+
+def distance(index: ProvinceIndex, a, b) -> float:
+    return float(_haversine_km(index.centroids[index.codes[a]], index.centroids[index.codes[b]]))
+
+@pytest.mark.parametrize("difficulty", GEO_DIFFICULTIES)
+def test_distractors_never_include_the_answer(difficulty):
+    index = ProvinceIndex(UNIVERSITIES)
+    rng = random.Random(3)
+    for province in PROVINCES + ["Isla"]:
+        for _ in range(20):
+            wrong = index.distractors(province, 3, rng, difficulty)
+            assert len(wrong) == len(set(wrong)) == 3 and province not in wrong
+
+def test_distractors_respect_the_difficulty_band():
+    index = ProvinceIndex(UNIVERSITIES)
+    rng = random.Random(5)
+    for province in PROVINCES:
+        by_distance = sorted((distance(index, province, q), q) for q in PROVINCES if q != province)
+        near, far = {q for _, q in by_distance[:3]}, {q for _, q in by_distance[-3:]}
+        for _ in range(20):
+            assert set(index.distractors(province, 3, rng, "hard")) == near
+            assert set(index.distractors(province, 3, rng, "easy")) == far
+            mixed = set(index.distractors(province, 3, rng, "mixed"))
+            assert mixed & near and mixed & far
+    with pytest.raises(ValueError):
+        index.distractors("P0", 3, rng, "imposible")
+
+@pytest.mark.parametrize("difficulty", GEO_DIFFICULTIES)
+def test_geoguesser_rounds_are_deterministic_for_a_seed(difficulty):
+    pools = [GeoGuesserMinigame.round_pool(UNIVERSITIES, 15, random.Random(11), difficulty=difficulty) for _ in range(2)]
+    assert pools[0] == pools[1]
+    for round_data in pools[0]:
+        assert len(round_data["options"]) == 4 and round_data["options"].count(round_data["correct_province"]) == 1
@@ -0,0 +1,71 @@
+import os
+import gzip
+import json
+import pytest
+from libraries.gamification.question_bank import ANY_LANGUAGE, DEFAULT_BANK_PATH, QuestionBank, file_digest, get_question_bank, pick_rounds
+from tools import build_question_bank
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+@pytest.fixture
+def data_file(tmp_path):
+    path = tmp_path / "db.parquet"
+    path.write_bytes(b"datos")
+    return str(path)
+
+def make_bank(sources: dict) -> QuestionBank:
+    games = {"A1": {ANY_LANGUAGE: [{"value": i} for i in range(10)]}, "A2": {"es": [{"name": "uno"}], "en": [{"name": "one"}]}}
+    return QuestionBank(games, {"built_at": "2026-01-01T00:00:00", "seed": 0, "sources": sources})
+
+def test_pick_rounds_is_deterministic_and_repeats_only_when_needed():
+    assert pick_rounds(10, 7, 5) == pick_rounds(10, 7, 5)
+    assert len(set(pick_rounds(10, 7, 5))) == 5
+    assert pick_rounds(2, 7, 5) == [pick_rounds(2, 7, 5)[i % 2] for i in range(5)]
+    assert pick_rounds(0, 7, 5) == []
+
+def test_save_load_round_trip_and_draw(tmp_path, data_file):
+    path = str(tmp_path / "bank.json.gz")
+    make_bank({data_file: file_digest(data_file)}).save(path)
+    bank = QuestionBank.load(path)
+    assert bank.summary()["games"] == 2 and bank.summary()["rounds"] == 12
+    assert bank.draw("A1", "es", 3, 0, 5) == bank.draw("A1", "fr", 3, 0, 5)
+    assert [bank.draw("A1", "es", 3, i, 5)["value"] for i in range(5)] == pick_rounds(10, 3, 5)
+    assert bank.rounds("A2", "en") == [{"name": "one"}] and bank.rounds("A2", "fr") == []
+    assert bank.draw("desconocido", "es", 3, 0, 5) is None
+    assert bank.stale_sources() == []
+
+def test_unreadable_or_other_version_is_ignored(tmp_path):
+    broken = tmp_path / "broken.json.gz"
+    broken.write_bytes(b"no es gzip")
+    assert QuestionBank.load(str(broken)).games == {}
+    old = tmp_path / "old.json.gz"
+    with gzip.open(old, "wt", encoding="utf-8") as f: json.dump({"version": 0, "games": {"A1": {"*": [{}]}}}, f)
+    assert QuestionBank.load(str(old)).games == {}
+
+def test_changed_sources_make_the_bank_stale(tmp_path, data_file, monkeypatch, caplog):
+    path = str(tmp_path / "bank.json.gz")
+    make_bank({data_file: file_digest(data_file)}).save(path)
+    monkeypatch.setenv("QUESTION_BANK_PATH", path)
+    get_question_bank.clear()
+    assert get_question_bank().games
+    with open(data_file, "ab") as f: f.write(b" cambiados")
+    get_question_bank.clear()
+    assert QuestionBank.load(path).stale_sources() == [data_file]
+    assert get_question_bank().games == {}
+    assert "Se ignora el banco de preguntas" in caplog.text
+    get_question_bank.clear()
+
+def test_shipped_bank_matches_the_shipped_data(monkeypatch):
+    monkeypatch.chdir(ROOT)
+    bank = QuestionBank.load(DEFAULT_BANK_PATH)
+    assert bank.games, "falta el banco de preguntas; compílalo con tools/build_question_bank.py"
+    assert bank.stale_sources() == []
+
+def test_build_is_reproducible(tmp_path, monkeypatch):
+    monkeypatch.chdir(ROOT)
+    outputs = [str(tmp_path / f"bank{i}.json.gz") for i in range(2)]
+    for out in outputs:
+        assert build_question_bank.main(["--pool-size", "20", "--games", "A1_EstimatorPicoNacional", "A2_DuelCorrelacion", "--out", out]) == 0
+    first, second = (QuestionBank.load(out) for out in outputs)
+    assert first.games == second.games and set(first.games) == {"A1_EstimatorPicoNacional", "A2_DuelCorrelacion"}
+    assert set(first.meta["sources"]) == {"data/db.parquet", "data/db_uni.parquet"}
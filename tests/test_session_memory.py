@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+from libraries.session_memory import IMAGE_EVICTED_TEXT, deep_sizeof, enforce_session_caps, evict_chat_images, measure_session_state
+
+def image(n: int) -> dict:
+    return {"role": "assistant", "content": {"type": "image", "data": b"x" * n, "mime_type": "image/png"}}
+
+def test_deep_sizeof_counts_dataframes_arrays_and_shared_objects_once():
+    df = pd.DataFrame({"a": range(1000), "b": ["texto"] * 1000})
+    array = np.zeros(1000)
+    assert deep_sizeof(df) == df.memory_usage(deep=True, index=True).sum()
+    assert deep_sizeof(array) == array.nbytes
+    assert deep_sizeof([array, array]) < 2 * array.nbytes
+
+def test_measure_session_state_groups_by_category():
+    state = {"messages_a1": [image(10_000)], "gemini_chat_a1": "x" * 5_000, "otra": 1}
+    report = measure_session_state(state)
+    assert report["categories"]["chat_history"] > 10_000
+    assert report["categories"]["chat_sessions"] > 5_000
+    assert report["largest"][0][0] == "messages_a1"
+    assert report["total"] == sum(report["categories"].values())
+
+def test_evict_chat_images_keeps_recent_and_skips_processing_chats():
+    state = {"messages_a1": [image(1000), image(2000), image(3000)], "messages_a2": [image(5000), image(5000)], "processing_a2": True}
+    freed = evict_chat_images(state, keep_recent=1, bytes_to_free=10**9)
+    assert freed == 3000
+    assert [m["content"] for m in state["messages_a1"][:2]] == [IMAGE_EVICTED_TEXT] * 2
+    assert state["messages_a1"][2]["content"]["type"] == "image"
+    assert all(isinstance(m["content"], dict) for m in state["messages_a2"])
+
+def test_enforce_session_caps_frees_memory_above_the_cap(monkeypatch):
+    monkeypatch.setenv("SESSION_MEMORY_CAP_MB", "0.01")
+    monkeypatch.setenv("CHAT_KEEP_RECENT_IMAGES", "0")
+    state = {"messages_a1": [image(50_000), image(50_000)]}
+    report = enforce_session_caps(state)
+    assert report["freed_bytes"] > 0
+    assert report["total"] < 50_000
@@ -0,0 +1,75 @@
+"""
+Capa de acceso a Google Sheets (libraries/sheets.py) con un cliente falso: la hoja se abre una sola vez y cada tipo
+de error se recupera a su manera (reintento, cliente nuevo, reapertura o propagación).
+"""
+import pytest
+from libraries.sheets import SheetHandles
+from tools.offline_stubs import FakeGSheetClient, FakeWorksheet
+
+SHEET = "LeaderboardUniversity"
+
+class FakeAPIError(Exception):
+    """Error HTTP con el código en `code`, como `gspread.exceptions.APIError`."""
+    def __init__(self, code: int):
+        super().__init__(f"APIError [{code}] (simulado)")
+        self.code = code
+
+class ScriptedWorksheet(FakeWorksheet):
+    """Hoja falsa cuyas siguientes llamadas a `get_all_records` lanzan los errores de `errors`, en orden."""
+    def __init__(self, errors=(), **kwargs):
+        super().__init__(**kwargs)
+        self.errors = list(errors)
+
+    def get_all_records(self):
+        if self.errors: raise self.errors.pop(0)
+        return super().get_all_records()
+
+def scenario(errors, sheet_keys=None):
+    """Hace una lectura con `errors` programados y devuelve (resultado o excepción, estadísticas, clientes creados)."""
+    created = []
+    def connect():
+        client = FakeGSheetClient()
+        client.add(SHEET, ScriptedWorksheet(errors if not created else ()))
+        created.append(client)
+        return client
+    sheets = SheetHandles(connect=connect, sheet_keys=sheet_keys, sleep=lambda s: None)
+    try:
+        outcome = sheets.call(SHEET, "get_all_records")
+    except Exception as e:
+        outcome = e
+    return outcome, sheets.stats, created
+
+def test_the_sheet_is_opened_once_then_reopened_by_key():
+    client = FakeGSheetClient()
+    client.add(SHEET, FakeWorksheet())
+    sheets = SheetHandles(connect=lambda: client)
+    for _ in range(20): sheets.call(SHEET, "get_all_records")
+    assert client.calls["open"] == 1 and sheets.stats["connects"] == 1
+    sheets.invalidate(SHEET)
+    sheets.call(SHEET, "get_all_records")
+    assert client.calls == {"open": 1, "open_by_key": 1}
+
+def test_configured_keys_skip_the_search_by_name():
+    _, _, created = scenario([], sheet_keys={SHEET: f"key-{SHEET}"})
+    assert created[0].calls == {"open": 0, "open_by_key": 1}
+
+def test_transient_errors_are_retried():
+    outcome, stats, _ = scenario([FakeAPIError(429), FakeAPIError(503), ConnectionError("reset")])
+    assert isinstance(outcome, list) and stats["retries"] == 3
+
+def test_errors_propagate_after_max_retries():
+    outcome, stats, _ = scenario([FakeAPIError(503)] * 10)
+    assert isinstance(outcome, FakeAPIError) and stats["retries"] == 4
+
+def test_unauthorized_creates_a_new_client():
+    outcome, stats, created = scenario([FakeAPIError(401)])
+    assert isinstance(outcome, list) and stats["reconnects"] == 1 and len(created) == 2
+
+def test_not_found_reopens_the_sheet():
+    outcome, stats, created = scenario([FakeAPIError(404)])
+    assert isinstance(outcome, list) and stats["reopens"] == 1 and created[0].calls["open_by_key"] == 1
+
+@pytest.mark.parametrize("code", [400, 403])
+def test_other_errors_are_not_retried(code):
+    outcome, stats, _ = scenario([FakeAPIError(code)])
+    assert isinstance(outcome, FakeAPIError) and stats["retries"] == 0
@@ -0,0 +1,54 @@
+import pandas as pd
+import pytest
+from libraries.ai_backends import StubBackend, StubChat
+from libraries.sql_playground import PlaygroundDatabase, QueryError, extract_sql, normalize_sql, validate_select
+
+@pytest.fixture(scope="module")
+def database():
+    tables = {
+        "matricula": pd.DataFrame({"ano_inicio_curso": [2015, 2016, 2016], "matricula_total": [100, 200, 300]}),
+        "instituciones": pd.DataFrame({"nombre": ["UH", "UO"], "provincia": ["La Habana", "Santiago de Cuba"]}),
+    }
+    return PlaygroundDatabase(tables, uri="file:sql_playground_test?mode=memory&cache=shared")
+
+def test_validate_select_accepts_one_select_or_with():
+    assert validate_select(" SELECT 1; ") == "SELECT 1"
+    assert validate_select("WITH t AS (SELECT 1) SELECT * FROM t") == "WITH t AS (SELECT 1) SELECT * FROM t"
+    assert validate_select("SELECT ';' AS x") == "SELECT ';' AS x"
+    for sql in ("", "DELETE FROM matricula", "SELECT 1; DROP TABLE matricula", "PRAGMA table_info(matricula)"):
+        with pytest.raises(QueryError): validate_select(sql)
+
+def test_normalize_sql_keeps_literals():
+    assert normalize_sql("SELECT  Nombre\n FROM instituciones -- comentario\n WHERE provincia = 'La Habana';") == \
+        "select nombre from instituciones where provincia = 'La Habana'"
+
+def test_extract_sql_from_a_fenced_answer():
+    assert extract_sql("Aquí está:\n```sql\nSELECT 1;\n```") == "SELECT 1"
+    assert extract_sql("```sql\nDROP TABLE matricula\n```") is None
+
+def test_query_is_read_only_and_truncated(database):
+    df, truncated = database.query("SELECT ano_inicio_curso, SUM(matricula_total) AS total FROM matricula GROUP BY 1 ORDER BY 1")
+    assert df.values.tolist() == [[2015, 100], [2016, 500]] and not truncated
+    df, truncated = database.query("SELECT * FROM matricula", max_rows=2)
+    assert len(df) == 2 and truncated
+    with pytest.raises(QueryError):
+        database.query("SELECT * FROM sqlite_master WHERE 1; DELETE FROM matricula")
+    with pytest.raises(QueryError):
+        database.query("SELECT load_extension('x')")
+    assert database.stats["queries"] == 2 and database.stats["rejected"] == 2
+
+def test_slow_query_times_out(database):
+    slow = "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n) SELECT COUNT(*) FROM n"
+    with pytest.raises(QueryError, match="tiempo máximo"):
+        database.query(slow, timeout_s=0.1)
+
+def test_describe_lists_columns_and_sample_rows(database):
+    description = database.describe(sample_rows=1)
+    assert "Tabla `matricula` (3 filas)" in description and "provincia TEXT" in description
+
+def test_stub_answers_sql_only_when_asked():
+    backend = StubBackend()
+    sql_chat = backend.create_chat(system_instruction="", code_execution=False, response_format="sql")
+    assert extract_sql("".join(c[1] for c in sql_chat.send_message_stream("¿qué tablas hay?"))) == StubChat.SQL
+    text_chat = backend.create_chat(system_instruction="Answer with ```sql", code_execution=False)
+    assert extract_sql("".join(c[1] for c in text_chat.send_message_stream("¿qué tablas hay?") if c[0] == "text")) is None
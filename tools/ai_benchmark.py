@@ -0,0 +1,120 @@
+"""
+Banco de pruebas de latencia del asistente de IA sin red, con el backend 'stub' (libraries/ai_backends.py).
+
+Abre una sesión con AppTest, desactiva el modo juego y hace `--questions` preguntas distintas en la sección 1
+(así ninguna sale de la caché de respuestas). El backend simulado espera `--first-chunk` segundos antes del primer
+fragmento y `--chunk-delay` entre fragmentos, y siempre devuelve texto, código, una tabla y una imagen.
+Informa del tiempo hasta el primer fragmento (p50/p90), del tiempo total por respuesta y del tiempo medio
+de renderizado por tipo de fragmento y de las actualizaciones de texto enviadas al navegador por respuesta,
+tal como lo mide `ai_functions.render_metrics()`. También compara, por componente, el tamaño del contexto enviado
+(`serialize_context`) con el del formato anterior (`_convert_context_to_string_list`: Markdown y JSON con sangría),
+una medida que la app ya no calcula al atender las preguntas.
+
+Uso:
+    python -m tools.ai_benchmark --questions 10 --first-chunk 0.3 --chunk-delay 0.02
+    python -m tools.ai_benchmark --json benchmark.json
+"""
+import os
+import sys
+import json
+import argparse
+import tempfile
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path: sys.path.insert(0, ROOT_DIR)
+
+from tools.load_test import Session, _isolate_session_ids, _percentile
+
+def run_benchmark(questions: int, first_chunk: float, chunk_delay: float, timeout: float) -> dict:
+    os.chdir(ROOT_DIR)
+    os.environ["LOCAL_STORE_DIR"] = tempfile.mkdtemp(prefix="ai_benchmark_")
+    _isolate_session_ids()
+    from tools.offline_stubs import install_offline_stubs
+    install_offline_stubs(chunk_delay=chunk_delay, first_chunk_delay=first_chunk)
+    import libraries.ai_functions as ai_functions
+    from libraries.ai_functions import render_metrics
+
+    contexts, serialize = {}, ai_functions.serialize_context
+    def capture_context(context_list, key=None, schema_only=False):
+        if key is not None and not schema_only: contexts.setdefault(key, list(context_list))
+        return serialize(context_list, key=key, schema_only=schema_only)
+    ai_functions.serialize_context = capture_context
+
+    session = Session(timeout)
+    session.start()
+    session.navigate("1. Pulso Nacional")
+    controller = session.at.session_state["GameController"]
+    if controller.game_mode:
+        controller.switch_off()
+        session.at.session_state["game_mode_toggle_state"] = False
+        session.step("toggle_game_mode", session.at.run)
+    for i in range(questions):
+        prompt = f"Pregunta {i + 1}: ¿qué tendencia muestra la matrícula entre {2015 + i} y {2016 + i}?"
+        session.step("ai:submit", lambda: session.at.chat_input(key="chat_input_a1_nacional").set_value(prompt).run())
+        session.step("ai:stream", session.at.run)
+        session.step("ai:history", session.at.run)
+
+    responses = [r for r in render_metrics() if not r["cached"]]
+    render_by_type: dict[str, list[float]] = {}
+    for r in responses:
+        for chunk_type, seconds in r["render_s"].items():
+            totals = render_by_type.setdefault(chunk_type, [0.0, 0])
+            totals[0] += seconds; totals[1] += r["counts"][chunk_type]
+    ttfc = [r["ttfc_s"] for r in responses if r["ttfc_s"] is not None]
+    total = [r["total_s"] for r in responses]
+    return {
+        "backend": responses[0]["backend"] if responses else None,
+        "questions": questions, "responses": len(responses),
+        "first_chunk_s": first_chunk, "chunk_delay_s": chunk_delay,
+        "ttfc_s": {"p50": _percentile(ttfc, 50), "p90": _percentile(ttfc, 90)} if ttfc else None,
+        "total_s": {"p50": _percentile(total, 50), "p90": _percentile(total, 90)} if total else None,
+        "render_s_per_response": sum(sum(r["render_s"].values()) for r in responses) / len(responses) if responses else None,
+        "text_updates_per_response": sum(r.get("text_updates", 0) for r in responses) / len(responses) if responses else None,
+        "text_chunks_per_response": sum(r["counts"].get("text", 0) for r in responses) / len(responses) if responses else None,
+        "render_ms_per_chunk": {t: {"chunks": n, "mean_ms": 1000 * s / n} for t, (s, n) in render_by_type.items()},
+        "context_bytes": {key: context_sizes(ai_functions, serialize, context) for key, context in contexts.items()},
+        "steps": session.timings,
+        "errors": session.errors,
+    }
+
+def context_sizes(ai_functions, serialize, context_list: list) -> dict:
+    """Bytes del contexto con el formato compacto actual y con el anterior."""
+    compact = len("\n\n---\n\n".join(serialize(context_list)).encode())
+    legacy = len("\n\n---\n\n".join(ai_functions._convert_context_to_string_list(context_list)).encode())
+    return {"compact": compact, "legacy": legacy}
+
+def print_report(result: dict):
+    print(f"Backend: {result['backend']} | respuestas medidas: {result['responses']} de {result['questions']} "
+          f"(primer fragmento simulado {result['first_chunk_s']} s, {result['chunk_delay_s']} s entre fragmentos)")
+    if result["ttfc_s"]:
+        print(f"Primer fragmento: p50 {result['ttfc_s']['p50']:.3f} s | p90 {result['ttfc_s']['p90']:.3f} s")
+        print(f"Respuesta completa: p50 {result['total_s']['p50']:.3f} s | p90 {result['total_s']['p90']:.3f} s")
+        print(f"Renderizado por respuesta: {result['render_s_per_response']:.3f} s")
+        print(f"Actualizaciones de texto por respuesta: {result['text_updates_per_response']:.1f} "
+              f"(fragmentos de texto: {result['text_chunks_per_response']:.1f})")
+    print(f"{'Tipo':<10}{'Fragmentos':>12}{'ms medios':>12}")
+    for chunk_type, v in sorted(result["render_ms_per_chunk"].items()):
+        print(f"{chunk_type:<10}{v['chunks']:>12}{v['mean_ms']:>12.2f}")
+    if result["context_bytes"]:
+        print(f"{'Contexto':<28}{'Bytes':>10}{'Anterior':>10}{'Ahorro':>8}")
+        for key, v in sorted(result["context_bytes"].items()):
+            print(f"{key:<28}{v['compact']:>10}{v['legacy']:>10}{1 - v['compact'] / v['legacy']:>8.0%}" if v['legacy'] else f"{key:<28}{v['compact']:>10}{'-':>10}")
+    for error in result["errors"][:10]: print(f"  ERROR {error}")
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=5)
+    parser.add_argument("--first-chunk", type=float, default=0.3, help="Latencia simulada hasta el primer fragmento (s).")
+    parser.add_argument("--chunk-delay", type=float, default=0.02, help="Separación simulada entre fragmentos (s).")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--json", help="Guarda el resultado completo en este archivo.")
+    args = parser.parse_args(argv)
+
+    result = run_benchmark(args.questions, args.first_chunk, args.chunk_delay, args.timeout)
+    print_report(result)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f: json.dump(result, f, ensure_ascii=False, indent=2)
+    return 1 if result["errors"] or not result["responses"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+"""
+Compila el banco de preguntas de los minijuegos (libraries/gamification/question_bank.py).
+
+Para cada juego de GAME_DEFINITIONS construye sus datos igual que las secciones y genera hasta `--pool-size` rondas
+distintas con un `random.Random` sembrado por (`--seed`, juego), así que dos compilaciones con los mismos datos producen
+el mismo archivo. Los juegos cuyos datos dependen del idioma se compilan por idioma; si todos los idiomas dan las mismas
+rondas se guardan una sola vez bajo "*". Hay que recompilar el banco cuando cambian los datos o los juegos.
+
+Uso:
+    python -m tools.build_question_bank --pool-size 500 --out data/question_bank.json.gz
+"""
+import os
+import sys
+import json
+import glob
+import random
+import argparse
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from libraries.plot_functions import cargar_datos_matricula, cargar_datos_instituciones
+from libraries.gamification.game_data import GAME_DEFINITIONS
+from libraries.gamification.question_bank import ANY_LANGUAGE, DEFAULT_BANK_PATH, QuestionBank, _json_default, file_digest
+
+class LanguageFile:
+    """Traducciones de un idioma leídas de `lang_dir/<lang>.json`, con la misma interfaz `translate` que Translator."""
+    def __init__(self, lang: str, lang_dir: str):
+        self.actual_lang = lang
+        with open(os.path.join(lang_dir, f"{lang}.json"), encoding="utf-8") as f: self.strings = json.load(f)
+
+    def translate(self, key: str, default=None):
+        return self.strings.get(key, default if default is not None else key)
+
+def compile_game(definition, df_main, df_ins, languages: list[LanguageFile], pool_size: int, seed: int) -> dict:
+    """Rondas del juego por idioma, o bajo "*" si no dependen del idioma."""
+    pools = {}
+    for ts in languages:
+        data = definition.build_data(df_main, df_ins, ts)
+        if data is None or data.empty: continue
+        rng = random.Random(f"{seed}:{definition.game_id}")
+        pool = definition.game_class.round_pool(data, pool_size, rng, **definition.options)
+        pools[ts.actual_lang] = json.loads(json.dumps(pool, ensure_ascii=False, default=_json_default))
+    distinct = {json.dumps(pool, sort_keys=True) for pool in pools.values()}
+    if len(distinct) == 1: return {ANY_LANGUAGE: next(iter(pools.values()))}
+    return pools
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--main-data", default="data/db.parquet")
+    parser.add_argument("--institutions", default="data/db_uni.parquet")
+    parser.add_argument("--lang-dir", default="lang")
+    parser.add_argument("--out", default=DEFAULT_BANK_PATH)
+    parser.add_argument("--pool-size", type=int, default=500, help="Rondas como máximo por juego e idioma.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--games", nargs="*", default=None, help="Compilar solo estos juegos (por defecto, todos).")
+    args = parser.parse_args(argv)
+
+    df_main = cargar_datos_matricula(args.main_data)
+    df_ins = cargar_datos_instituciones(args.institutions)
+    if df_main.empty:
+        print(f"No se encontraron datos en {args.main_data}.")
+        return 1
+    languages = [LanguageFile(os.path.splitext(os.path.basename(p))[0], args.lang_dir) for p in sorted(glob.glob(os.path.join(args.lang_dir, "*.json")))]
+
+    games = {}
+    for game_id, definition in GAME_DEFINITIONS.items():
+        if args.games and game_id not in args.games: continue
+        pools = compile_game(definition, df_main, df_ins, languages, args.pool_size, args.seed)
+        if not pools:
+            print(f"  {game_id:<28} sin datos, se omite")
+            continue
+        games[game_id] = pools
+        langs = ",".join(pools) if len(pools) <= 3 else f"{len(pools)} idiomas"
+        print(f"  {game_id:<28} {len(next(iter(pools.values()))):>5} rondas  [{langs}]")
+
+    bank = QuestionBank(games, {
+        "built_at": datetime.now().isoformat(timespec="seconds"),
+        "seed": args.seed,
+        "pool_size": args.pool_size,
+        "sources": {path: file_digest(path) for path in (args.main_data, args.institutions) if os.path.exists(path)},
+    })
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    bank.save(args.out)
+    summary = bank.summary()
+    print(f"Banco escrito en {args.out}: {summary['games']} juegos, {summary['rounds']} rondas, {os.path.getsize(args.out) / 1024:.1f} KiB")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,56 @@
+"""
+Agregaciones del registro de eventos de los minijuegos (libraries/gamification/telemetry.py).
+
+Muestra, por tipo de minijuego y por juego, las partidas empezadas y terminadas, la puntuación media y la tasa de
+éxito; y por ronda, cuántas veces se mostró y respondió, el acierto y el tiempo medio de respuesta. Las rondas con
+menos acierto (o que casi todo el mundo acierta, con `--easiest`) son las candidatas a quitar del banco de preguntas.
+
+Uso:
+    python -m tools.game_rollups --db .local_store/game_events.sqlite3 --min-answers 5 --top 20
+    python -m tools.game_rollups --csv-dir rollups/   # además, guarda las tablas completas en CSV
+"""
+import os
+import sys
+import argparse
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from libraries.gamification.telemetry import GameEventLog
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=os.path.join(os.environ.get("LOCAL_STORE_DIR", ".local_store"), "game_events.sqlite3"))
+    parser.add_argument("--min-answers", type=int, default=5, help="Respuestas mínimas para listar una ronda.")
+    parser.add_argument("--game", default=None, help="Solo las rondas de este juego (game_id).")
+    parser.add_argument("--top", type=int, default=20, help="Rondas a mostrar.")
+    parser.add_argument("--easiest", action="store_true", help="Mostrar las rondas con más acierto en lugar de las de menos.")
+    parser.add_argument("--csv-dir", default=None)
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.db):
+        print(f"No existe el registro {args.db}.")
+        return 1
+    log = GameEventLog(args.db)
+    summary = log.summary()
+    print(f"{summary['events']} eventos ({summary['round_started']} rondas mostradas, {summary['answered']} respuestas, "
+          f"{summary['game_finished']} partidas terminadas) sobre {summary['questions']} rondas distintas\n")
+
+    by_type, by_game = log.game_rollup("game_type"), log.game_rollup("game_id")
+    questions = log.question_rollup(args.min_answers, args.game)
+    with pd.option_context("display.width", 200, "display.max_columns", 20):
+        print(by_type.to_string(index=False), "\n")
+        print(by_game.to_string(index=False), "\n")
+        shown = questions.sort_values(["accuracy", "answers"], ascending=[not args.easiest, False]).head(args.top)
+        shown = shown.assign(round_json=shown["round_json"].str.slice(0, 80))
+        print(f"Rondas con {'más' if args.easiest else 'menos'} acierto (al menos {args.min_answers} respuestas):")
+        print(shown.drop(columns=["question_id"]).to_string(index=False) if not shown.empty else "  ninguna")
+
+    if args.csv_dir:
+        os.makedirs(args.csv_dir, exist_ok=True)
+        for name, df in (("by_type", by_type), ("by_game", by_game), ("questions", questions)):
+            df.to_csv(os.path.join(args.csv_dir, f"{name}.csv"), index=False)
+        print(f"\nTablas guardadas en {args.csv_dir}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,280 @@
+"""
+Prueba de carga sin navegador de 'streamlit_app.py' usando `streamlit.testing.v1.AppTest`.
+
+Cada sesión simulada recorre uno o varios "viajes" de usuario (secciones en orden, modo juego, partidas de los minijuegos,
+cambio de idioma, deslizadores de B1/B2, pregunta al asistente de IA, consulta SQL en B3) y se mide la latencia de cada paso.
+Gemini y Google Sheets se sustituyen por stubs locales (tools/offline_stubs.py), así que funciona sin red.
+
+AppTest reemplaza el `Runtime` global de Streamlit en cada ejecución, por lo que las sesiones concurrentes
+se reparten entre procesos: `--workers` procesos en paralelo, cada uno con `--sessions` sesiones seguidas
+que comparten las cachés de ese proceso (como en un servidor real).
+
+Uso:
+    python -m tools.load_test --workers 4 --sessions 3
+    python -m tools.load_test --journeys sections sliders --json resultados.json
+    python -m tools.load_test --journeys play --seed 7   # mismas rondas en cada ejecución
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(ROOT_DIR, "streamlit_app.py")
+NAV_KEY = "h_nav_main_section_radio_main"
+PLAYGROUND = "Playground!"
+FRAGMENT_RERUN_ERROR = 'scope="fragment" can only be specified'
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+def _peak_rss_mb() -> float | None:
+    if resource is None: return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def _cache_bytes() -> dict:
+    from streamlit.runtime.caching import get_data_cache_stats_provider, get_resource_cache_stats_provider
+    return {
+        "cache_data": sum(s.byte_length for s in get_data_cache_stats_provider().get_stats()),
+        "cache_resource": sum(s.byte_length for s in get_resource_cache_stats_provider().get_stats()),
+    }
+
+_current_session_id = "test session id"
+
+def _isolate_session_ids():
+    """AppTest usa siempre el mismo id de sesión; lo sustituimos por el de la sesión simulada en curso."""
+    from streamlit.testing.v1.local_script_runner import LocalScriptRunner
+    original_init = LocalScriptRunner.__init__
+    def __init__(self, *args, **kwargs):
+        original_init(self, *args, **kwargs)
+        self._session_id = _current_session_id
+    LocalScriptRunner.__init__ = __init__
+
+class Session:
+    """Una sesión simulada: un AppTest y el registro de latencias de cada paso."""
+    def __init__(self, timeout: float, game_seed: int | None = None):
+        from streamlit.testing.v1 import AppTest
+        self.at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+        if game_seed is not None: self.at.session_state["game_seed"] = game_seed
+        self.session_id = str(uuid.uuid4())
+        self.timings: list[tuple[str, float]] = []
+        self.errors: list[str] = []
+
+    def step(self, name: str, action):
+        global _current_session_id
+        _current_session_id = self.session_id
+        start = time.perf_counter()
+        action()
+        self.timings.append((name, time.perf_counter() - start))
+        for exception in self.at.exception:
+            # AppTest siempre ejecuta el script completo: un `st.rerun(scope='fragment')` falla en lugar de
+            # reejecutar el fragmento; el viaje lo emula con una ejecución completa adicional.
+            if FRAGMENT_RERUN_ERROR not in exception.message:
+                self.errors.append(f"{name}: {exception.message}")
+
+    def start(self):
+        self.at.session_state["initial_mode_selected"] = True
+        self.step("start", self.at.run)
+
+    def navigate(self, section: str, subsection: str | None = None):
+        self.step(f"nav:{section}", lambda: self.at.radio(key=NAV_KEY).set_value(section).run())
+        if subsection:
+            key = f"sub_radio_{section.replace(' ', '_')}"
+            self.step(f"nav:{section}/{subsection}", lambda: self.at.radio(key=key).set_value(subsection).run())
+
+# --- Viajes de usuario ---
+
+def journey_sections(s: Session):
+    """Recorre todas las secciones (y subsecciones del Playground) en orden."""
+    for section in s.at.radio(key=NAV_KEY).options:
+        if section == PLAYGROUND:
+            s.navigate(section)
+            for sub in s.at.radio(key=f"sub_radio_{PLAYGROUND}").options:
+                s.navigate(section, sub)
+        else:
+            s.navigate(section)
+
+def journey_game_mode(s: Session):
+    """Activa/desactiva el modo juego en una sección con minijuegos."""
+    s.navigate("1. Pulso Nacional")
+    controller = s.at.session_state["GameController"]
+    for _ in range(2):
+        def toggle():
+            if controller.game_mode: controller.switch_off()
+            else: controller.switch_on()
+            s.at.session_state["game_mode_toggle_state"] = controller.game_mode
+            s.at.run()
+        s.step("toggle_game_mode", toggle)
+
+def journey_play(s: Session, max_rounds: int = 12):
+    """Juega los minijuegos de cada sección (respuestas por defecto de cada widget) hasta terminarlos."""
+    for section in s.at.radio(key=NAV_KEY).options:
+        if section == PLAYGROUND: continue
+        s.navigate(section)
+        for _ in range(max_rounds):
+            submit = next((b for b in s.at.button if b.proto.form_id.startswith("form_")), None)
+            if submit is None: break
+            s.step(f"play:{section}", lambda: submit.click().run())
+
+def journey_language(s: Session):
+    """Cambia el idioma de la interfaz varias veces sobre la misma sección."""
+    s.navigate("2. Mosaico de Saberes")
+    translator = s.at.session_state["Translator"]
+    for lang in ("en", "fr", "ja", "es"):
+        def change():
+            translator.actual_lang = lang
+            translator.lang_index = translator.langs_list.index(lang)
+            s.at.run()
+        s.step(f"language:{lang}", change)
+
+def _set_slider(slider, value):
+    current = slider.value
+    if isinstance(current, (list, tuple)):
+        slider.set_range(current[0], value).run()
+    else:
+        slider.set_value(value).run()
+
+def journey_sliders(s: Session):
+    """Arrastra los deslizadores de B1 (rango CAGR y año) y de B2 (año de detalle)."""
+    s.navigate(PLAYGROUND, "Perfil Detallado de Carrera")
+    for i in range(len(s.at.select_slider)):
+        slider = s.at.select_slider[i]
+        options = list(slider.options)
+        for value in options[::max(1, len(options) // 5)]:
+            s.step(f"slider:B1:{i}", lambda: _set_slider(s.at.select_slider[i], value))
+    s.navigate(PLAYGROUND, "Guía de Instituciones")
+    options = list(s.at.select_slider(key="slider_uni_detail_year").options)
+    for value in options[::max(1, len(options) // 5)]:
+        s.step("slider:B2:year", lambda: s.at.select_slider(key="slider_uni_detail_year").set_value(value).run())
+
+def journey_ai(s: Session):
+    """Hace una pregunta al asistente de IA (stub) en la sección 1."""
+    s.navigate("1. Pulso Nacional")
+    controller = s.at.session_state["GameController"]
+    if controller.game_mode:
+        def switch_off():
+            controller.switch_off()
+            s.at.session_state["game_mode_toggle_state"] = False
+            s.at.run()
+        s.step("toggle_game_mode", switch_off)
+    s.step("ai:submit", lambda: s.at.chat_input(key="chat_input_a1_nacional").set_value("Explica este gráfico").run())
+    s.step("ai:stream", s.at.run)
+    s.step("ai:history", s.at.run)
+    if len(s.at.session_state["messages_a1_nacional"]) < 2:
+        s.errors.append("ai: la respuesta no llegó al historial del chat")
+
+def journey_sql(s: Session):
+    """Pregunta en lenguaje natural (stub) y ejecuta una consulta escrita a mano en 'Consulta la Base de Datos'."""
+    s.navigate(PLAYGROUND, "Consulta la Base de Datos")
+    s.at.text_area(key="b3_question").set_value("¿Qué tablas hay?")
+    submit = next(b for b in s.at.button if b.proto.form_id == "b3_question_form")
+    s.step("sql:ask", lambda: submit.click().run())
+    s.at.text_area(key="b3_sql_editor").set_value("SELECT ano_inicio_curso, SUM(matricula_total) AS total FROM matricula GROUP BY 1 ORDER BY 1")
+    s.step("sql:run", lambda: s.at.button(key="b3_run_button").click().run())
+    if not s.at.dataframe: s.errors.append("sql: la consulta no devolvió ninguna tabla")
+
+JOURNEYS = {
+    "sections": journey_sections,
+    "game": journey_game_mode,
+    "play": journey_play,
+    "language": journey_language,
+    "sliders": journey_sliders,
+    "ai": journey_ai,
+    "sql": journey_sql,
+}
+
+def run_worker(worker_id: int, sessions: int, journeys: list[str], timeout: float, chunk_delay: float, seed: int | None = None) -> dict:
+    """
+    Ejecuta `sessions` sesiones seguidas en este proceso y devuelve latencias, memoria y crecimiento de cachés.
+    Con `seed`, cada sesión tiene una semilla de juego fija (derivada de la semilla, el proceso y la sesión).
+    """
+    os.chdir(ROOT_DIR)
+    if ROOT_DIR not in sys.path: sys.path.insert(0, ROOT_DIR)
+    os.environ["LOCAL_STORE_DIR"] = tempfile.mkdtemp(prefix=f"load_test_{worker_id}_")
+    _isolate_session_ids()
+    from tools.offline_stubs import install_offline_stubs
+    install_offline_stubs(chunk_delay=chunk_delay)
+    from libraries.gamification.rng import derive_seed
+
+    caches_before = _cache_bytes()
+    timings, errors = [], []
+    for i in range(sessions):
+        session = Session(timeout, derive_seed(seed, worker_id, i) if seed is not None else None)
+        session.start()
+        for name in journeys:
+            JOURNEYS[name](session)
+        timings.extend(session.timings)
+        errors.extend(session.errors)
+    caches_after = _cache_bytes()
+    return {
+        "worker": worker_id,
+        "timings": timings,
+        "errors": errors,
+        "peak_rss_mb": _peak_rss_mb(),
+        "cache_growth_bytes": {k: caches_after[k] - caches_before[k] for k in caches_after},
+    }
+
+def _percentile(values: list[float], pct: float) -> float:
+    if len(values) == 1: return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[int(pct) - 1]
+
+def summarize(results: list[dict]) -> dict:
+    by_step: dict[str, list[float]] = {}
+    for result in results:
+        for name, seconds in result["timings"]:
+            by_step.setdefault(name, []).append(seconds)
+    steps = {
+        name: {"n": len(v), "p50_ms": _percentile(v, 50) * 1000, "p90_ms": _percentile(v, 90) * 1000,
+               "p99_ms": _percentile(v, 99) * 1000, "max_ms": max(v) * 1000}
+        for name, v in by_step.items()
+    }
+    rss = [r["peak_rss_mb"] for r in results if r["peak_rss_mb"] is not None]
+    return {
+        "steps": steps,
+        "peak_rss_mb": {"max_worker": max(rss) if rss else None, "sum_workers": sum(rss) if rss else None},
+        "cache_growth_bytes": [r["cache_growth_bytes"] for r in results],
+        "errors": [e for r in results for e in r["errors"]],
+    }
+
+def print_report(summary: dict):
+    print(f"{'Paso':<55}{'n':>5}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for name, s in summary["steps"].items():
+        print(f"{name[:54]:<55}{s['n']:>5}{s['p50_ms']:>10.1f}{s['p90_ms']:>10.1f}{s['p99_ms']:>10.1f}{s['max_ms']:>10.1f}")
+    print(f"\nRSS pico (MB): máx. por proceso={summary['peak_rss_mb']['max_worker']}, suma={summary['peak_rss_mb']['sum_workers']}")
+    for i, growth in enumerate(summary["cache_growth_bytes"]):
+        print(f"Crecimiento de cachés, proceso {i}: " + ", ".join(f"{k}={v / 1024:.1f} KiB" for k, v in growth.items()))
+    if summary["errors"]:
+        print(f"\n{len(summary['errors'])} errores:")
+        for error in summary["errors"][:20]: print(f"  - {error}")
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=2, help="Procesos (sesiones concurrentes).")
+    parser.add_argument("--sessions", type=int, default=1, help="Sesiones seguidas por proceso.")
+    parser.add_argument("--journeys", nargs="+", choices=list(JOURNEYS), default=list(JOURNEYS))
+    parser.add_argument("--timeout", type=float, default=120, help="Tiempo máximo por ejecución del script (s).")
+    parser.add_argument("--chunk-delay", type=float, default=0.0, help="Latencia simulada por fragmento de la IA (s).")
+    parser.add_argument("--seed", type=int, default=None, help="Semilla de los minijuegos: las sesiones juegan las mismas rondas en cada ejecución.")
+    parser.add_argument("--json", help="Guarda el resumen en este archivo JSON.")
+    args = parser.parse_args(argv)
+
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = [pool.submit(run_worker, i, args.sessions, args.journeys, args.timeout, args.chunk_delay, args.seed) for i in range(args.workers)]
+        results = [f.result() for f in futures]
+
+    summary = summarize(results)
+    print_report(summary)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
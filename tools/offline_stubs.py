@@ -0,0 +1,98 @@
+"""
+Sustitutos locales de los servicios externos (Gemini y Google Sheets) para ejecutar la app sin red.
+La IA se sustituye por el backend 'stub' de libraries/ai_backends.py; Google Sheets, por hojas en memoria.
+
+Uso:
+    from tools.offline_stubs import install_offline_stubs
+    install_offline_stubs()   # antes de ejecutar 'streamlit_app.py' con AppTest
+"""
+import os
+import time
+import threading
+from datetime import datetime
+from gspread.exceptions import SpreadsheetNotFound
+
+class FakeWorksheet:
+    """Hoja de cálculo en memoria con la interfaz de gspread usada por el leaderboard."""
+    def __init__(self, header=("Timestamp", "PlayerName", "Score"), latency: float = 0.0):
+        self.header = list(header)
+        self.rows: list[list] = []
+        self.latency = latency
+        self.calls = {"get_all_records": 0, "append_row": 0, "append_rows": 0}
+        self._lock = threading.Lock()
+
+    def _call(self, name: str):
+        self.calls[name] += 1
+        if self.latency: time.sleep(self.latency)
+
+    def get_all_records(self):
+        self._call("get_all_records")
+        with self._lock:
+            return [dict(zip(self.header, row)) for row in self.rows]
+
+    def append_row(self, values, **kwargs):
+        self._call("append_row")
+        with self._lock:
+            self.rows.append(list(values))
+
+    def append_rows(self, values, **kwargs):
+        self._call("append_rows")
+        with self._lock:
+            self.rows.extend(list(v) for v in values)
+
+class _FakeSpreadsheet:
+    def __init__(self, sheet: FakeWorksheet, key: str):
+        self.sheet1 = sheet
+        self.id = key
+
+class FakeGSheetClient:
+    """
+    Imita `gspread.Client.open(name)` y `open_by_key(key)` devolviendo siempre las mismas hojas en memoria.
+    Una hoja que no existe se crea al abrirla por nombre, con cinco puntuaciones de ejemplo.
+    """
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.spreadsheets: dict[str, _FakeSpreadsheet] = {}
+        self.calls = {"open": 0, "open_by_key": 0}
+
+    def add(self, name: str, sheet: FakeWorksheet) -> _FakeSpreadsheet:
+        self.spreadsheets[name] = _FakeSpreadsheet(sheet, f"key-{name}")
+        return self.spreadsheets[name]
+
+    def open(self, name: str):
+        self.calls["open"] += 1
+        if self.latency: time.sleep(self.latency)
+        if name not in self.spreadsheets:
+            sheet = FakeWorksheet(latency=self.latency)
+            sheet.rows = [[datetime.now().strftime("%Y-%m-%d %H:%M:%S"), f"Jugador {i}", 100 * i] for i in range(1, 6)]
+            self.add(name, sheet)
+        return self.spreadsheets[name]
+
+    def open_by_key(self, key: str):
+        self.calls["open_by_key"] += 1
+        if self.latency: time.sleep(self.latency)
+        for spreadsheet in self.spreadsheets.values():
+            if spreadsheet.id == key: return spreadsheet
+        raise SpreadsheetNotFound(key)
+
+def install_offline_stubs(chunk_delay: float = 0.0, sheet_latency: float = 0.0, first_chunk_delay: float = 0.0) -> dict:
+    """
+    Activa el backend de IA 'stub' (AI_BACKEND=stub) y sustituye la conexión a Google Sheets por hojas en memoria.
+    Debe llamarse en el proceso que ejecuta AppTest, antes de la primera ejecución del script.
+
+    Returns:
+        dict: Los objetos instalados ('backend', 'gsheet'), útiles para inspeccionar llamadas.
+    """
+    import libraries.sheets as sheets
+    import libraries.leaderboard as leaderboard
+    from libraries.ai_backends import get_ai_backend
+
+    os.environ["AI_BACKEND"] = "stub"
+    os.environ["AI_STUB_FIRST_CHUNK_S"] = str(first_chunk_delay)
+    os.environ["AI_STUB_CHUNK_DELAY_S"] = str(chunk_delay)
+    get_ai_backend.clear()
+    gsheet = FakeGSheetClient(sheet_latency)
+    sheets.create_gsheet_client = lambda: gsheet
+    sheets.get_sheet_handles.clear()
+    leaderboard.get_leaderboard_store.clear()
+    return {"backend": get_ai_backend(), "gsheet": gsheet}
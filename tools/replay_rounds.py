@@ -0,0 +1,91 @@
+"""
+Regenera rondas de los minijuegos a partir de (juego, semilla, índice de ronda), sin sesión de Streamlit.
+
+Las rondas salen del mismo sitio que en la app (libraries/gamification/game_engine.py, `Minigame.shared_round`): el banco
+de preguntas si tiene el juego y, si no, las rondas precalculadas a partir de los datos del juego (GameDataRegistry),
+construidos como en las secciones. La partida elige sus rondas con `pick_rounds(len(rondas), semilla, num_rondas)`.
+
+Con `--events`, regenera todas las rondas mostradas que haya en el registro de eventos (de una sesión con `--session`)
+y comprueba que cada una coincide con la que se registró (misma huella).
+
+Uso:
+    python -m tools.replay_rounds --game A2_ClassifierSaber --seed 12345 --num-rounds 3 --lang es
+    python -m tools.replay_rounds --events .local_store/game_events.sqlite3 [--session <id>]
+"""
+import os
+import sys
+import json
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from libraries.plot_functions import cargar_datos_matricula, cargar_datos_instituciones
+from libraries.gamification.game_data import GAME_DEFINITIONS
+from libraries.gamification.game_registry import GameDataRegistry
+from libraries.gamification.question_bank import DEFAULT_BANK_PATH, QuestionBank, pick_rounds
+from libraries.gamification.telemetry import GameEventLog, question_fingerprint
+from tools.build_question_bank import LanguageFile
+
+class RoundSource:
+    """Las rondas compartidas de cada juego e idioma, como `Minigame.shared_rounds` en la app."""
+    def __init__(self, bank: QuestionBank, main_data: str, institutions: str, lang_dir: str, pool_size: int):
+        self.bank = bank
+        self.paths = (main_data, institutions)
+        self.lang_dir = lang_dir
+        self.registry = GameDataRegistry(pool_size)
+        self._frames = None
+
+    def rounds(self, game_id: str, lang: str) -> list[dict]:
+        banked = self.bank.rounds(game_id, lang)
+        if banked: return banked
+        if self._frames is None: self._frames = (cargar_datos_matricula(self.paths[0]), cargar_datos_instituciones(self.paths[1]))
+        definition = GAME_DEFINITIONS[game_id]
+        data = definition.build_data(*self._frames, LanguageFile(lang, self.lang_dir))
+        if data is None or data.empty: return []
+        return self.registry.pool(self.registry.register(game_id, data), definition.game_class, definition.options)
+
+    def round(self, game_id: str, lang: str, seed: int, round_index: int, num_rounds: int) -> dict | None:
+        pool = self.rounds(game_id, lang)
+        if not pool: return None
+        return pool[pick_rounds(len(pool), seed, num_rounds)[round_index]]
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--game", choices=list(GAME_DEFINITIONS))
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--num-rounds", type=int, default=1)
+    parser.add_argument("--round", type=int, default=None, help="Solo esta ronda (por defecto, todas).")
+    parser.add_argument("--lang", default="es")
+    parser.add_argument("--events", default=None, help="Registro de eventos de los minijuegos (SQLite).")
+    parser.add_argument("--session", default=None)
+    parser.add_argument("--bank", default=os.environ.get("QUESTION_BANK_PATH", DEFAULT_BANK_PATH))
+    parser.add_argument("--main-data", default="data/db.parquet")
+    parser.add_argument("--institutions", default="data/db_uni.parquet")
+    parser.add_argument("--lang-dir", default="lang")
+    parser.add_argument("--pool-size", type=int, default=int(os.environ.get("GAME_POOL_SIZE", 200)))
+    args = parser.parse_args(argv)
+
+    bank = QuestionBank.load(args.bank)
+    if bank.stale_sources():
+        print(f"Se ignora el banco {args.bank}: los datos cambiaron desde que se compiló (como en la app).")
+        bank = QuestionBank()
+    source = RoundSource(bank, args.main_data, args.institutions, args.lang_dir, args.pool_size)
+    if args.events:
+        events = GameEventLog(args.events).round_events(args.session)
+        mismatches = 0
+        for e in events.itertuples():
+            round_data = source.round(e.game_id, e.lang, int(e.seed), int(e.round_index), int(e.num_rounds))
+            ok = round_data is not None and question_fingerprint(round_data) == e.question_id
+            mismatches += not ok
+            print(f"  {'OK ' if ok else 'ERR'} {e.session_id[:8]} {e.game_id:<28} semilla={e.seed:<10} ronda {e.round_index + 1}/{e.num_rounds}")
+        print(f"{len(events) - mismatches} de {len(events)} rondas regeneradas coinciden con las registradas")
+        return 0 if mismatches == 0 else 1
+
+    if args.game is None or args.seed is None: parser.error("indica --game y --seed, o --events")
+    indices = [args.round] if args.round is not None else range(args.num_rounds)
+    for i in indices:
+        round_data = source.round(args.game, args.lang, args.seed, i, args.num_rounds)
+        print(f"Ronda {i + 1}/{args.num_rounds}: {json.dumps(round_data, ensure_ascii=False, default=str)}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())